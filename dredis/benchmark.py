@@ -0,0 +1,336 @@
+"""
+Load generator for dredis and Redis, similar to `redis-benchmark`.
+
+Every client has its own connection and sends `--pipeline` commands at a time, the clients are split among
+`--processes` processes because a single Python process can't keep a server busy.
+The latency of a command is the time between sending its pipeline and reading its reply.
+
+The same workload runs against a local `redis-server` when one is found (use --redis-server '' to skip it)
+and the results are printed as JSON. Saving the output of a run and passing it to --baseline in later runs
+shows the regressions (and makes the exit status 1).
+"""
+import argparse
+import bisect
+import json
+import multiprocessing
+import random
+import select
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from distutils.spawn import find_executable
+
+from dredis.capture import encode_command
+from dredis.stats import LatencyHistogram
+
+# the arguments are formatted with a random key from the key space,
+# a random member (of sets, hashes, and sorted sets), a random score, and the value (of --data-size bytes)
+COMMANDS = {
+    'ping': ['PING'],
+    'set': ['SET', 'key:{key}', '{value}'],
+    'get': ['GET', 'key:{key}'],
+    'incr': ['INCR', 'counter:{key}'],
+    'sadd': ['SADD', 'set:{key}', 'member:{member}'],
+    'smembers': ['SMEMBERS', 'set:{key}'],
+    'hset': ['HSET', 'hash:{key}', 'field:{member}', '{value}'],
+    'hget': ['HGET', 'hash:{key}', 'field:{member}'],
+    'zadd': ['ZADD', 'zset:{key}', '{score}', 'member:{member}'],
+    'zrange': ['ZRANGE', 'zset:{key}', '0', '9'],
+    'zrangebyscore': ['ZRANGEBYSCORE', 'zset:{key}', '-inf', '{score}', 'LIMIT', '0', '10'],
+}
+PERCENTILES = (('p50', 50), ('p99', 99), ('p999', 99.9), ('max', 100))
+REQUESTS_POOL_SIZE = 10000  # requests are generated before the benchmark and reused in a loop
+BUFFER_SIZE = 64 * 1024
+
+
+def parse_mix(mix):
+    """`get=80,set=20` -> [('get', 80), ('set', 20)], a command without a weight has weight 1"""
+    result = []
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip().lower()
+        if name not in COMMANDS:
+            raise ValueError('unknown command {!r} (available commands: {})'.format(name, ', '.join(sorted(COMMANDS))))
+        result.append((name, int(weight or 1)))
+    if sum(weight for _, weight in result) <= 0:
+        raise ValueError('the command mix needs a positive weight')
+    return result
+
+
+def generate_requests(mix, count, keyspace, members, data_size, rng):
+    names = []
+    cumulative_weights = []
+    total = 0
+    for name, weight in mix:
+        if weight > 0:
+            total += weight
+            names.append(name)
+            cumulative_weights.append(total)
+    value = 'x' * data_size
+    requests = []
+    for _ in range(count):
+        name = names[bisect.bisect_right(cumulative_weights, rng.randrange(total))]
+        fields = {
+            'key': rng.randrange(keyspace),
+            'member': rng.randrange(members),
+            'score': rng.randrange(members),
+            'value': value,
+        }
+        requests.append(encode_command([arg.format(**fields) for arg in COMMANDS[name]]))
+    return requests
+
+
+def parse_reply(buffer, position):
+    """
+    Return the position after the reply that starts at `position` and if the reply is an error,
+    the position is -1 if the reply isn't complete yet. RESP3 replies (`HELLO 3`) are supported too.
+    """
+    end = buffer.find('\r\n', position)
+    if end == -1:
+        return -1, False
+    reply_type = buffer[position]
+    # simple strings, errors, integers, and the RESP3 null, double, boolean, and big number
+    if reply_type in '+-:_,#(':
+        return end + 2, reply_type == '-'
+    length = int(buffer[position + 1:end])
+    # bulk strings, and the RESP3 blob errors and verbatim strings
+    if reply_type in '$!=':
+        if length < 0:
+            return end + 2, False
+        end += 2 + length + 2
+        return (end if end <= len(buffer) else -1), reply_type == '!'
+    # arrays, and the RESP3 sets, pushes, and maps (maps have a key and a value per element)
+    if reply_type in '*~>%':
+        position = end + 2
+        is_error = False
+        for _ in range(length * 2 if reply_type == '%' else length):
+            position, is_element_error = parse_reply(buffer, position)
+            if position == -1:
+                return -1, False
+            is_error = is_error or is_element_error
+        return position, is_error
+    raise ValueError('unknown reply type {!r}'.format(reply_type))
+
+
+def connect(address):
+    if isinstance(address, tuple):
+        sock = socket.create_connection(address)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    else:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address)
+    return sock
+
+
+class BenchmarkClient(object):
+
+    def __init__(self, sock, requests, pipeline, total_requests, start=0):
+        self.sock = sock
+        self.requests = requests
+        self.pipeline = pipeline
+        self.unsent = total_requests
+        self.in_flight = 0
+        self.errors = 0
+        self._next_request = start
+        self._buffer = ''
+        self._sent_at = None
+
+    def send_pipeline(self):
+        count = min(self.pipeline, self.unsent)
+        data = ''.join(self.requests[(self._next_request + i) % len(self.requests)] for i in range(count))
+        self._next_request += count
+        self.unsent -= count
+        self.in_flight = count
+        self._sent_at = time.time()
+        self.sock.sendall(data)
+
+    def read_replies(self, histogram):
+        data = self.sock.recv(BUFFER_SIZE)
+        if not data:
+            raise IOError('the server closed the connection')
+        self._buffer += data
+        latency = int((time.time() - self._sent_at) * 1e6)
+        position = 0
+        while self.in_flight:
+            end, is_error = parse_reply(self._buffer, position)
+            if end == -1:
+                break
+            histogram.record(latency)
+            self.errors += is_error
+            self.in_flight -= 1
+            position = end
+        self._buffer = self._buffer[position:]
+
+
+def run_clients(address, requests_per_client, pipeline, requests):
+    """Run the clients of one process and return the histogram, the number of errors, and when it started and ended"""
+    histogram = LatencyHistogram()
+    clients = {}
+    poller = select.poll()
+    for i, total_requests in enumerate(requests_per_client):
+        client = BenchmarkClient(connect(address), requests, pipeline, total_requests, start=i * pipeline)
+        clients[client.sock.fileno()] = client
+        poller.register(client.sock, select.POLLIN)
+
+    started = time.time()
+    for client in clients.values():
+        client.send_pipeline()
+    errors = 0
+    while clients:
+        for fd, _ in poller.poll():
+            client = clients[fd]
+            client.read_replies(histogram)
+            if client.in_flight:
+                continue
+            if client.unsent:
+                client.send_pipeline()
+            else:
+                poller.unregister(fd)
+                client.sock.close()
+                errors += client.errors
+                del clients[fd]
+    return histogram, errors, started, time.time()
+
+
+def _run_clients(args):
+    # `multiprocessing.Pool.map()` only passes one argument
+    address, requests_per_client, pipeline, mix, keyspace, members, data_size, seed = args
+    pool_size = min(REQUESTS_POOL_SIZE, sum(requests_per_client))
+    requests = generate_requests(mix, pool_size, keyspace, members, data_size, random.Random(seed))
+    return run_clients(address, requests_per_client, pipeline, requests)
+
+
+def run_benchmark(address, args, mix):
+    requests_per_client = [args.requests // args.clients + (1 if i < args.requests % args.clients else 0)
+                           for i in range(args.clients)]
+    # clients without requests would wait forever for replies
+    requests_per_client = [requests for requests in requests_per_client if requests]
+    processes = min(args.processes or multiprocessing.cpu_count(), len(requests_per_client))
+    tasks = [(address, requests_per_client[i::processes], args.pipeline, mix, args.keyspace, args.members,
+              args.data_size, args.seed + i) for i in range(processes)]
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(_run_clients, tasks)
+    finally:
+        pool.close()
+
+    histogram = LatencyHistogram()
+    for process_histogram, _, _, _ in results:
+        histogram.merge(process_histogram)
+    seconds = max(result[3] for result in results) - min(result[2] for result in results)
+    return {
+        'requests': histogram.count,
+        'errors': sum(result[1] for result in results),
+        'seconds': round(seconds, 3),
+        'requests_per_second': round(histogram.count / seconds, 1),
+        'latency_usec': dict((name, histogram.percentile(percentile)) for name, percentile in PERCENTILES),
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Differences bigger than `tolerance` (a fraction) in the throughput or in the latency percentiles"""
+    regressions = []
+    for target in sorted(results):
+        if target not in baseline:
+            continue
+        result, expected = results[target], baseline[target]
+        if result['requests_per_second'] < expected['requests_per_second'] * (1 - tolerance):
+            regressions.append('{}: {} requests per second (baseline: {})'.format(
+                target, result['requests_per_second'], expected['requests_per_second']))
+        for name, _ in PERCENTILES:
+            if result['latency_usec'][name] > expected['latency_usec'][name] * (1 + tolerance):
+                regressions.append('{}: {} latency of {}us (baseline: {}us)'.format(
+                    target, name, result['latency_usec'][name], expected['latency_usec'][name]))
+    return regressions
+
+
+def wait_for_server(address, timeout=5):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            connect(address).close()
+            return
+        except socket.error:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def run_redis_benchmark(redis_server, port, args, mix):
+    """Run the benchmark against a temporary `redis-server` without persistence"""
+    data_dir = tempfile.mkdtemp(prefix='dredis-benchmark-')
+    process = subprocess.Popen([redis_server, '--port', str(port), '--save', '', '--appendonly', 'no'],
+                               cwd=data_dir, stdout=open('/dev/null', 'w'))
+    try:
+        address = ('127.0.0.1', port)
+        wait_for_server(address)
+        return run_benchmark(address, args, mix)
+    finally:
+        process.terminate()
+        process.wait()
+        shutil.rmtree(data_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='dredis host (defaults to %(default)s)')
+    parser.add_argument('--port', default=6377, type=int, help='dredis port (defaults to %(default)s)')
+    parser.add_argument('--unixsocket', default=None, help='dredis unix socket (instead of the host and port)')
+    parser.add_argument('--clients', default=50, type=int, help='concurrent connections (defaults to %(default)s)')
+    parser.add_argument('--pipeline', default=1, type=int, help='commands per pipeline (defaults to %(default)s)')
+    parser.add_argument('--requests', default=100000, type=int, help='total commands (defaults to %(default)s)')
+    parser.add_argument('--keyspace', default=10000, type=int,
+                        help='number of different keys per type (defaults to %(default)s)')
+    parser.add_argument('--members', default=100, type=int,
+                        help='number of different members of sets, hashes, and sorted sets (defaults to %(default)s)')
+    parser.add_argument('--data-size', default=3, type=int, help='bytes of the values (defaults to %(default)s)')
+    parser.add_argument('--commands', default='get=50,set=50',
+                        help='command mix with weights (defaults to %(default)s), available commands: {}'.format(
+                            ', '.join(sorted(COMMANDS))))
+    parser.add_argument('--processes', default=None, type=int,
+                        help='processes generating the load (defaults to the number of CPUs)')
+    parser.add_argument('--seed', default=0, type=int, help='seed of the random keys (defaults to %(default)s)')
+    parser.add_argument('--redis-server', default='redis-server',
+                        help='redis-server executable to run the same workload (defaults to %(default)s)')
+    parser.add_argument('--redis-port', default=6380, type=int,
+                        help='port of the temporary redis-server (defaults to %(default)s)')
+    parser.add_argument('--baseline', default=None, help='JSON output of a previous run to compare with')
+    parser.add_argument('--tolerance', default=0.1, type=float,
+                        help='fraction of the baseline that is not a regression (defaults to %(default)s)')
+    parser.add_argument('--output', default=None, help='write the JSON results to a file instead of stdout')
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.commands)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    workload = dict((name, getattr(args, name)) for name in ('clients', 'pipeline', 'requests', 'keyspace',
+                                                             'members', 'data_size', 'commands'))
+    address = args.unixsocket or (args.host, args.port)
+    results = {'dredis': run_benchmark(address, args, mix)}
+    redis_server = args.redis_server and find_executable(args.redis_server)
+    if redis_server:
+        results['redis'] = run_redis_benchmark(redis_server, args.redis_port, args, mix)
+    output = {'workload': workload, 'results': results}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['workload'] != workload:
+            parser.error('the baseline has a different workload: {}'.format(baseline['workload']))
+        output['regressions'] = compare_to_baseline(results, baseline['results'], args.tolerance)
+
+    content = json.dumps(output, indent=2, sort_keys=True, separators=(',', ': '))
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(content + '\n')
+    else:
+        print(content)
+    if output.get('regressions'):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
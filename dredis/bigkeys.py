@@ -0,0 +1,138 @@
+"""
+Find the biggest keys of a data directory, similar to `redis-cli --bigkeys` but offline.
+
+LevelDB only allows one process per database, so run it on a stopped server or on a snapshot (`dredis-snapshot`).
+Data directories of old versions of dredis have to be opened by `dredis` once to be converted to the current format.
+The databases are analyzed in parallel, one process per database.
+"""
+import argparse
+import heapq
+import multiprocessing
+import os
+
+import plyvel
+
+from dredis.keyspace import KEY_TYPE_NAMES, NUMBER_OF_REDIS_DATABASES
+from dredis.ldb import (
+    KEY_CODEC, LDB_STRING_TYPE, LDB_SET_TYPE, LDB_SET_MEMBER_TYPE, LDB_HASH_TYPE, LDB_HASH_FIELD_TYPE,
+    LDB_ZSET_TYPE, LDB_ZSET_VALUE_TYPE, LDB_ZSET_SCORE_TYPE, LDB_METADATA_TYPE,
+)
+
+# the ldb keys of the elements of each type, zsets have two ldb keys per element
+ELEMENT_KEY_TYPES = {
+    LDB_SET_MEMBER_TYPE: LDB_SET_TYPE,
+    LDB_HASH_FIELD_TYPE: LDB_HASH_TYPE,
+    LDB_ZSET_VALUE_TYPE: LDB_ZSET_TYPE,
+    LDB_ZSET_SCORE_TYPE: LDB_ZSET_TYPE,
+}
+# strings have one value instead of elements
+ELEMENT_NAMES = {'string': 'bytes', 'set': 'members', 'hash': 'fields', 'zset': 'members'}
+
+
+class TopKeys(object):
+    """The `size` keys with the highest values per type"""
+
+    def __init__(self, size):
+        self.size = size
+        self._heaps = {}
+
+    def add(self, type_name, key, value):
+        heap = self._heaps.setdefault(type_name, [])
+        if len(heap) < self.size:
+            heapq.heappush(heap, (value, key))
+        elif value > heap[0][0]:
+            heapq.heapreplace(heap, (value, key))
+
+    def get(self, type_name):
+        return sorted(self._heaps.get(type_name, []), reverse=True)
+
+
+def analyze_db(path, top=10):
+    """
+    Walk the database once and return the number of keys per type and the top keys by elements and by bytes
+    (the bytes are the sizes of the ldb keys and values before LevelDB's compression).
+    """
+    counts = dict.fromkeys(KEY_TYPE_NAMES.values(), 0)
+    top_by_elements = TopKeys(top)
+    top_by_bytes = TopKeys(top)
+    # (type, key) -> bytes of the elements of the key,
+    # they're only known after the whole database is read because the ldb keys are sorted by type first
+    element_bytes = {}
+
+    db = plyvel.DB(path, create_if_missing=False)
+    try:
+        for ldb_key, ldb_value in db.iterator():
+            type_id, key_length, key_value = KEY_CODEC.decode_key(ldb_key)
+            key = key_value[:key_length]
+            if type_id == LDB_METADATA_TYPE:
+                key_type, _, length, _ = KEY_CODEC.decode_metadata_value(ldb_value)
+                type_name = KEY_TYPE_NAMES[key_type]
+                counts[type_name] += 1
+                top_by_elements.add(type_name, key, length)
+                if key_type == LDB_STRING_TYPE:
+                    top_by_bytes.add(type_name, key, len(ldb_key) + len(ldb_value))
+            elif type_id in ELEMENT_KEY_TYPES:
+                parent = (ELEMENT_KEY_TYPES[type_id], key)
+                element_bytes[parent] = element_bytes.get(parent, 0) + len(ldb_key) + len(ldb_value)
+    finally:
+        db.close()
+
+    for (type_id, key), size in element_bytes.items():
+        top_by_bytes.add(KEY_TYPE_NAMES[type_id], key, size)
+    return counts, top_by_elements, top_by_bytes
+
+
+def _analyze_db(args):
+    # `multiprocessing.Pool.map()` only passes one argument
+    db_id, path, top = args
+    return db_id, analyze_db(path, top)
+
+
+def get_db_paths(data_dir):
+    for db_id in range(NUMBER_OF_REDIS_DATABASES):
+        path = os.path.join(data_dir, str(db_id))
+        if os.path.isdir(path):
+            yield db_id, path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dir', help='data directory of the server (the --dir option of dredis)')
+    parser.add_argument('--top', default=10, type=int, help='number of keys per type (defaults to %(default)s)')
+    parser.add_argument('--processes', default=None, type=int,
+                        help='number of databases analyzed in parallel (defaults to the number of CPUs)')
+    args = parser.parse_args()
+
+    tasks = [(db_id, path, args.top) for db_id, path in get_db_paths(args.dir)]
+    pool = multiprocessing.Pool(args.processes)
+    try:
+        results = pool.map(_analyze_db, tasks)
+    finally:
+        pool.close()
+
+    total_counts = dict.fromkeys(KEY_TYPE_NAMES.values(), 0)
+    for db_id, (counts, top_by_elements, top_by_bytes) in sorted(results):
+        if not any(counts.values()):
+            continue
+        print('# db{}'.format(db_id))
+        for type_name in sorted(counts):
+            total_counts[type_name] += counts[type_name]
+            if not counts[type_name]:
+                continue
+            element_name = ELEMENT_NAMES[type_name]
+            print('Top {} {} keys by {}:'.format(args.top, type_name, element_name))
+            for value, key in top_by_elements.get(type_name):
+                print('  {!r} has {} {}'.format(key, value, element_name))
+            if type_name != 'string':
+                print('Top {} {} keys by bytes:'.format(args.top, type_name))
+                for value, key in top_by_bytes.get(type_name):
+                    print('  {!r} has {} bytes'.format(key, value))
+        print('')
+
+    print('-------- summary -------')
+    for type_name in sorted(total_counts):
+        print('{} {}s'.format(total_counts[type_name], type_name))
+
+
+if __name__ == '__main__':
+    main()
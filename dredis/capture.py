@@ -0,0 +1,105 @@
+import logging
+import os.path
+import struct
+import time
+
+logger = logging.getLogger('dredis')
+
+CAPTURE_HEADER = 'DREDIS-CAPTURE-1\n'
+# timestamp | client id | length of the command, a length of 0 means the connection was closed
+CAPTURE_RECORD_FORMAT = '>dII'
+CAPTURE_RECORD_LENGTH = struct.calcsize(CAPTURE_RECORD_FORMAT)
+
+
+def encode_command(args):
+    parts = ['*{}\r\n'.format(len(args))]
+    for arg in args:
+        parts.append('${}\r\n{}\r\n'.format(len(arg), arg))
+    return ''.join(parts)
+
+
+def read_capture(f):
+    """Generate (timestamp, client id, RESP command or '' for closed connections) from a capture file"""
+    if f.read(len(CAPTURE_HEADER)) != CAPTURE_HEADER:
+        raise ValueError('not a dredis capture file')
+    while True:
+        record = f.read(CAPTURE_RECORD_LENGTH)
+        if len(record) < CAPTURE_RECORD_LENGTH:
+            # the end of the file, or a record cut short by a crash of the server
+            return
+        timestamp, client_id, length = struct.unpack(CAPTURE_RECORD_FORMAT, record)
+        command = f.read(length)
+        if len(command) < length:
+            return
+        yield timestamp, client_id, command
+
+
+class TrafficCapture(object):
+    """
+    Write the commands of the clients to a binary log for `dredis-replay` (`--capture` or `DEBUG CAPTURE`).
+
+    Whole connections are sampled (1 out of `sample_rate` clients) so the replayed connections have
+    all their commands (e.g. SELECT). The capture stops by itself when the file reaches `max_size` bytes.
+    A `max_size` of 0 means no limit.
+    Clients (`DEBUG CAPTURE START`) can only write to files in `directory` (the data directory of the server).
+    """
+
+    def __init__(self, directory='.'):
+        self.directory = directory
+        self._file = None
+        self.path = None
+        self.sample_rate = 1
+        self.max_size = 0
+        self.size = 0
+
+    def setup(self, directory):
+        self.directory = directory
+
+    @property
+    def running(self):
+        return self._file is not None
+
+    def get_output_path(self, filename):
+        directory = os.path.realpath(self.directory)
+        path = os.path.realpath(os.path.join(directory, filename))
+        if os.path.isabs(filename) or '..' in filename.split(os.path.sep) or os.path.dirname(path) != directory:
+            raise ValueError('the capture can only be written to a file in the data directory')
+        return path
+
+    def start(self, path, sample_rate=1, max_size=0):
+        if self.running:
+            raise ValueError('capture already running, use DEBUG CAPTURE STOP first')
+        if sample_rate < 1 or max_size < 0:
+            raise ValueError('the sample rate must be positive and the maximum size must not be negative')
+        self._file = open(path, 'wb')
+        self._file.write(CAPTURE_HEADER)
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_size = max_size
+        self.size = len(CAPTURE_HEADER)
+
+    def stop(self):
+        if not self.running:
+            raise ValueError('capture not running, use DEBUG CAPTURE START first')
+        capture_file, self._file = self._file, None
+        capture_file.close()
+
+    def record_command(self, client_id, args):
+        # DEBUG commands (e.g. DEBUG CAPTURE STOP) control the server that captured them and aren't replayed
+        if client_id % self.sample_rate == 0 and args[0].upper() != 'DEBUG':
+            self._write(client_id, encode_command(args))
+
+    def record_close(self, client_id):
+        if client_id % self.sample_rate == 0:
+            self._write(client_id, '')
+
+    def _write(self, client_id, command):
+        self._file.write(struct.pack(CAPTURE_RECORD_FORMAT, time.time(), client_id, len(command)))
+        self._file.write(command)
+        self.size += CAPTURE_RECORD_LENGTH + len(command)
+        if self.max_size and self.size >= self.max_size:
+            logger.info('Capture stopped, {} reached {} bytes'.format(self.path, self.size))
+            self.stop()
+
+
+CAPTURE = TrafficCapture()  # started by `main()` or `DEBUG CAPTURE START`
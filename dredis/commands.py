@@ -1,41 +1,57 @@
 import logging
-from functools import wraps
 
-from dredis.utils import to_float
+from dredis import __version__
+from dredis.capture import CAPTURE
+from dredis.hotkeys import HOTKEYS
+from dredis.info import get_info
+from dredis.profiler import PROFILER
+from dredis.slowlog import SLOWLOG
+from dredis.utils import ErrorReply, to_float
 
 logger = logging.getLogger(__name__)
 
 
 REDIS_COMMANDS = {}
+# dispatch table built at import time, it has the upper and lower case names of every command,
+# so the name sent by the client is only case-folded when it's in mixed case
+COMMAND_TABLE = {}
 SYNTAXERR = SyntaxError('syntax error')
 
 
 def _check_arity(expected_arity, passed_arity, cmd_name):
-    syntax_err = SyntaxError("wrong number of arguments for '{}' command".format(cmd_name.lower()))
     if expected_arity < 0:  # minimum arity
-        if passed_arity < -expected_arity:
-            raise syntax_err
+        valid = passed_arity >= -expected_arity
     elif expected_arity > 0:  # exact match
-        if passed_arity != expected_arity:  # exact arity
-            raise syntax_err
+        valid = passed_arity == expected_arity
     else:  # ignore
         # ignore arity of 0 (at the moment it's only for `COMMAND`).
         # it could be set to 1 but the redis source has it as 0, just following their implementation.
         # source: https://github.com/antirez/redis/blob/cb51bb4320d2240001e8fc4a522d59fb28259703/src/server.c#L296
         return
+    if not valid:
+        raise SyntaxError("wrong number of arguments for '{}' command".format(cmd_name.lower()))
 
 
-def command(cmd_name, arity):
+def command(cmd_name, arity, flags=(), first_key=0, last_key=0, step=0, touches_keys=True):
+    """
+    Register a command with the same metadata as Redis's command table
+    (`flags` and key positions are the ones returned by `COMMAND`).
+
+    Commands that inspect keys without accessing them (e.g. `OBJECT`) set `touches_keys=False`,
+    so they don't change the key frequencies (same as Redis's `LOOKUP_NOTOUCH`).
+    """
     def decorator(fn):
-        @wraps(fn)
-        def newfn(keyspace, *args, **kwargs):
-            # redis includes the command name in the arity, thus adding 1
-            passed_arity = 1 + len(args) + len(kwargs)
-            _check_arity(arity, passed_arity, cmd_name)
-            return fn(keyspace, *args, **kwargs)
-        newfn.arity = arity
-        REDIS_COMMANDS[cmd_name] = newfn
-        return newfn
+        fn.command_name = cmd_name
+        fn.arity = arity
+        fn.flags = flags
+        fn.first_key = first_key
+        fn.last_key = last_key
+        fn.step = step
+        fn.touches_keys = touches_keys
+        REDIS_COMMANDS[cmd_name] = fn
+        COMMAND_TABLE[cmd_name] = fn
+        COMMAND_TABLE[cmd_name.lower()] = fn
+        return fn
     return decorator
 
 
@@ -43,6 +59,17 @@ class SimpleString(str):
     pass
 
 
+class Double(str):
+    """Formatted float, sent as a bulk string in RESP2 and as a double in RESP3"""
+
+
+class Map(object):
+    """Field-value pairs, sent as a flat array in RESP2 and as a map in RESP3"""
+
+    def __init__(self, flat_pairs):
+        self.flat_pairs = flat_pairs
+
+
 """
 *******************
 * Server commands *
@@ -50,33 +77,135 @@ class SimpleString(str):
 """
 
 
-@command('COMMAND', arity=0)
-def cmd_command(keyspace):
-    result = []
-    for cmd in REDIS_COMMANDS:
-        result.append(cmd.upper())
-    return result
+@command('COMMAND', arity=0, flags=('random', 'loading', 'stale'))
+def cmd_command(keyspace, *args):
+    if not args:
+        return [_get_command_info(fn) for fn in REDIS_COMMANDS.values()]
+    subcommand = args[0].upper()
+    if subcommand == 'COUNT' and len(args) == 1:
+        return len(REDIS_COMMANDS)
+    elif subcommand == 'INFO':
+        return [_get_command_info(REDIS_COMMANDS[name.upper()]) if name.upper() in REDIS_COMMANDS else None
+                for name in args[1:]]
+    else:
+        raise SyntaxError('Unknown subcommand or wrong number of arguments.')
+
+
+def _get_command_info(fn):
+    return [
+        fn.command_name.lower(),
+        fn.arity,
+        [SimpleString(flag) for flag in fn.flags],
+        fn.first_key,
+        fn.last_key,
+        fn.step,
+    ]
 
 
-@command('FLUSHALL', arity=-1)
+@command('FLUSHALL', arity=-1, flags=('write',))
 def cmd_flushall(keyspace, *args):
     # TODO: we don't support ASYNC flushes
     keyspace.flushall()
     return SimpleString('OK')
 
 
-@command('FLUSHDB', arity=-1)
+@command('FLUSHDB', arity=-1, flags=('write',))
 def cmd_flushdb(keyspace, *args):
     # TODO: we don't support ASYNC flushes
     keyspace.flushdb()
     return SimpleString('OK')
 
 
-@command('DBSIZE', arity=1)
+@command('DBSIZE', arity=1, flags=('readonly', 'fast'))
 def cmd_dbsize(keyspace):
     return keyspace.dbsize()
 
 
+@command('INFO', arity=-1, flags=('random', 'loading', 'stale'))
+def cmd_info(keyspace, *sections):
+    return get_info(keyspace, sections)
+
+
+@command('SLOWLOG', arity=-2, flags=('admin', 'random', 'loading', 'stale'))
+def cmd_slowlog(keyspace, subcommand, *args):
+    subcommand = subcommand.upper()
+    if subcommand == 'GET' and len(args) <= 1:
+        count = int(args[0]) if args else 10
+        if count < 0:
+            count = None  # all entries
+        return SLOWLOG.get(count)
+    elif subcommand == 'LEN' and not args:
+        return len(SLOWLOG)
+    elif subcommand == 'RESET' and not args:
+        SLOWLOG.reset()
+        return SimpleString('OK')
+    else:
+        raise SyntaxError('Unknown subcommand or wrong number of arguments. Try SLOWLOG GET, LEN, or RESET.')
+
+
+@command('MEMORY', arity=-2, flags=('random', 'readonly'))
+def cmd_memory(keyspace, subcommand, *args):
+    # imported here because `dredis.memory` imports modules that depend on this module (e.g. `dredis.lua`)
+    from dredis.memory import get_memory_stats, MEMORY_DOCTOR
+
+    subcommand = subcommand.upper()
+    if subcommand == 'STATS' and not args:
+        return Map(get_memory_stats())
+    elif subcommand == 'DOCTOR' and not args:
+        return MEMORY_DOCTOR.diagnose()
+    elif subcommand == 'USAGE' and len(args) in (1, 3):
+        # `SAMPLES count` is accepted for compatibility, LevelDB's estimates don't need samples
+        if len(args) == 3 and args[1].upper() != 'SAMPLES':
+            raise SYNTAXERR
+        return keyspace.memory_usage(args[0])
+    else:
+        raise SyntaxError('Unknown subcommand or wrong number of arguments. Try MEMORY STATS, DOCTOR, or USAGE.')
+
+
+@command('DEBUG', arity=-1, flags=('admin', 'noscript', 'loading', 'stale'))
+def cmd_debug(keyspace, *args):
+    subcommand = args[0].upper() if args else None
+    action = args[1].upper() if len(args) > 1 else None
+    if subcommand == 'PROFILE' and action == 'START' and len(args) <= 3:
+        PROFILER.start(*[mode.lower() for mode in args[2:]])
+        return SimpleString('OK')
+    elif subcommand == 'PROFILE' and action == 'STOP' and len(args) == 3:
+        try:
+            PROFILER.stop(args[2])
+        except IOError as exc:
+            raise ValueError(str(exc))
+        return SimpleString('OK')
+    elif subcommand == 'CAPTURE' and action == 'START' and 3 <= len(args) <= 5:
+        try:
+            options = [int(value) for value in args[3:]]
+        except ValueError:
+            raise ValueError('value is not an integer or out of range')
+        try:
+            CAPTURE.start(CAPTURE.get_output_path(args[2]), *options)
+        except IOError as exc:
+            raise ValueError(str(exc))
+        return SimpleString('OK')
+    elif subcommand == 'CAPTURE' and action == 'STOP' and len(args) == 2:
+        CAPTURE.stop()
+        return SimpleString('OK')
+    elif subcommand == 'POPULATE' and 2 <= len(args) <= 6:
+        # same arguments as Redis's `DEBUG POPULATE count [prefix] [size]` plus the type and the number of elements
+        count, prefix, size, key_type, elements = (list(args[1:]) + [None] * 4)[:5]
+        try:
+            count = int(count)
+            size = int(size or 0)
+            elements = int(elements or 1)
+        except ValueError:
+            raise ValueError('value is not an integer or out of range')
+        keyspace.populate(count, prefix or 'key', size, (key_type or 'string').lower(), elements)
+        return SimpleString('OK')
+    else:
+        raise SyntaxError('Unknown subcommand or wrong number of arguments. '
+                          'Try DEBUG PROFILE START [cprofile|sampling], DEBUG PROFILE STOP filename, '
+                          'DEBUG CAPTURE START filename [sample-rate [max-size]], DEBUG CAPTURE STOP '
+                          'or DEBUG POPULATE count [prefix [size [string|set|hash|zset [elements]]]].')
+
+
 """
 ****************
 * Key commands *
@@ -84,22 +213,34 @@ def cmd_dbsize(keyspace):
 """
 
 
-@command('DEL', arity=-2)
+@command('DEL', arity=-2, flags=('write',), first_key=1, last_key=-1, step=1)
 def cmd_del(keyspace, *keys):
     return keyspace.delete(*keys)
 
 
-@command('TYPE', arity=2)
+@command('TYPE', arity=2, flags=('readonly', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_type(keyspace, key):
     return keyspace.type(key)
 
 
-@command('KEYS', arity=2)
+@command('KEYS', arity=2, flags=('readonly', 'sort_for_script'))
 def cmd_keys(keyspace, pattern):
     return keyspace.keys(pattern)
 
 
-@command('EXISTS', arity=-2)
+@command('OBJECT', arity=-2, flags=('readonly', 'random'), first_key=2, last_key=2, step=1, touches_keys=False)
+def cmd_object(keyspace, subcommand, *args):
+    if subcommand.upper() == 'FREQ' and len(args) == 1:
+        if not HOTKEYS.enabled:
+            raise SyntaxError('Key frequencies are not tracked, use --hotkeys-sample-rate to enable them.')
+        if keyspace.type(args[0]) == 'none':
+            return None
+        return HOTKEYS.get_frequency(args[0])
+    else:
+        raise SyntaxError('Unknown subcommand or wrong number of arguments. Try OBJECT FREQ key.')
+
+
+@command('EXISTS', arity=-2, flags=('readonly', 'fast'), first_key=1, last_key=-1, step=1)
 def cmd_exists(keyspace, *keys):
     return keyspace.exists(*keys)
 
@@ -111,17 +252,57 @@ def cmd_exists(keyspace, *keys):
 """
 
 
-@command('PING', arity=-1)
+@command('PING', arity=-1, flags=('stale', 'fast'))
 def cmd_ping(keyspace, message=SimpleString('PONG')):
     return message
 
 
-@command('SELECT', arity=2)
+@command('SELECT', arity=2, flags=('loading', 'fast'))
 def cmd_select(keyspace, db):
     keyspace.select(db)
     return SimpleString('OK')
 
 
+@command('HELLO', arity=-1, flags=('noscript', 'fast', 'loading', 'stale'))
+def cmd_hello(keyspace, protover=None, *args):
+    if args:
+        raise SyntaxError('No support for AUTH and SETNAME at the moment.')
+    if protover is not None:
+        if protover not in ('2', '3'):
+            raise ErrorReply('NOPROTO sorry this protocol version is not supported')
+        keyspace.protocol = int(protover)
+        if keyspace.protocol != 3:
+            # invalidation messages can't be pushed to RESP2 connections (same as enabling it with RESP2)
+            keyspace.disable_tracking()
+    return Map([
+        'server', 'dredis',
+        'version', __version__,
+        'proto', keyspace.protocol,
+        'id', keyspace.client_id,
+        'mode', 'standalone',
+        'role', 'master',
+        'modules', [],
+    ])
+
+
+@command('CLIENT', arity=-2, flags=('admin', 'noscript', 'random', 'loading', 'stale'))
+def cmd_client(keyspace, subcommand, *args):
+    subcommand = subcommand.upper()
+    if subcommand == 'ID' and not args:
+        return keyspace.client_id
+    elif subcommand == 'TRACKING' and len(args) == 1 and args[0].upper() in ('ON', 'OFF'):
+        if args[0].upper() == 'ON':
+            # invalidation messages are pushed to the same connection, which is only possible with RESP3
+            if keyspace.protocol != 3:
+                raise SyntaxError('No support for REDIRECT at the moment, use HELLO 3 before enabling tracking.')
+            keyspace.enable_tracking()
+        else:
+            keyspace.disable_tracking()
+        return SimpleString('OK')
+    else:
+        raise SYNTAXERR
+
+
 """
 *******************
 * String commands *
@@ -129,7 +310,7 @@ def cmd_select(keyspace, db):
 """
 
 
-@command('SET', arity=-3)
+@command('SET', arity=-3, flags=('write', 'denyoom'), first_key=1, last_key=1, step=1)
 def cmd_set(keyspace, key, value, *args):
     if len(args):
         raise SyntaxError('No support for EX|PX and NX|XX at the moment.')
@@ -137,22 +318,22 @@ def cmd_set(keyspace, key, value, *args):
     return SimpleString('OK')
 
 
-@command('GET', arity=2)
+@command('GET', arity=2, flags=('readonly', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_get(keyspace, key):
     return keyspace.get(key)
 
 
-@command('INCR', arity=2)
+@command('INCR', arity=2, flags=('write', 'denyoom', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_incr(keyspace, key):
     return keyspace.incrby(key, 1)
 
 
-@command('INCRBY', arity=3)
+@command('INCRBY', arity=3, flags=('write', 'denyoom', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_incrby(keyspace, key, increment):
     return keyspace.incrby(key, int(increment))
 
 
-@command('GETRANGE', arity=4)
+@command('GETRANGE', arity=4, flags=('readonly',), first_key=1, last_key=1, step=1)
 def cmd_getrange(keyspace, key, start, end):
     return keyspace.getrange(key, int(start), int(end))
 
@@ -164,7 +345,7 @@ def cmd_getrange(keyspace, key, start, end):
 """
 
 
-@command('SADD', arity=-3)
+@command('SADD', arity=-3, flags=('write', 'denyoom', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_sadd(keyspace, key, *values):
     count = 0
     for value in values:
@@ -172,17 +353,17 @@ def cmd_sadd(keyspace, key, *values):
     return count
 
 
-@command('SMEMBERS', arity=2)
+@command('SMEMBERS', arity=2, flags=('readonly', 'sort_for_script'), first_key=1, last_key=1, step=1)
 def cmd_smembers(keyspace, key):
     return keyspace.smembers(key)
 
 
-@command('SCARD', arity=2)
+@command('SCARD', arity=2, flags=('readonly', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_scard(keyspace, key):
     return keyspace.scard(key)
 
 
-@command('SISMEMBER', arity=3)
+@command('SISMEMBER', arity=3, flags=('readonly', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_sismember(keyspace, key, value):
     return int(keyspace.sismember(key, value))
 
@@ -194,7 +375,7 @@ def cmd_sismember(keyspace, key, value):
 """
 
 
-@command('EVAL', arity=-3)
+@command('EVAL', arity=-3, flags=('noscript', 'movablekeys'))
 def cmd_eval(keyspace, script, numkeys, *args):
     numkeys = int(numkeys)
     keys = args[:numkeys]
@@ -209,7 +390,7 @@ def cmd_eval(keyspace, script, numkeys, *args):
 """
 
 
-@command('ZADD', arity=-4)
+@command('ZADD', arity=-4, flags=('write', 'denyoom', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_zadd(keyspace, key, *flat_pairs):
     if len(flat_pairs) % 2 != 0:
         raise SYNTAXERR
@@ -222,7 +403,7 @@ def cmd_zadd(keyspace, key, *flat_pairs):
     return count
 
 
-@command('ZRANGE', arity=-4)
+@command('ZRANGE', arity=-4, flags=('readonly',), first_key=1, last_key=1, step=1)
 def cmd_zrange(keyspace, key, start, stop, *args):
     with_scores = False
     if args:
@@ -233,32 +414,36 @@ def cmd_zrange(keyspace, key, start, stop, *args):
     return keyspace.zrange(key, int(start), int(stop), with_scores)
 
 
-@command('ZCARD', arity=2)
+@command('ZCARD', arity=2, flags=('readonly', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_zcard(keyspace, key):
     return keyspace.zcard(key)
 
 
-@command('ZREM', arity=-3)
+@command('ZREM', arity=-3, flags=('write', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_zrem(keyspace, key, *members):
     return keyspace.zrem(key, *members)
 
 
-@command('ZSCORE', arity=3)
+@command('ZSCORE', arity=3, flags=('readonly', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_zscore(keyspace, key, member):
-    return keyspace.zscore(key, member)
+    score = keyspace.zscore(key, member)
+    if score is None:
+        return score
+    else:
+        return Double(score)
 
 
-@command('ZRANK', arity=3)
+@command('ZRANK', arity=3, flags=('readonly', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_zrank(keyspace, key, member):
     return keyspace.zrank(key, member)
 
 
-@command('ZCOUNT', arity=4)
+@command('ZCOUNT', arity=4, flags=('readonly', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_zcount(keyspace, key, min_score, max_score):
     return keyspace.zcount(key, min_score, max_score)
 
 
-@command('ZRANGEBYSCORE', arity=-4)
+@command('ZRANGEBYSCORE', arity=-4, flags=('readonly',), first_key=1, last_key=1, step=1)
 def cmd_zrangebyscore(keyspace, key, min_score, max_score, *args):
     withscores = False
     offset = 0
@@ -290,7 +475,7 @@ def _validate_zset_score(score):
         raise SyntaxError("min or max is not a float")
 
 
-@command('ZUNIONSTORE', arity=-4)
+@command('ZUNIONSTORE', arity=-4, flags=('write', 'denyoom', 'movablekeys'))
 def cmd_zunionstore(keyspace, destination, numkeys, *args):
     keys = []
     weights = []
@@ -316,7 +501,7 @@ def cmd_zunionstore(keyspace, destination, numkeys, *args):
 """
 
 
-@command('HSET', arity=-4)
+@command('HSET', arity=-4, flags=('write', 'denyoom', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_hset(keyspace, key, *pairs):
     if len(pairs) % 2 != 0:
         # HSET is going to replace HMSET,
@@ -328,55 +513,69 @@ def cmd_hset(keyspace, key, *pairs):
     return count
 
 
-@command('HDEL', arity=-3)
+@command('HDEL', arity=-3, flags=('write', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_hdel(keyspace, key, *fields):
     return keyspace.hdel(key, *fields)
 
 
-@command('HSETNX', arity=4)
+@command('HSETNX', arity=4, flags=('write', 'denyoom', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_hsetnx(keyspace, key, field, value):
     return keyspace.hsetnx(key, field, value)
 
 
-@command('HGET', arity=3)
+@command('HGET', arity=3, flags=('readonly', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_hget(keyspace, key, value):
     return keyspace.hget(key, value)
 
 
-@command('HKEYS', arity=2)
+@command('HKEYS', arity=2, flags=('readonly', 'sort_for_script'), first_key=1, last_key=1, step=1)
 def cmd_hkeys(keyspace, key):
     return keyspace.hkeys(key)
 
 
-@command('HVALS', arity=2)
+@command('HVALS', arity=2, flags=('readonly', 'sort_for_script'), first_key=1, last_key=1, step=1)
 def cmd_hvals(keyspace, key):
     return keyspace.hvals(key)
 
 
-@command('HLEN', arity=2)
+@command('HLEN', arity=2, flags=('readonly', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_hlen(keyspace, key):
     return keyspace.hlen(key)
 
 
-@command('HINCRBY', arity=4)
+@command('HINCRBY', arity=4, flags=('write', 'denyoom', 'fast'), first_key=1, last_key=1, step=1)
 def cmd_hincrby(keyspace, key, field, increment):
     return keyspace.hincrby(key, field, increment)
 
 
-@command('HGETALL', arity=2)
+@command('HGETALL', arity=2, flags=('readonly', 'random'), first_key=1, last_key=1, step=1)
 def cmd_hgetall(keyspace, key):
-    return keyspace.hgetall(key)
+    return Map(keyspace.hgetall(key))
 
 
 class CommandNotFound(Exception):
     """Exception to flag not found Redis command"""
 
 
-def run_command(keyspace, cmd, args):
-    logger.debug('[run_command] cmd={}, args={}'.format(repr(cmd), repr(args)))
+def get_command(cmd):
+    fn = COMMAND_TABLE.get(cmd)
+    if fn is None:
+        fn = COMMAND_TABLE.get(cmd.upper())
+        if fn is None:
+            raise CommandNotFound("unknown command '{}'".format(cmd))
+    return fn
 
-    str_args = map(str, args)
-    if cmd.upper() not in REDIS_COMMANDS:
-        raise CommandNotFound("unknown command '{}'".format(cmd))
-    else:
-        return REDIS_COMMANDS[cmd.upper()](keyspace, *str_args)
+
+def call_command(keyspace, fn, args):
+    """`args` must be strings (the parser already returns strings)"""
+    # redis includes the command name in the arity, thus adding 1
+    _check_arity(fn.arity, len(args) + 1, fn.command_name)
+    if HOTKEYS.sample_rate and fn.first_key and fn.touches_keys:
+        HOTKEYS.record_command(args, fn.first_key, fn.last_key, fn.step)
+    return fn(keyspace, *args)
+
+
+def run_command(keyspace, cmd, args):
+    # the server logs its commands on its own, only debug logs of Lua calls are left here
+    logger.debug('[run_command] cmd=%r, args=%r', cmd, args)
+    return call_command(keyspace, get_command(cmd), args)
@@ -0,0 +1,119 @@
+from dredis.commands import SimpleString, Double, Map
+from dredis.utils import ErrorReply, LazyCollection, Push
+
+CRLF = '\r\n'
+NIL_REPLY = '$-1\r\n'
+RESP3_NULL_REPLY = '_\r\n'
+
+# pre-computed replies and headers, similar to `shared.integers`, `shared.bulkhdr`, and `shared.mbulkhdr` in Redis
+SHARED_INTEGERS = 10000
+SHARED_HEADERS = 1024
+INTEGER_REPLIES = [':%d\r\n' % i for i in range(SHARED_INTEGERS)]
+BULK_HEADERS = ['$%d\r\n' % i for i in range(SHARED_HEADERS)]
+ARRAY_HEADERS = ['*%d\r\n' % i for i in range(SHARED_HEADERS)]
+
+
+class Encoder(object):
+    """
+    Encode replies to the Redis protocol (RESP2 or RESP3).
+
+    Small pieces of the reply are joined together in a single segment,
+    but bulk strings larger than `LARGE_VALUE_SIZE` become segments of their own,
+    this way large values aren't copied before they're sent to the client.
+
+    `LazyCollection` objects become generators of segments,
+    their elements are only read and encoded when the client is ready to receive them.
+    """
+
+    LARGE_VALUE_SIZE = 16 * 1024
+    # number of encoded elements of a `LazyCollection` per segment
+    STREAM_BATCH_SIZE = 1024
+
+    def __init__(self, protocol=2):
+        self._protocol = protocol
+        self._null_reply = NIL_REPLY if protocol == 2 else RESP3_NULL_REPLY
+        self._pieces = []
+        self._segments = []
+
+    def encode(self, obj):
+        self._encode(obj)
+        return self._flush()
+
+    def _flush(self):
+        self._join_pieces()
+        segments = self._segments
+        self._segments = []
+        return segments
+
+    def _stream(self, collection):
+        # a new encoder is necessary because other replies may be encoded before this generator is done
+        encoder = Encoder(self._protocol)
+        for i, element in enumerate(collection, start=1):
+            encoder._encode(element)
+            if i % self.STREAM_BATCH_SIZE == 0:
+                for segment in encoder._flush():
+                    yield segment
+        for segment in encoder._flush():
+            yield segment
+
+    def _join_pieces(self):
+        if self._pieces:
+            self._segments.append(''.join(self._pieces))
+            del self._pieces[:]
+
+    def _encode(self, elem):
+        pieces = self._pieces
+        # the exact type check is a shortcut for the most common reply (other string replies are `str` subclasses)
+        if type(elem) is str:
+            self._encode_bulk_string(elem)
+        elif elem is None:
+            pieces.append(self._null_reply)
+        elif isinstance(elem, (int, long)):
+            pieces.append(INTEGER_REPLIES[elem] if 0 <= elem < SHARED_INTEGERS else ':%d\r\n' % elem)
+        elif isinstance(elem, SimpleString):
+            pieces.append('+%s\r\n' % elem)
+        elif isinstance(elem, Double):
+            if self._protocol == 3:
+                pieces.append(',%s\r\n' % elem)
+            else:
+                self._encode_bulk_string(elem)
+        elif isinstance(elem, basestring):
+            self._encode_bulk_string(elem)
+        elif isinstance(elem, Push):
+            self._encode_elements('>' if self._protocol == 3 else '*', len(elem), elem)
+        elif isinstance(elem, (set, list, tuple, LazyCollection)):
+            length = len(elem)
+            pieces.append(ARRAY_HEADERS[length] if length < SHARED_HEADERS else '*%d\r\n' % length)
+            self._encode_elements(None, length, elem)
+        elif isinstance(elem, Map):
+            if self._protocol == 3:
+                self._encode_elements('%', len(elem.flat_pairs) // 2, elem.flat_pairs)
+            else:
+                self._encode(elem.flat_pairs)
+        elif isinstance(elem, ErrorReply):
+            pieces.append('-%s\r\n' % elem)
+        elif isinstance(elem, Exception):
+            pieces.append('-ERR %s\r\n' % elem)
+        else:
+            assert False, 'couldnt catch a response for {} (type {})'.format(repr(elem), type(elem))
+
+    def _encode_bulk_string(self, elem):
+        pieces = self._pieces
+        length = len(elem)
+        pieces.append(BULK_HEADERS[length] if length < SHARED_HEADERS else '$%d\r\n' % length)
+        if length >= self.LARGE_VALUE_SIZE:
+            self._join_pieces()
+            self._segments.append(elem)
+        else:
+            pieces.append(elem)
+        pieces.append(CRLF)
+
+    def _encode_elements(self, type_prefix, length, elements):
+        if type_prefix is not None:
+            self._pieces.append('%s%d\r\n' % (type_prefix, length))
+        if isinstance(elements, LazyCollection) and len(elements) > self.STREAM_BATCH_SIZE:
+            self._join_pieces()
+            self._segments.append(self._stream(elements))
+        else:
+            for element in elements:
+                self._encode(element)
@@ -0,0 +1,124 @@
+import heapq
+
+
+class CountMinSketch(object):
+    """
+    Approximate access counters for any number of keys in a fixed amount of memory.
+
+    Every key increments one counter per row and its estimate is the minimum of its counters,
+    so estimates can be higher than the real counts (because of hash collisions) but never lower.
+    """
+
+    def __init__(self, width=4096, depth=4):
+        self.width = width
+        self.depth = depth
+        self._rows = [[0] * width for _ in range(depth)]
+
+    def _get_positions(self, key):
+        # double hashing (`h1 + i * h2`) instead of one hash function per row
+        h1 = hash(key)
+        h2 = (h1 >> 16) | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key, count=1):
+        estimate = None
+        for row, position in zip(self._rows, self._get_positions(key)):
+            row[position] += count
+            if estimate is None or row[position] < estimate:
+                estimate = row[position]
+        return estimate
+
+    def estimate(self, key):
+        return min(row[position] for row, position in zip(self._rows, self._get_positions(key)))
+
+    def halve(self):
+        for row in self._rows:
+            row[:] = [counter >> 1 for counter in row]
+
+
+class HotKeys(object):
+    """
+    Sampled LFU counters to find the keys that dominate the traffic (`OBJECT FREQ`, `INFO hotkeys`).
+
+    The keys of 1 out of `sample_rate` commands are counted in a count-min sketch
+    and the `top_size` most frequent keys are kept in a min-heap.
+    The counters are halved every `decay_time` seconds, so keys that stop being accessed become cold again
+    (similar to Redis's `lfu-decay-time`).
+    A `sample_rate` of 0 disables the counters.
+    """
+
+    TOP_SIZE = 32
+    DECAY_TIME = 60  # in seconds
+
+    def __init__(self, sample_rate=0, top_size=TOP_SIZE, decay_time=DECAY_TIME, sketch=None):
+        self.sample_rate = sample_rate
+        self.top_size = top_size
+        self.decay_time = decay_time
+        self.sampled_commands = 0
+        self._sketch = sketch or CountMinSketch()
+        self._countdown = sample_rate
+        self._top = {}  # key -> estimate
+        # (estimate, key) of the keys in `self._top`, the estimates are updated lazily,
+        # so an entry may be lower than the current estimate of its key (but never higher)
+        self._heap = []
+        self._last_decay = None
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def setup(self, sample_rate):
+        self.sample_rate = sample_rate
+        self._countdown = sample_rate
+
+    def record_command(self, args, first_key, last_key, step):
+        """`args` don't include the command name, but the key positions do (same as Redis's command table)"""
+        self._countdown -= 1
+        if self._countdown > 0:
+            return
+        self._countdown = self.sample_rate
+        self.sampled_commands += 1
+        if last_key < 0:
+            last_key += len(args) + 1
+        for key in args[first_key - 1:last_key:step]:
+            self._update_top(key, self._sketch.add(key, self.sample_rate))
+
+    def _update_top(self, key, estimate):
+        if key in self._top:
+            self._top[key] = estimate
+            return
+        if len(self._top) >= self.top_size:
+            if estimate <= self._heap[0][0]:
+                return
+            while True:
+                count, coldest_key = heapq.heappop(self._heap)
+                if self._top[coldest_key] != count:
+                    # outdated entry
+                    heapq.heappush(self._heap, (self._top[coldest_key], coldest_key))
+                elif estimate > count:
+                    del self._top[coldest_key]
+                    break
+                else:
+                    heapq.heappush(self._heap, (count, coldest_key))
+                    return
+        self._top[key] = estimate
+        heapq.heappush(self._heap, (estimate, key))
+
+    def get_frequency(self, key):
+        return self._sketch.estimate(key)
+
+    def get_top(self):
+        return sorted(self._top.items(), key=lambda item: (-item[1], item[0]))
+
+    def decay(self, now):
+        if self._last_decay is None:
+            self._last_decay = now
+        elif now - self._last_decay >= self.decay_time:
+            self._last_decay = now
+            self._sketch.halve()
+            self._top = dict((key, estimate >> 1) for key, estimate in self._top.items())
+            self._heap = [(estimate, key) for key, estimate in self._top.items()]
+            heapq.heapify(self._heap)
+
+
+HOTKEYS = HotKeys()  # configured by `main()`
@@ -0,0 +1,150 @@
+import collections
+import os
+import platform
+import re
+
+from dredis import __version__
+from dredis.hotkeys import HOTKEYS
+from dredis.ldb import LEVELDB
+from dredis.stats import STATS
+from dredis.tracking import TRACKING_TABLE
+
+# `keyspace` and `leveldb` aren't default sections because
+# counting the keys iterates over all databases (the number of keys isn't stored anywhere)
+DEFAULT_SECTIONS = ('server', 'clients', 'stats')
+LATENCY_PERCENTILES = (50, 99, 99.9)
+# same columns as the output of `leveldb.stats`
+LEVELDB_STATS_COLUMNS = ('files', 'size_mb', 'time_sec', 'read_mb', 'write_mb')
+LEVELDB_STATS_ROW = re.compile(r'^\s*(\d+)((?:\s+[\d.]+){5})\s*$')
+
+
+def get_info(keyspace, sections=()):
+    sections = [section.lower() for section in sections]
+    if not sections or sections == ['default']:
+        sections = DEFAULT_SECTIONS
+    elif 'all' in sections or 'everything' in sections:
+        sections = SECTIONS.keys()
+    result = []
+    for name, section_fn in SECTIONS.items():
+        if name in sections:
+            lines = ['# {}'.format(name.capitalize())]
+            lines.extend('{}:{}'.format(field, value) for field, value in section_fn(keyspace))
+            result.append('\r\n'.join(lines))
+    if not result:
+        return ''
+    return '\r\n\r\n'.join(result) + '\r\n'
+
+
+def _format_values(values):
+    return ','.join('{}={}'.format(field, value) for field, value in values)
+
+
+def _get_server_info(keyspace):
+    uptime = STATS.uptime
+    return [
+        ('dredis_version', __version__),
+        ('redis_mode', 'standalone'),
+        ('os', '{} {} {}'.format(platform.system(), platform.release(), platform.machine())),
+        ('python_version', platform.python_version()),
+        ('multiplexing_api', 'poll'),
+        ('process_id', os.getpid()),
+        ('uptime_in_seconds', uptime),
+        ('uptime_in_days', uptime // 86400),
+    ]
+
+
+def _get_clients_info(keyspace):
+    return [
+        ('connected_clients', STATS.connected_clients),
+        ('tracking_clients', TRACKING_TABLE.tracking_clients),
+    ]
+
+
+def _get_stats_info(keyspace):
+    return [
+        ('total_connections_received', STATS.total_connections_received),
+        ('total_commands_processed', STATS.total_commands_processed),
+        ('instantaneous_ops_per_sec', STATS.instantaneous_ops_per_sec),
+        ('tracking_total_keys', TRACKING_TABLE.tracked_keys),
+        ('tracking_evicted_keys', TRACKING_TABLE.evicted_keys),
+        ('throttled_turns', STATS.throttled_turns),
+        ('commands_run_in_extra_turns', STATS.commands_run_in_extra_turns),
+        ('leveldb_level0_files', STATS.leveldb_level0_files),
+        ('write_stalls', STATS.write_stalls),
+        ('throttled_writers', STATS.throttled_writers),
+    ]
+
+
+def _get_commandstats_info(keyspace):
+    result = []
+    for name, stats in sorted(STATS.commands.items()):
+        result.append(('cmdstat_{}'.format(name.lower()), _format_values([
+            ('calls', stats.calls),
+            ('usec', stats.usec),
+            ('usec_per_call', '{:.2f}'.format(float(stats.usec) / stats.calls)),
+            ('failed_calls', stats.failed_calls),
+        ] + stats.io.items())))
+    return result
+
+
+def _get_latencystats_info(keyspace):
+    result = []
+    for name, stats in sorted(STATS.commands.items()):
+        percentiles = [('p{:g}'.format(p), '{:.3f}'.format(stats.histogram.percentile(p)))
+                       for p in LATENCY_PERCENTILES]
+        result.append(('latency_percentiles_usec_{}'.format(name.lower()), _format_values(percentiles)))
+    return result
+
+
+def _get_hotkeys_info(keyspace):
+    result = [
+        ('hotkeys_sample_rate', HOTKEYS.sample_rate),
+        ('hotkeys_sampled_commands', HOTKEYS.sampled_commands),
+    ]
+    for rank, (key, frequency) in enumerate(HOTKEYS.get_top()):
+        result.append(('hotkey_{}'.format(rank), _format_values([('key', key), ('freq', frequency)])))
+    return result
+
+
+def _get_keyspace_info(keyspace):
+    result = []
+    for db_id in LEVELDB.get_db_ids():
+        keys = keyspace.dbsize(db_id)
+        if keys:
+            result.append(('db{}'.format(db_id), _format_values([('keys', keys), ('expires', 0), ('avg_ttl', 0)])))
+    return result
+
+
+def _get_leveldb_info(keyspace):
+    result = []
+    for db_id in LEVELDB.get_db_ids():
+        db = LEVELDB.get_db(db_id)
+        result.append(('db{}_approximate_memory_usage'.format(db_id),
+                       db.get_property(b'leveldb.approximate-memory-usage')))
+        for level, values in get_leveldb_levels(db):
+            result.append(('db{}_level{}'.format(db_id, level), _format_values(values)))
+    return result
+
+
+def get_leveldb_levels(db):
+    """(level, [(column, value), ...]) of the levels of a LevelDB database that have files"""
+    result = []
+    # `leveldb.stats` is a table with one row per level that has files
+    for line in (db.get_property(b'leveldb.stats') or '').splitlines():
+        match = LEVELDB_STATS_ROW.match(line)
+        if match:
+            level, values = match.groups()
+            result.append((int(level), zip(LEVELDB_STATS_COLUMNS, values.split())))
+    return result
+
+
+SECTIONS = collections.OrderedDict([
+    ('server', _get_server_info),
+    ('clients', _get_clients_info),
+    ('stats', _get_stats_info),
+    ('commandstats', _get_commandstats_info),
+    ('latencystats', _get_latencystats_info),
+    ('hotkeys', _get_hotkeys_info),
+    ('keyspace', _get_keyspace_info),
+    ('leveldb', _get_leveldb_info),
+])
@@ -1,12 +1,31 @@
 import collections
 import fnmatch
+from functools import wraps
 
-from dredis.ldb import LEVELDB, LDB_KEY_TYPES, KEY_CODEC
+from dredis.ldb import (
+    LEVELDB, KEY_CODEC, LDB_STRING_TYPE, LDB_SET_TYPE, LDB_HASH_TYPE, LDB_ZSET_TYPE, LDB_STRING_METADATA_PREFIX,
+)
 from dredis.lua import LuaRunner
-from dredis.utils import to_float
+from dredis.populate import populate
+from dredis.tracking import TRACKING_TABLE
+from dredis.utils import ErrorReply, to_float, LazyCollection
 
 DEFAULT_REDIS_DB = '0'
+WRONGTYPE_ERROR = 'WRONGTYPE Operation against a key holding the wrong kind of value'
 NUMBER_OF_REDIS_DATABASES = 16
+KEY_TYPE_NAMES = {
+    LDB_STRING_TYPE: 'string',
+    LDB_SET_TYPE: 'set',
+    LDB_HASH_TYPE: 'hash',
+    LDB_ZSET_TYPE: 'zset',
+}
+# the prefixes of the ldb keys of the elements of each type, strings are stored in their metadata
+ELEMENT_PREFIX_FNS = {
+    LDB_STRING_TYPE: (),
+    LDB_SET_TYPE: (KEY_CODEC.get_min_set_member,),
+    LDB_HASH_TYPE: (KEY_CODEC.get_min_hash_field,),
+    LDB_ZSET_TYPE: (KEY_CODEC.get_min_zset_score, KEY_CODEC.get_min_zset_value),
+}
 
 
 def to_float_string(f):
@@ -15,39 +34,102 @@ def to_float_string(f):
     return "{:.17g}".format(float(f))
 
 
+def reads_key(fn):
+    """Remember the key (the first argument) for client-side caching if the client enabled tracking"""
+    @wraps(fn)
+    def newfn(self, key, *args, **kwargs):
+        if self.tracking:
+            TRACKING_TABLE.remember(self.client_id, key)
+        return fn(self, key, *args, **kwargs)
+    return newfn
+
+
+def writes_key(fn):
+    """Invalidate the key (the first argument) in the clients that are caching it"""
+    @wraps(fn)
+    def newfn(self, key, *args, **kwargs):
+        try:
+            return fn(self, key, *args, **kwargs)
+        finally:
+            TRACKING_TABLE.invalidate(key)
+    return newfn
+
+
 class Keyspace(object):
 
-    def __init__(self):
-        self._lua_runner = LuaRunner(self)
+    # there's one keyspace per client connection, so it should be as small as possible
+    __slots__ = ('_current_db', 'protocol', 'client_id', 'tracking', '_push_fn')
+
+    def __init__(self, client_id=None, push_fn=None):
         self._current_db = DEFAULT_REDIS_DB
         self._set_db(self._current_db)
+        self.protocol = 2  # changed by `HELLO`
+        self.client_id = client_id
+        self.tracking = False
+        self._push_fn = push_fn  # sends out-of-band messages to the client (e.g. invalidations)
 
     def _set_db(self, db):
         self._current_db = str(db)
 
+    def enable_tracking(self):
+        self.tracking = True
+        TRACKING_TABLE.enable(self.client_id, self._push_fn)
+
+    def disable_tracking(self):
+        if self.tracking:
+            self.tracking = False
+            TRACKING_TABLE.disable(self.client_id)
+
     def flushall(self):
         LEVELDB.delete_dbs()
+        TRACKING_TABLE.invalidate_all()
 
     def flushdb(self):
         LEVELDB.delete_db(self._current_db)
+        TRACKING_TABLE.invalidate_all()
 
     def select(self, db):
         self._set_db(db)
 
+    def populate(self, count, prefix='key', size=0, key_type='string', elements=1):
+        # the keys were missing, but clients may have cached that they were missing
+        return populate(self._ldb, count, prefix, size, key_type, elements, created_fn=TRACKING_TABLE.invalidate)
+
+    @writes_key
     def incrby(self, key, increment=1):
         number = self.get(key)
         if number is None:
             number = '0'
         result = int(number) + increment
-        self.set(key, str(result))
+        # the key is a string or doesn't exist, so there's nothing to delete before writing it
+        self._put_string(key, str(result))
         return result
 
+    @reads_key
     def get(self, key):
-        return self._ldb.get(KEY_CODEC.encode_string(key))
+        metadata = self._get_metadata(key)
+        if metadata is None:
+            return None
+        if metadata[0] != LDB_STRING_TYPE:
+            raise ErrorReply(WRONGTYPE_ERROR)
+        return metadata[3]
 
+    @writes_key
     def set(self, key, value):
-        self._ldb.put(KEY_CODEC.encode_string(key), value)
-
+        # SET replaces keys of any type (same as Redis), the elements of a collection are deleted with it.
+        # LevelDB can't read only the header of the metadata, so the old string is read too,
+        # but only its first byte is checked unless it's a collection
+        db = self._ldb
+        metadata_key = KEY_CODEC.encode_metadata(key)
+        old_metadata = db.get(metadata_key)
+        if old_metadata is not None and old_metadata[:1] != LDB_STRING_METADATA_PREFIX:
+            self._delete_ldb_key(key, KEY_CODEC.decode_metadata_value(old_metadata)[0])
+        db.put(metadata_key, KEY_CODEC.encode_metadata_value(LDB_STRING_TYPE, len(value), value))
+
+    def _put_string(self, key, value):
+        self._ldb.put(KEY_CODEC.encode_metadata(key), KEY_CODEC.encode_metadata_value(LDB_STRING_TYPE, len(value), value))
+
+    @reads_key
     def getrange(self, key, start, end):
         value = self.get(key)
         if value is None:
@@ -58,96 +140,102 @@ class Keyspace(object):
             end += 1  # inclusive
             return value[start:end]
 
+    @writes_key
     def sadd(self, key, value):
         if self._ldb.get(KEY_CODEC.encode_set_member(key, value)) is None:
-            length = int(self._ldb.get(KEY_CODEC.encode_set(key)) or b'0')
+            length = self._get_length_before_write(key, LDB_SET_TYPE)
             with self._ldb.write_batch() as batch:
-                batch.put(KEY_CODEC.encode_set(key), bytes(length + 1))
+                batch.put(KEY_CODEC.encode_metadata(key), KEY_CODEC.encode_metadata_value(LDB_SET_TYPE, length + 1))
                 batch.put(KEY_CODEC.encode_set_member(key, value), bytes(''))
             return 1
         else:
             return 0
 
+    @reads_key
     def smembers(self, key):
-        result = set()
-        if self._ldb.get(KEY_CODEC.encode_set(key)):
-            for db_key, _ in self._get_ldb_prefix_iterator(KEY_CODEC.get_min_set_member(key)):
-                _, length, member_key = KEY_CODEC.decode_key(db_key)
-                member_value = member_key[length:]
-                result.add(member_value)
-        return result
+        # the snapshot guarantees the members match the length even if the set changes while the reply is sent
+        snapshot = self._ldb.snapshot()
+        length = self._get_length(key, LDB_SET_TYPE, snapshot)
+
+        def iterator():
+            for db_key, _ in self._get_ldb_prefix_iterator(KEY_CODEC.get_min_set_member(key), snapshot):
+                _, key_length, member_key = KEY_CODEC.decode_key(db_key)
+                yield member_key[key_length:]
 
+        return LazyCollection(iterator, length)
+
+    @reads_key
     def sismember(self, key, value):
         return self._ldb.get(KEY_CODEC.encode_set_member(key, value)) is not None
 
+    @reads_key
     def scard(self, key):
-        length = self._ldb.get(KEY_CODEC.encode_set(key))
-        if length is None:
-            return 0
-        else:
-            return int(length)
+        return self._get_length(key, LDB_SET_TYPE)
 
     def delete(self, *keys):
         result = 0
         for key in keys:
-            if self._ldb.get(KEY_CODEC.encode_string(key)) is not None:
-                self._delete_ldb_string(key)
-                result += 1
-            elif self._ldb.get(KEY_CODEC.encode_set(key)) is not None:
-                self._delete_ldb_set(key)
-                result += 1
-            elif self._ldb.get(KEY_CODEC.encode_hash(key)) is not None:
-                self._delete_ldb_hash(key)
-                result += 1
-            elif self._ldb.get(KEY_CODEC.encode_zset(key)) is not None:
-                self._delete_ldb_zset(key)
+            TRACKING_TABLE.invalidate(key)
+            metadata = self._get_metadata(key)
+            if metadata is not None:
+                self._delete_ldb_key(key, metadata[0])
                 result += 1
         return result
 
-    def _delete_ldb_string(self, key):
-        # there is one set of ldb keys for strings:
-        # * string
-        self._ldb.delete(KEY_CODEC.encode_string(key))
-
-    def _delete_ldb_set(self, key):
-        # there are two sets of ldb keys for sets:
-        # * set
+    def _delete_ldb_key(self, key, type_id):
+        # the metadata and the ldb keys of the elements (strings don't have elements):
         # * set members
-        with self._ldb.write_batch() as batch:
-            batch.delete(KEY_CODEC.encode_set(key))
-            for db_key, _ in self._get_ldb_prefix_iterator(KEY_CODEC.get_min_set_member(key)):
-                batch.delete(db_key)
-
-    def _delete_ldb_hash(self, key):
-        # there are two sets of ldb keys for hashes:
-        # * hash
         # * hash fields
+        # * zset scores and zset values
         with self._ldb.write_batch() as batch:
-            batch.delete(KEY_CODEC.encode_hash(key))
-            for db_key, _ in self._get_ldb_prefix_iterator(KEY_CODEC.get_min_hash_field(key)):
-                batch.delete(db_key)
-
-    def _delete_ldb_zset(self, key):
-        # there are three sets of ldb keys for zsets:
-        # * zset
-        # * zset scores
-        # * zset values
-        with self._ldb.write_batch() as batch:
-            batch.delete(KEY_CODEC.encode_zset(key))
-            for db_key, _ in self._get_ldb_prefix_iterator(KEY_CODEC.get_min_zset_score(key)):
-                batch.delete(db_key)
-            for db_key, _ in self._get_ldb_prefix_iterator(KEY_CODEC.get_min_zset_value(key)):
-                batch.delete(db_key)
-
-    def _get_ldb_prefix_iterator(self, key_prefix):
-        for db_key, db_value in self._ldb.iterator(start=key_prefix, include_start=True):
+            batch.delete(KEY_CODEC.encode_metadata(key))
+            for prefix_fn in ELEMENT_PREFIX_FNS[type_id]:
+                for db_key, _ in self._get_ldb_prefix_iterator(prefix_fn(key)):
+                    batch.delete(db_key)
+
+    def _get_metadata(self, key, db=None):
+        """(type_id, flags, length, string value) of the key or `None` if it doesn't exist"""
+        if db is None:
+            db = self._ldb
+        metadata = db.get(KEY_CODEC.encode_metadata(key))
+        if metadata is None:
+            return None
+        return KEY_CODEC.decode_metadata_value(metadata)
+
+    def _get_length(self, key, type_id, db=None):
+        metadata = self._get_metadata(key, db)
+        if metadata is None or metadata[0] != type_id:
+            return 0
+        return metadata[2]
+
+    def _put_length(self, batch, key, type_id, length):
+        if length == 0:
+            # empty collections are removed from the keyspace, their last elements are deleted in the same batch
+            batch.delete(KEY_CODEC.encode_metadata(key))
+        else:
+            batch.put(KEY_CODEC.encode_metadata(key), KEY_CODEC.encode_metadata_value(type_id, length))
+
+    def _get_length_before_write(self, key, type_id):
+        """The length of the collection before it's written, keys of other types reply WRONGTYPE (same as Redis)"""
+        metadata = self._get_metadata(key)
+        if metadata is None:
+            return 0
+        if metadata[0] != type_id:
+            raise ErrorReply(WRONGTYPE_ERROR)
+        return metadata[2]
+
+    def _get_ldb_prefix_iterator(self, key_prefix, db=None):
+        if db is None:
+            db = self._ldb
+        for db_key, db_value in db.iterator(start=key_prefix, include_start=True):
             if db_key.startswith(key_prefix):
                 yield db_key, db_value
             else:
                 break
 
+    @writes_key
     def zadd(self, key, score, value):
-        zset_length = int(self._ldb.get(KEY_CODEC.encode_zset(key), '0'))
+        zset_length = self._get_length_before_write(key, LDB_ZSET_TYPE)
 
         db_score = self._ldb.get(KEY_CODEC.encode_zset_value(key, value))
         if db_score is not None:
@@ -162,41 +250,49 @@ class Keyspace(object):
             zset_length += 1
 
         with self._ldb.write_batch() as batch:
-            batch.put(KEY_CODEC.encode_zset(key), bytes(zset_length))
+            batch.put(KEY_CODEC.encode_metadata(key), KEY_CODEC.encode_metadata_value(LDB_ZSET_TYPE, zset_length))
             batch.put(KEY_CODEC.encode_zset_value(key, value), bytes(score))
             batch.put(KEY_CODEC.encode_zset_score(key, value, score), bytes(''))
 
         return result
 
+    @reads_key
     def zrange(self, key, start, stop, with_scores):
-        result = []
-
-        zset_length = int(self._ldb.get(KEY_CODEC.encode_zset(key), '0'))
+        snapshot = self._ldb.snapshot()
+        zset_length = self._get_length(key, LDB_ZSET_TYPE, snapshot)
         if stop < 0:
             end = zset_length + stop
         else:
             end = stop
+        end = min(end, zset_length - 1)
 
         if start < 0:
             begin = max(0, zset_length + start)
         else:
             begin = start
-        for i, (db_key, _) in enumerate(self._get_ldb_prefix_iterator(KEY_CODEC.get_min_zset_score(key))):
-            if i < begin:
-                continue
-            if i > end:
-                break
-            db_score = KEY_CODEC.decode_zset_score(db_key)
-            db_value = KEY_CODEC.decode_zset_value(db_key)
-            result.append(db_value)
-            if with_scores:
-                result.append(to_float_string(db_score))
-
-        return result
 
+        def iterator():
+            for i, (db_key, _) in enumerate(self._get_ldb_prefix_iterator(KEY_CODEC.get_min_zset_score(key), snapshot)):
+                if i < begin:
+                    continue
+                if i > end:
+                    break
+                db_score = KEY_CODEC.decode_zset_score(db_key)
+                db_value = KEY_CODEC.decode_zset_value(db_key)
+                yield db_value
+                if with_scores:
+                    yield to_float_string(db_score)
+
+        length = max(0, end - begin + 1)
+        if with_scores:
+            length *= 2
+        return LazyCollection(iterator, length)
+
+    @reads_key
     def zcard(self, key):
-        return int(self._ldb.get(KEY_CODEC.encode_zset(key), '0'))
+        return self._get_length(key, LDB_ZSET_TYPE)
 
+    @reads_key
     def zscore(self, key, member):
         result = self._ldb.get(KEY_CODEC.encode_zset_value(key, member))
         if result is None:
@@ -205,16 +301,18 @@ class Keyspace(object):
             return to_float_string(result)
 
     def eval(self, script, keys, argv):
-        return self._lua_runner.run(script, keys, argv)
+        return LuaRunner(self).run(script, keys, argv)
 
+    @writes_key
     def zrem(self, key, *members):
         """
         see zadd() for information about score and value structures
         """
         result = 0
-        zset_length = int(self._ldb.get(KEY_CODEC.encode_zset(key), '0'))
+        zset_length = self._get_length(key, LDB_ZSET_TYPE)
         with self._ldb.write_batch() as batch:
-            for member in members:
+            # repeated members are only removed once
+            for member in set(members):
                 score = self._ldb.get(KEY_CODEC.encode_zset_value(key, member))
                 if score is None:
                     continue
@@ -223,13 +321,11 @@ class Keyspace(object):
                 batch.delete(KEY_CODEC.encode_zset_value(key, member))
                 batch.delete(KEY_CODEC.encode_zset_score(key, member, score))
 
-        # empty zset should be removed from keyspace
-        if zset_length == 0:
-            self.delete(key)
-        else:
-            self._ldb.put(KEY_CODEC.encode_zset(key), bytes(zset_length))
+            if result:
+                self._put_length(batch, key, LDB_ZSET_TYPE, zset_length)
         return result
 
+    @reads_key
     def zrangebyscore(self, key, min_score, max_score, withscores=False, offset=0, count=float('+inf')):
         result = []
         num_elems_read = 0
@@ -254,6 +350,7 @@ class Keyspace(object):
                         result.append(to_float_string(db_score))
         return result
 
+    @reads_key
     def zcount(self, key, min_score, max_score):
         # TODO: optimize for performance. it's probably possible to create a new entry only for scores
         # like:
@@ -275,6 +372,7 @@ class Keyspace(object):
                 break
         return count
 
+    @reads_key
     def zrank(self, key, member):
         score = self._ldb.get(KEY_CODEC.encode_zset_value(key, member))
         if score is None:
@@ -292,13 +390,12 @@ class Keyspace(object):
                 break
         return rank
 
+    @writes_key
     def zunionstore(self, destination, keys, weights):
         union = collections.defaultdict(list)
         for (key, weight) in zip(keys, weights):
-            elem_with_scores = self.zrange(key, 0, -1, with_scores=True)
-            while elem_with_scores:
-                member = elem_with_scores.pop(0)
-                score = elem_with_scores.pop(0)
+            elem_with_scores = iter(self.zrange(key, 0, -1, with_scores=True))
+            for member, score in zip(elem_with_scores, elem_with_scores):
                 union[member].append(float(score) * weight)
         aggregate_fn = sum  # FIXME: redis also supports MIN and MAX
 
@@ -308,117 +405,138 @@ class Keyspace(object):
             result += self.zadd(destination, str(score), member)
         return result
 
+    @reads_key
     def type(self, key):
-        if self._ldb.get(KEY_CODEC.encode_string(key)):
-            return 'string'
-        if self._ldb.get(KEY_CODEC.encode_set(key)):
-            return 'set'
-        if self._ldb.get(KEY_CODEC.encode_hash(key)):
-            return 'hash'
-        if self._ldb.get(KEY_CODEC.encode_zset(key)):
-            return 'zset'
-        return 'none'
-
-    def keys(self, pattern):
-        level_db_keys = set()
-        for key, _ in self._ldb:
-            key_type, _, key_value = KEY_CODEC.decode_key(key)
-            if key_type not in LDB_KEY_TYPES:
-                continue
-            if pattern is None or fnmatch.fnmatch(key_value, pattern):
-                level_db_keys.add(key_value)
-        return level_db_keys
-
-    def dbsize(self):
-        return len(self.keys(pattern=None))
+        metadata = self._get_metadata(key)
+        if metadata is None:
+            return 'none'
+        return KEY_TYPE_NAMES[metadata[0]]
+
+    def memory_usage(self, key):
+        """
+        Approximate bytes used by the key without iterating over its elements:
+        the size of the metadata (with the string) plus LevelDB's `approximate_sizes()` of the element ranges.
+        LevelDB only estimates the data in its table files, so elements still in the memtable aren't counted.
+        """
+        ldb_key = KEY_CODEC.encode_metadata(key)
+        value = self._ldb.get(ldb_key)
+        if value is None:
+            return None
+        type_id = KEY_CODEC.decode_metadata_value(value)[0]
+        size = len(ldb_key) + len(value)
+        if ELEMENT_PREFIX_FNS[type_id]:
+            ranges = [KEY_CODEC.get_prefix_range(prefix_fn(key)) for prefix_fn in ELEMENT_PREFIX_FNS[type_id]]
+            size += sum(self._ldb.approximate_sizes(*ranges))
+        return size
+
+    def keys(self, pattern, db=None):
+        # the number of keys isn't stored anywhere,
+        # so the snapshot is iterated twice: first to count the keys and then to send them.
+        # only the metadata keys are iterated, there's one per key
+        if db is None:
+            snapshot = self._ldb.snapshot()
+        else:
+            snapshot = LEVELDB.get_db(db).snapshot()
+
+        def iterator():
+            for key, _ in snapshot.iterator(prefix=KEY_CODEC.get_min_metadata()):
+                _, _, key_value = KEY_CODEC.decode_key(key)
+                if pattern is None or fnmatch.fnmatch(key_value, pattern):
+                    yield key_value
+
+        return LazyCollection(iterator)
+
+    def dbsize(self, db=None):
+        return len(self.keys(pattern=None, db=db))
 
     def exists(self, *keys):
         result = 0
         for key in keys:
+            # `type()` remembers the key for client-side caching
             if self.type(key) != 'none':
                 result += 1
         return result
 
+    @writes_key
     def hset(self, key, field, value):
         result = 0
         if self._ldb.get(KEY_CODEC.encode_hash_field(key, field)) is None:
             result = 1
-        hash_length = int(self._ldb.get(KEY_CODEC.encode_hash(key), '0'))
+        hash_length = self._get_length_before_write(key, LDB_HASH_TYPE)
         with self._ldb.write_batch() as batch:
-            batch.put(KEY_CODEC.encode_hash(key), bytes(hash_length + 1))
+            batch.put(KEY_CODEC.encode_metadata(key), KEY_CODEC.encode_metadata_value(LDB_HASH_TYPE, hash_length + result))
             batch.put(KEY_CODEC.encode_hash_field(key, field), value)
         return result
 
+    @writes_key
     def hsetnx(self, key, field, value):
         # only set if not set before
         if self._ldb.get(KEY_CODEC.encode_hash_field(key, field)) is None:
-            hash_length = int(self._ldb.get(KEY_CODEC.encode_hash(key), '0'))
+            hash_length = self._get_length_before_write(key, LDB_HASH_TYPE)
             with self._ldb.write_batch() as batch:
-                batch.put(KEY_CODEC.encode_hash(key), bytes(hash_length + 1))
+                batch.put(KEY_CODEC.encode_metadata(key), KEY_CODEC.encode_metadata_value(LDB_HASH_TYPE, hash_length + 1))
                 batch.put(KEY_CODEC.encode_hash_field(key, field), value)
             return 1
         else:
             return 0
 
+    @writes_key
     def hdel(self, key, *fields):
         result = 0
-        hash_length = int(self._ldb.get(KEY_CODEC.encode_hash(key), '0'))
+        hash_length = self._get_length(key, LDB_HASH_TYPE)
 
         with self._ldb.write_batch() as batch:
-            for field in fields:
+            # repeated fields are only removed once
+            for field in set(fields):
                 if self._ldb.get(KEY_CODEC.encode_hash_field(key, field)) is not None:
                     result += 1
                     hash_length -= 1
                     batch.delete(KEY_CODEC.encode_hash_field(key, field))
 
-        if hash_length == 0:
-            # remove empty hashes from keyspace
-            self.delete(key)
-        else:
-            self._ldb.put(KEY_CODEC.encode_hash(key), bytes(hash_length))
+            if result:
+                self._put_length(batch, key, LDB_HASH_TYPE, hash_length)
         return result
 
+    @reads_key
     def hget(self, key, field):
         return self._ldb.get(KEY_CODEC.encode_hash_field(key, field))
 
+    @reads_key
     def hkeys(self, key):
-        result = []
-        if self._ldb.get(KEY_CODEC.encode_hash(key)) is not None:
-            for db_key, _ in self._get_ldb_prefix_iterator(KEY_CODEC.get_min_hash_field(key)):
-                _, length, field_key = KEY_CODEC.decode_key(db_key)
-                field = field_key[length:]
-                result.append(field)
-
-        return result
+        return self._get_hash_collection(key, with_fields=True, with_values=False)
 
+    @reads_key
     def hvals(self, key):
-        result = []
-        if self._ldb.get(KEY_CODEC.encode_hash(key)) is not None:
-            for db_key, db_value in self._get_ldb_prefix_iterator(KEY_CODEC.get_min_hash_field(key)):
-                result.append(db_value)
-        return result
+        return self._get_hash_collection(key, with_fields=False, with_values=True)
+
+    def _get_hash_collection(self, key, with_fields, with_values):
+        snapshot = self._ldb.snapshot()
+        hash_length = self._get_length(key, LDB_HASH_TYPE, snapshot)
 
+        def iterator():
+            for db_key, db_value in self._get_ldb_prefix_iterator(KEY_CODEC.get_min_hash_field(key), snapshot):
+                if with_fields:
+                    _, length, field_key = KEY_CODEC.decode_key(db_key)
+                    yield field_key[length:]
+                if with_values:
+                    yield db_value
+
+        return LazyCollection(iterator, hash_length * (int(with_fields) + int(with_values)))
+
+    @reads_key
     def hlen(self, key):
-        result = self._ldb.get(KEY_CODEC.encode_hash(key))
-        if result is None:
-            return 0
-        else:
-            return int(result)
+        return self._get_length(key, LDB_HASH_TYPE)
 
+    @writes_key
     def hincrby(self, key, field, increment):
         before = self.hget(key, field) or '0'
         new_value = int(before) + int(increment)
         self.hset(key, field, str(new_value))
         return new_value
 
+    @reads_key
     def hgetall(self, key):
-        keys = self.hkeys(key)
-        values = self.hvals(key)
-        result = []
-        for (k, v) in zip(keys, values):
-            result.append(k)
-            result.append(v)
-        return result
+        return self._get_hash_collection(key, with_fields=True, with_values=True)
 
     @property
     def _ldb(self):
@@ -1,10 +1,15 @@
+import logging
 import struct
 
 import plyvel
 
 from dredis.path import Path
+from dredis.stats import StorageIO
+
+logger = logging.getLogger('dredis')
 
 LDB_DBS = {}
+LDB_FORMAT_VERSION_TYPE = 0
 LDB_STRING_TYPE = 1
 LDB_SET_TYPE = 2
 LDB_SET_MEMBER_TYPE = 3
@@ -13,12 +18,26 @@ LDB_HASH_FIELD_TYPE = 5
 LDB_ZSET_TYPE = 6
 LDB_ZSET_VALUE_TYPE = 7
 LDB_ZSET_SCORE_TYPE = 8
+LDB_METADATA_TYPE = 9
+# the types of the keys, stored in their metadata.
+# in the format version 1 they were also the ldb key types of the metadata (one per type)
 LDB_KEY_TYPES = [LDB_STRING_TYPE, LDB_SET_TYPE, LDB_HASH_TYPE, LDB_ZSET_TYPE]
 
 # type_id | key_length
 LDB_KEY_PREFIX_FORMAT = '>BI'
 LDB_KEY_PREFIX_LENGTH = struct.calcsize(LDB_KEY_PREFIX_FORMAT)
 LDB_ZSET_SCORE_FORMAT = '>d'
+# type_id | flags (reserved for expiration and encodings) | length (elements, or bytes of strings)
+# strings have their value right after the metadata, so GET and SET are one ldb key too
+LDB_METADATA_FORMAT = '>BBQ'
+LDB_METADATA_LENGTH = struct.calcsize(LDB_METADATA_FORMAT)
+# the first byte of the metadata values of strings, to check the type of a key without decoding its metadata
+LDB_STRING_METADATA_PREFIX = struct.pack('>B', LDB_STRING_TYPE)
+
+# version 1: one metadata key per type with the lengths as decimal strings
+# version 2: one metadata key per key (`LDB_METADATA_TYPE`) with binary lengths
+LDB_FORMAT_VERSION = 2
+MIGRATION_BATCH_SIZE = 10000  # ldb keys per write batch
 
 
 class LDBKeyCodec(object):
@@ -33,11 +52,22 @@ class LDBKeyCodec(object):
         prefix = struct.pack(LDB_KEY_PREFIX_FORMAT, type_id, len(key))
         return prefix + bytes(key)
 
-    def encode_string(self, key):
-        return self.get_key(key, LDB_STRING_TYPE)
+    def encode_metadata(self, key):
+        return self.get_key(key, LDB_METADATA_TYPE)
+
+    def encode_metadata_value(self, type_id, length, value=b'', flags=0):
+        return struct.pack(LDB_METADATA_FORMAT, type_id, flags, length) + bytes(value)
+
+    def decode_metadata_value(self, metadata):
+        """(type_id, flags, length, string value) of a metadata value"""
+        type_id, flags, length = struct.unpack(LDB_METADATA_FORMAT, metadata[:LDB_METADATA_LENGTH])
+        return type_id, flags, length, metadata[LDB_METADATA_LENGTH:]
+
+    def get_min_metadata(self):
+        return struct.pack('>B', LDB_METADATA_TYPE)
 
-    def encode_set(self, key):
-        return self.get_key(key, LDB_SET_TYPE)
+    def encode_format_version(self):
+        return self.get_key(b'', LDB_FORMAT_VERSION_TYPE)
 
     def encode_set_member(self, key, value):
         return self.get_key(key, LDB_SET_MEMBER_TYPE) + bytes(value)
@@ -45,18 +75,12 @@ class LDBKeyCodec(object):
     def get_min_set_member(self, key):
         return self.get_key(key, LDB_SET_MEMBER_TYPE)
 
-    def encode_hash(self, key):
-        return self.get_key(key, LDB_HASH_TYPE)
-
     def encode_hash_field(self, key, field):
         return self.get_key(key, LDB_HASH_FIELD_TYPE) + bytes(field)
 
     def get_min_hash_field(self, key):
         return self.get_key(key, LDB_HASH_FIELD_TYPE)
 
-    def encode_zset(self, key):
-        return self.get_key(key, LDB_ZSET_TYPE)
-
     def encode_zset_value(self, key, value):
         return self.get_key(key, LDB_ZSET_VALUE_TYPE) + bytes(value)
 
@@ -82,21 +106,164 @@ class LDBKeyCodec(object):
     def get_min_zset_value(self, key):
         return self.get_key(key, LDB_ZSET_VALUE_TYPE)
 
+    def get_prefix_range(self, prefix):
+        """(start, stop) range of all ldb keys that start with `prefix`, as expected by `approximate_sizes()`"""
+        stop = bytearray(prefix)
+        # the smallest key larger than all keys with the prefix: increment the last byte that isn't 0xff
+        while stop and stop[-1] == 0xff:
+            stop.pop()
+        if not stop:
+            return prefix, None
+        stop[-1] += 1
+        return prefix, bytes(stop)
+
+
+class CountingDB(object):
+    """
+    Wrapper of a `plyvel.DB` (or of one of its snapshots) that counts its operations in `STORAGE_IO`.
+    Other attributes (e.g. `get_property()` and `close()`) are passed through.
+    """
+
+    __slots__ = ('_db',)
+
+    def __init__(self, db):
+        self._db = db
+
+    def get(self, key, default=None):
+        STORAGE_IO.gets += 1
+        value = self._db.get(key)
+        if value is None:
+            return default
+        STORAGE_IO.bytes_read += len(value)
+        return value
+
+    def put(self, key, value):
+        STORAGE_IO.puts += 1
+        STORAGE_IO.bytes_written += len(key) + len(value)
+        self._db.put(key, value)
+
+    def delete(self, key):
+        STORAGE_IO.deletes += 1
+        STORAGE_IO.bytes_written += len(key)
+        self._db.delete(key)
+
+    def write_batch(self):
+        return CountingWriteBatch(self._db.write_batch())
+
+    def snapshot(self):
+        return CountingDB(self._db.snapshot())
+
+    def iterator(self, **kwargs):
+        STORAGE_IO.seeks += 1
+        return self._count_steps(self._db.iterator(**kwargs))
+
+    def _count_steps(self, iterator):
+        for key, value in iterator:
+            STORAGE_IO.steps += 1
+            STORAGE_IO.bytes_read += len(key) + len(value)
+            yield key, value
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+class CountingWriteBatch(object):
+
+    __slots__ = ('_batch',)
+
+    def __init__(self, batch):
+        self._batch = batch
+
+    def put(self, key, value):
+        STORAGE_IO.puts += 1
+        STORAGE_IO.bytes_written += len(key) + len(value)
+        self._batch.put(key, value)
+
+    def delete(self, key):
+        STORAGE_IO.deletes += 1
+        STORAGE_IO.bytes_written += len(key)
+        self._batch.delete(key)
+
+    def write(self):
+        STORAGE_IO.batch_writes += 1
+        self._batch.write()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # same as plyvel's default (non-transactional) batches: the batch is written even if there was an exception
+        self.write()
+
+
+def migrate_db(db):
+    """
+    Convert the metadata of a database in the format version 1 (one ldb key per type with a decimal length)
+    to the current format and return how many keys were converted. The elements of the collections didn't change.
+    Converted databases are marked with their format version, so it's only done once.
+
+    The lengths of the collections are counted again from their elements instead of being copied,
+    older versions could store wrong lengths (e.g. `HSET` of an existing field incremented it).
+    """
+    if db.get(KEY_CODEC.encode_format_version()) == bytes(LDB_FORMAT_VERSION):
+        return 0
+    element_prefix_fns = {
+        LDB_SET_TYPE: KEY_CODEC.get_min_set_member,
+        LDB_HASH_TYPE: KEY_CODEC.get_min_hash_field,
+        LDB_ZSET_TYPE: KEY_CODEC.get_min_zset_value,
+    }
+    migrated = 0
+    batch = db.write_batch()
+    batch_size = 0
+    for type_id in LDB_KEY_TYPES:
+        for ldb_key, ldb_value in db.iterator(prefix=struct.pack('>B', type_id)):
+            _, key_length, key = KEY_CODEC.decode_key(ldb_key)
+            batch.delete(ldb_key)
+            batch_size += 1
+            if type_id == LDB_STRING_TYPE:
+                metadata = KEY_CODEC.encode_metadata_value(type_id, len(ldb_value), ldb_value)
+            else:
+                length = sum(1 for _ in db.iterator(prefix=element_prefix_fns[type_id](key)))
+                if not length:
+                    # a collection without elements doesn't exist
+                    continue
+                metadata = KEY_CODEC.encode_metadata_value(type_id, length)
+            batch.put(KEY_CODEC.encode_metadata(key), metadata)
+            migrated += 1
+            batch_size += 1
+            if batch_size >= MIGRATION_BATCH_SIZE:
+                batch.write()
+                batch = db.write_batch()
+                batch_size = 0
+    # the version is written last, an interrupted migration continues on the next start
+    batch.put(KEY_CODEC.encode_format_version(), bytes(LDB_FORMAT_VERSION))
+    batch.write()
+    return migrated
+
 
 class LevelDB(object):
 
     def setup_dbs(self, root_dir):
+        # LevelDB locks its directory, the databases of a previous setup have to be closed to be opened again
+        self.close_dbs()
         for db_id_ in range(16):
             db_id = str(db_id_)
             directory = Path(root_dir).join(db_id)
             self._assign_db(db_id, directory)
 
     def open_db(self, path):
-        return plyvel.DB(bytes(path), create_if_missing=True)
+        return CountingDB(plyvel.DB(bytes(path), create_if_missing=True))
 
     def get_db(self, db_id):
         return LDB_DBS[str(db_id)]['db']
 
+    def get_db_ids(self):
+        return sorted(LDB_DBS, key=int)
+
+    def close_dbs(self):
+        for db_id in list(LDB_DBS):
+            LDB_DBS.pop(db_id)['db'].close()
+
     def delete_dbs(self):
         for db_id in LDB_DBS:
             self.delete_db(db_id)
@@ -108,11 +275,17 @@ class LevelDB(object):
         self._assign_db(db_id, LDB_DBS[db_id]['directory'])
 
     def _assign_db(self, db_id, directory):
+        db = self.open_db(directory)
+        migrated = migrate_db(db)
+        if migrated:
+            logger.info('Converted {} keys of db{} to the format version {}'.format(migrated, db_id, LDB_FORMAT_VERSION))
         LDB_DBS[db_id] = {
-            'db': self.open_db(directory),
+            'db': db,
             'directory': directory,
         }
 
 
+# operations of the running command, reset by the server before each command
+STORAGE_IO = StorageIO()
 KEY_CODEC = LDBKeyCodec()
 LEVELDB = LevelDB()
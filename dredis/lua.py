@@ -1,14 +1,42 @@
-import json
-
-from lupa._lupa import LuaRuntime
-
-from dredis.commands import run_command, CommandNotFound, SimpleString
+from dredis.commands import run_command, CommandNotFound, SimpleString, Map
+from dredis.utils import LazyCollection
+
+
+LUA_RUNTIME = None  # created by `get_lua_runtime()`
+LOAD_SCRIPT = None  # Lua function of `LUA_RUNTIME` that compiles scripts, created by `get_lua_runtime()`
+# every script gets its own table of globals, so the globals it sets don't leak into the scripts of other clients.
+# the standard library is still read from the shared globals (`_G`)
+LOAD_SCRIPT_SOURCE = """
+function(source, keys, argv)
+    local env = setmetatable({KEYS = keys, ARGV = argv}, {__index = _G})
+    local fn, err
+    if setfenv then  -- Lua 5.1
+        fn, err = loadstring(source, '@user_script')
+        if fn then setfenv(fn, env) end
+    else
+        fn, err = load(source, '@user_script', 't', env)
+    end
+    if not fn then error(err, 0) end
+    return fn()
+end
+"""
 
 
 class RedisScriptError(Exception):
     """Indicate error from calls to redis.call()"""
 
 
+def get_lua_runtime():
+    # like Redis, all clients share the same Lua interpreter.
+    # `lupa` is only imported when the first script runs because most clients never run scripts.
+    global LUA_RUNTIME, LOAD_SCRIPT
+    if LUA_RUNTIME is None:
+        from lupa._lupa import LuaRuntime
+        LUA_RUNTIME = LuaRuntime(unpack_returned_tuples=True)
+        LOAD_SCRIPT = LUA_RUNTIME.eval(LOAD_SCRIPT_SOURCE)
+    return LUA_RUNTIME
+
+
 class RedisLua(object):
 
     def __init__(self, keyspace, lua_runtime):
@@ -17,7 +45,8 @@ class RedisLua(object):
 
     def call(self, cmd, *args):
         try:
-            result = run_command(self._keyspace, cmd, args)
+            # Lua numbers are converted to strings, same as Redis
+            result = run_command(self._keyspace, cmd, map(str, args))
         except CommandNotFound:
             raise RedisScriptError('@user_script: Unknown Redis command called from Lua script')
         except Exception as exc:
@@ -42,16 +71,19 @@ class RedisLua(object):
           * simple strings to `{ok=STRING}`
           * integers to numbers
           * arrays to lua tables following the previous conversions
+          * maps to flat lua tables (same as RESP2)
 
         The implementation can be found at:
         https://github.com/antirez/redis/blob/5b4bec9d336655889641b134791dfdd2adc864cf/src/scripting.c#L106-L201
         """
 
-        if isinstance(result, (tuple, list, set)):
+        if isinstance(result, (tuple, list, set, LazyCollection)):
             table = self._lua_runtime.table()
             for i, elem in enumerate(result, start=1):
                 table[i] = self._convert_redis_types_to_lua_types(elem)
             return table
+        elif isinstance(result, Map):
+            return self._convert_redis_types_to_lua_types(result.flat_pairs)
         elif result is None:
             return False
         elif result is True:
@@ -66,14 +98,13 @@ class RedisLua(object):
 
 class LuaRunner(object):
     def __init__(self, keyspace):
-        self._runtime = LuaRuntime(unpack_returned_tuples=True)
+        self._runtime = get_lua_runtime()
         self._lua_table_type = type(self._runtime.table())
         self._redis_obj = RedisLua(keyspace, self._runtime)
 
     def run(self, script, keys, argv):
-        self._runtime.execute('KEYS = {%s}' % ', '.join(map(json.dumps, keys)))
-        self._runtime.execute('ARGV = {%s}' % ', '.join(map(json.dumps, argv)))
-        script_function = self._runtime.eval('function(redis) {} end'.format(script))
+        script_function = LOAD_SCRIPT('return function(redis) {} end'.format(script),
+                                      self._runtime.table(*keys), self._runtime.table(*argv))
         result = script_function(self._redis_obj)
         return self._convert_lua_types_to_redis_types(result)
 
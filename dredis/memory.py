@@ -0,0 +1,141 @@
+import asyncore
+import collections
+import gc
+import resource
+import sys
+
+from dredis import encoder, lua
+from dredis.slowlog import SLOWLOG
+from dredis.stats import STATS
+from dredis.tracking import TRACKING_TABLE
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2 only has `tracemalloc` with a patched interpreter (https://pytracemalloc.readthedocs.io)
+    tracemalloc = None
+
+CONTAINER_TYPES = (dict, list, tuple, set, frozenset, collections.deque)
+
+
+def get_memory_stats():
+    """Approximate memory used by each part of the server, similar to Redis's `MEMORY STATS`"""
+    connections = query_buffers = output_buffers = clients = 0
+    for channel in asyncore.socket_map.values():
+        # only client connections have `get_memory_usage()` (it's defined by `dredis.server.CommandHandler`)
+        if hasattr(channel, 'get_memory_usage'):
+            connection, query_buffer, output_buffer = channel.get_memory_usage()
+            clients += 1
+            connections += connection
+            query_buffers += query_buffer
+            output_buffers += output_buffer
+
+    result = [
+        'process.rss', get_rss(),
+        'process.peak-rss', get_peak_rss(),
+        'clients.count', clients,
+        'clients.connections', connections,
+        'clients.query-buffers', query_buffers,
+        'clients.output-buffers', output_buffers,
+        'lua', get_lua_memory_usage(),
+        'caches.tracking-table', TRACKING_TABLE.get_memory_usage(),
+        'caches.slowlog', get_size(SLOWLOG),
+        'caches.command-stats', get_size(STATS.commands),
+        'caches.shared-replies', get_size([encoder.INTEGER_REPLIES, encoder.BULK_HEADERS, encoder.ARRAY_HEADERS]),
+    ]
+    if tracemalloc is not None and tracemalloc.is_tracing():
+        traced, peak = tracemalloc.get_traced_memory()
+        result.extend(['tracemalloc.traced', traced, 'tracemalloc.peak', peak])
+    return result
+
+
+def get_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except IOError:
+        # not linux, the current RSS isn't available without third-party libraries
+        return get_peak_rss()
+
+
+def get_peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux and bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def get_lua_memory_usage():
+    if lua.LUA_RUNTIME is None:
+        return 0
+    # the Lua interpreter has its own allocator, `collectgarbage("count")` returns the memory in use in kilobytes
+    return int(lua.LUA_RUNTIME.eval('collectgarbage("count")') * 1024)
+
+
+def get_size(obj, seen=None):
+    """Deep `sys.getsizeof()` of containers and of objects with attributes (functions and classes aren't followed)"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(get_size(key, seen) + get_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, CONTAINER_TYPES):
+        size += sum(get_size(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__') and not callable(obj):
+        size += get_size(obj.__dict__, seen)
+    return size
+
+
+class MemoryDoctor(object):
+    """
+    Find what's growing between two calls of `MEMORY DOCTOR`.
+
+    With `tracemalloc` the snapshots have the allocation sites (file and line).
+    Without it the snapshots only have the number of objects per type tracked by the garbage collector,
+    which is less precise but doesn't slow down the server.
+    """
+
+    TOP = 10
+
+    def __init__(self):
+        self._snapshot = None
+
+    @property
+    def tracing(self):
+        return tracemalloc is not None and tracemalloc.is_tracing()
+
+    def start_tracing(self, frames=1):
+        if tracemalloc is None:
+            raise ValueError('tracemalloc is not available in this Python interpreter')
+        tracemalloc.start(frames)
+        self._snapshot = None
+
+    def diagnose(self, top=TOP):
+        snapshot = self._take_snapshot()
+        previous, self._snapshot = self._snapshot, snapshot
+        if previous is None or type(previous) is not type(snapshot):
+            return 'Snapshot taken ({}), run MEMORY DOCTOR again to see what grew since now.'.format(self._mode)
+        lines = ['Top {} differences since the last MEMORY DOCTOR ({}):'.format(top, self._mode)]
+        if self.tracing:
+            lines.extend(str(stat) for stat in snapshot.compare_to(previous, 'lineno')[:top])
+        else:
+            differences = sorted(((count - previous.get(name, 0), name, count) for name, count in snapshot.items()),
+                                 reverse=True)
+            lines.extend('{}: count={} ({:+d})'.format(name, count, difference)
+                         for difference, name, count in differences[:top] if difference)
+        return '\n'.join(lines)
+
+    @property
+    def _mode(self):
+        return 'tracemalloc' if self.tracing else 'objects per type'
+
+    def _take_snapshot(self):
+        if self.tracing:
+            # the allocations of `tracemalloc` itself are ignored
+            return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        return collections.Counter(type(obj).__name__ for obj in gc.get_objects())
+
+
+MEMORY_DOCTOR = MemoryDoctor()
@@ -0,0 +1,148 @@
+import asyncore
+import socket
+
+from dredis.info import get_leveldb_levels
+from dredis.keyspace import Keyspace
+from dredis.ldb import LEVELDB
+from dredis.stats import STATS
+from dredis.tracking import TRACKING_TABLE
+
+LATENCY_QUANTILES = (0.5, 0.99, 0.999)
+MEGABYTE = 1024 * 1024  # the unit of the sizes of `leveldb.stats`
+
+
+def render_metrics():
+    """Server metrics in the Prometheus text format"""
+    lines = []
+
+    def add_metric(name, metric_type, description, samples):
+        lines.append('# HELP dredis_{} {}'.format(name, description))
+        lines.append('# TYPE dredis_{} {}'.format(name, metric_type))
+        for suffix, labels, value in samples:
+            label_pairs = ','.join('{}="{}"'.format(label, label_value) for label, label_value in labels)
+            lines.append('dredis_{}{}{} {}'.format(name, suffix, '{%s}' % label_pairs if labels else '', value))
+
+    add_metric('uptime_seconds', 'gauge', 'Seconds since the server started.', [('', (), STATS.uptime)])
+    add_metric('connected_clients', 'gauge', 'Number of client connections.', [('', (), STATS.connected_clients)])
+    add_metric('tracking_clients', 'gauge', 'Number of clients with CLIENT TRACKING on.',
+               [('', (), TRACKING_TABLE.tracking_clients)])
+    add_metric('connections_received_total', 'counter', 'Connections accepted by the server.',
+               [('', (), STATS.total_connections_received)])
+    add_metric('commands_processed_total', 'counter', 'Commands run by the server.',
+               [('', (), STATS.total_commands_processed)])
+    add_metric('instantaneous_ops_per_sec', 'gauge', 'Commands per second in the last seconds.',
+               [('', (), STATS.instantaneous_ops_per_sec)])
+    add_metric('throttled_turns_total', 'counter', 'Times a client had to wait for a turn to run pipelined commands.',
+               [('', (), STATS.throttled_turns)])
+    add_metric('commands_run_in_extra_turns_total', 'counter', 'Pipelined commands run after waiting for a turn.',
+               [('', (), STATS.commands_run_in_extra_turns)])
+    add_metric('leveldb_level0_files', 'gauge', 'The most files in level 0 among all LevelDB databases.',
+               [('', (), STATS.leveldb_level0_files)])
+    add_metric('write_stalls_total', 'counter', 'Times LevelDB had too many files in level 0.',
+               [('', (), STATS.write_stalls)])
+    add_metric('throttled_writers_total', 'counter', 'Times a client was throttled because of a LevelDB write stall.',
+               [('', (), STATS.throttled_writers)])
+
+    commands = sorted(STATS.commands.items())
+    add_metric('command_calls_total', 'counter', 'Calls per command.',
+               [('', [('cmd', name.lower())], stats.calls) for name, stats in commands])
+    add_metric('command_failed_calls_total', 'counter', 'Calls per command that returned an error.',
+               [('', [('cmd', name.lower())], stats.failed_calls) for name, stats in commands])
+    add_metric('command_storage_io_total', 'counter', 'LevelDB operations and bytes per command.',
+               [('', [('cmd', name.lower()), ('op', op)], value) for name, stats in commands for op, value in stats.io.items()])
+    latency_samples = []
+    for name, stats in commands:
+        for quantile in LATENCY_QUANTILES:
+            latency = stats.histogram.percentile(quantile * 100) / 1e6
+            latency_samples.append(('', [('cmd', name.lower()), ('quantile', quantile)], latency))
+        latency_samples.append(('_sum', [('cmd', name.lower())], stats.usec / 1e6))
+        latency_samples.append(('_count', [('cmd', name.lower())], stats.calls))
+    add_metric('command_latency_seconds', 'summary', 'Latency per command.', latency_samples)
+
+    db_ids = LEVELDB.get_db_ids()
+    keyspace = Keyspace()
+    # same as `INFO keyspace`, the keys are counted by iterating over them
+    add_metric('db_keys', 'gauge', 'Number of keys per database.',
+               [('', [('db', db_id)], keyspace.dbsize(db_id)) for db_id in db_ids])
+    add_metric('leveldb_approximate_memory_usage_bytes', 'gauge', 'Memory used by LevelDB per database.',
+               [('', [('db', db_id)], LEVELDB.get_db(db_id).get_property(b'leveldb.approximate-memory-usage'))
+                for db_id in db_ids])
+
+    # same as `INFO leveldb`, only the levels with files are included
+    levels = [([('db', db_id), ('level', level)], dict(values))
+              for db_id in db_ids for level, values in get_leveldb_levels(LEVELDB.get_db(db_id))]
+    add_metric('leveldb_level_files', 'gauge', 'Files per LevelDB level.',
+               [('', labels, values['files']) for labels, values in levels])
+    add_metric('leveldb_level_size_bytes', 'gauge', 'Size of the files per LevelDB level (rounded to megabytes).',
+               [('', labels, int(float(values['size_mb']) * MEGABYTE)) for labels, values in levels])
+    add_metric('leveldb_compaction_seconds_total', 'counter', 'Time spent in compactions per LevelDB level.',
+               [('', labels, values['time_sec']) for labels, values in levels])
+    add_metric('leveldb_compaction_read_bytes_total', 'counter',
+               'Bytes read by compactions per LevelDB level (rounded to megabytes).',
+               [('', labels, int(float(values['read_mb']) * MEGABYTE)) for labels, values in levels])
+    add_metric('leveldb_compaction_written_bytes_total', 'counter',
+               'Bytes written by compactions per LevelDB level (rounded to megabytes).',
+               [('', labels, int(float(values['write_mb']) * MEGABYTE)) for labels, values in levels])
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsHandler(asyncore.dispatcher):
+    """Reply to a single HTTP request and close the connection"""
+
+    MAX_REQUEST_SIZE = 8 * 1024
+
+    def __init__(self, *args, **kwargs):
+        asyncore.dispatcher.__init__(self, *args, **kwargs)
+        self._request = ''
+        self._response = ''
+
+    def handle_read(self):
+        self._request += self.recv(self.MAX_REQUEST_SIZE)
+        if '\r\n\r\n' in self._request or len(self._request) >= self.MAX_REQUEST_SIZE:
+            self._response = self._get_response(self._request)
+
+    def _get_response(self, request):
+        request_line = request.split('\r\n', 1)[0].split()
+        if len(request_line) >= 2 and request_line[0] == 'GET' and request_line[1].split('?')[0] == '/metrics':
+            status, body = '200 OK', render_metrics()
+        else:
+            status, body = '404 Not Found', 'Not Found\n'
+        headers = [
+            'HTTP/1.0 {}'.format(status),
+            'Content-Type: text/plain; version=0.0.4',
+            'Content-Length: {}'.format(len(body)),
+            'Connection: close',
+        ]
+        return '\r\n'.join(headers) + '\r\n\r\n' + body
+
+    def readable(self):
+        return not self._response
+
+    def writable(self):
+        return bool(self._response)
+
+    def handle_write(self):
+        sent = self.send(self._response)
+        self._response = self._response[sent:]
+        if not self._response:
+            self.close()
+
+
+class MetricsServer(asyncore.dispatcher):
+    """
+    HTTP server for Prometheus to scrape the metrics,
+    it doesn't use up a client connection or a slot in the command scheduler
+    """
+
+    def __init__(self, host, port):
+        asyncore.dispatcher.__init__(self)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(128)
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            sock, _ = pair
+            MetricsHandler(sock)
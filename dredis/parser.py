@@ -1,57 +1,123 @@
+class ProtocolError(Exception):
+    """Indicate a malformed request or a request that exceeds the parser limits"""
+
+
 class Parser(object):
 
     MAX_BUFSIZE = 1024 * 1024
-    CRLF = '\r\n'
+    # the following limits are the same as Redis's defaults
+    # (`proto-max-bulk-len`, `client-query-buffer-limit`, and `PROTO_INLINE_MAX_SIZE`)
+    MAX_BULK_LENGTH = 512 * 1024 * 1024
+    MAX_QUERY_BUFFER_SIZE = 1024 * 1024 * 1024
+    MAX_INLINE_SIZE = 64 * 1024
 
-    def __init__(self, read_fn):
-        self._buffer = ""
+    def __init__(self, read_fn, max_bulk_length=None, max_query_buffer_size=None):
+        # `self._buffer_pos` is the cursor of the next byte to be parsed
+        self._buffer = ''
         self._buffer_pos = 0
+        # data read while an incomplete instruction needs more than what was received (e.g. a large bulk string
+        # that arrives in many chunks), it's only joined to the buffer when the instruction can be parsed
+        self._chunks = []
+        self._chunks_size = 0
+        self._needed_size = 0  # bytes after `self._buffer_pos` needed to parse the incomplete instruction (if known)
         self._read_fn = read_fn
+        self._max_bulk_length = max_bulk_length or self.MAX_BULK_LENGTH
+        self._max_query_buffer_size = max_query_buffer_size or self.MAX_QUERY_BUFFER_SIZE
 
-    def _readline(self):
-        if self.CRLF not in self._buffer[self._buffer_pos:]:
-            raise StopIteration()
-        crlf_position = self._buffer[self._buffer_pos:].find(self.CRLF)
-        result = self._buffer[self._buffer_pos:][:crlf_position]
-        self._buffer_pos += crlf_position + len(self.CRLF)
-        return result
+    @property
+    def buffer_size(self):
+        return len(self._buffer) - self._buffer_pos + self._chunks_size
 
     def _read_into_buffer(self):
-        # FIXME: implement a maximum size for the buffer to prevent a crash due to bad clients
         data = self._read_fn(self.MAX_BUFSIZE)
-        self._buffer += data
+        if self._buffer_pos >= len(self._buffer):
+            # every instruction of the buffer was parsed, the most common case
+            self._buffer = data
+            self._buffer_pos = 0
+        else:
+            self._chunks.append(data)
+            self._chunks_size += len(data)
+            if self.buffer_size >= self._needed_size:
+                self._chunks.insert(0, self._buffer[self._buffer_pos:])
+                self._buffer = ''.join(self._chunks)
+                self._buffer_pos = 0
+                self._chunks = []
+                self._chunks_size = 0
+                self._needed_size = 0
+        if self.buffer_size > self._max_query_buffer_size:
+            raise ProtocolError('Protocol error: query buffer limit exceeded')
+
+    def _wait_for_line(self, line_start):
+        if len(self._buffer) - line_start > self.MAX_INLINE_SIZE:
+            raise ProtocolError('Protocol error: too big inline request')
+        self._needed_size = 0
 
-    def _read(self, n_bytes):
-        if len(self._buffer[self._buffer_pos:]) < n_bytes:
-            raise StopIteration()
-        result = self._buffer[self._buffer_pos:][:n_bytes]
-        # FIXME: ensure self.CRLF is next
-        self._buffer_pos += n_bytes + len(self.CRLF)
-        return result
+    def _get_instruction(self):
+        """
+        The next complete instruction of the buffer or `None` if there isn't one.
+        It's called for every command, so the lines are parsed inline instead of with helper methods.
+        """
+        buf = self._buffer
+        buf_length = len(buf)
+        pos = self._buffer_pos
+        while pos < buf_length:
+            crlf_position = buf.find('\r\n', pos)
+            if crlf_position == -1:
+                self._wait_for_line(pos)
+                return None
+            if buf[pos] != '*':
+                # the Redis protocol says that all commands are arrays, however,
+                # Redis's own tests have commands like PING being sent as a Simple String or inline
+                instruction = buf[pos + 1 if buf[pos] == '+' else pos:crlf_position].split()
+                pos = self._buffer_pos = crlf_position + 2
+                if instruction:
+                    return instruction
+                # blank lines are ignored (same as Redis)
+                continue
+            try:
+                array_length = int(buf[pos + 1:crlf_position])  # skip '*' char
+            except ValueError:
+                raise ProtocolError('Protocol error: invalid multibulk length')
+            instruction = []
+            line_start = crlf_position + 2
+            for _ in range(array_length):
+                crlf_position = buf.find('\r\n', line_start)
+                if crlf_position == -1:
+                    self._wait_for_line(line_start)
+                    return None
+                if buf[line_start] != '$':
+                    raise ProtocolError("Protocol error: expected '$', got '{}'".format(
+                        buf[line_start:crlf_position][:1]))
+                try:
+                    str_len = int(buf[line_start + 1:crlf_position])  # skip '$' char
+                except ValueError:
+                    raise ProtocolError('Protocol error: invalid bulk length')
+                if str_len < 0 or str_len > self._max_bulk_length:
+                    raise ProtocolError('Protocol error: invalid bulk length')
+                str_start = crlf_position + 2
+                str_end = str_start + str_len
+                if str_end + 2 > buf_length:
+                    # wait until the whole bulk string is buffered
+                    self._needed_size = str_end + 2 - pos
+                    return None
+                if buf[str_end:str_end + 2] != '\r\n':
+                    raise ProtocolError('Protocol error: expected CRLF after bulk string')
+                instruction.append(buf[str_start:str_end])
+                line_start = str_end + 2
+            pos = self._buffer_pos = line_start
+            if instruction:
+                return instruction
+            # empty arrays are ignored (same as Redis)
+        return None
 
     def get_instructions(self):
         self._read_into_buffer()
-        while self._buffer:
-            self._buffer_pos = 0
-            instructions = self._readline()
-            # the Redis protocol says that all commands are arrays, however,
-            # Redis's own tests have commands like PING being sent as a Simple String
-            if instructions.startswith('+'):
-                self._buffer = self._buffer[self._buffer_pos:]
-                yield instructions[1:].strip().split()
-            elif instructions.startswith('*'):
-                # array of instructions
-                array_length = int(instructions[1:])  # skip '*' char
-                instruction_set = []
-                for _ in range(array_length):
-                    line = self._readline()
-                    str_len = int(line[1:])  # skip '$' char
-                    instruction = self._read(str_len)
-                    instruction_set.append(instruction)
-                self._buffer = self._buffer[self._buffer_pos:]
-                yield instruction_set
-            else:
-                # inline instructions, saw them in the Redis tests
-                for line in instructions.split(self.CRLF):
-                    self._buffer = self._buffer[self._buffer_pos:]
-                    yield line.strip().split()
+        return self.get_buffered_instructions()
+
+    def has_buffered_data(self):
+        return self._buffer_pos < len(self._buffer)
+
+    def get_buffered_instructions(self):
+        # the instructions are parsed one at a time when they're iterated,
+        # so the ones that aren't iterated stay in the buffer (e.g. when a client's turn ends)
+        return iter(self._get_instruction, None)
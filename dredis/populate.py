@@ -0,0 +1,107 @@
+"""
+Create a synthetic dataset straight in the LevelDB database of a stopped server, similar to `DEBUG POPULATE`
+(which does the same on a running server).
+
+The keys are named `<prefix>:<n>` and the strings, hash values, and zset scores have the number of the key
+or of the element (`value:<n>`, padded with zero bytes or truncated to --size).
+Existing keys are kept. The ldb keys are written in large write batches instead of one command at a time.
+"""
+import argparse
+import os
+import time
+
+import plyvel
+
+from dredis.ldb import KEY_CODEC, LDB_STRING_TYPE, LDB_SET_TYPE, LDB_HASH_TYPE, LDB_ZSET_TYPE, migrate_db
+
+POPULATE_TYPES = ('string', 'set', 'hash', 'zset')
+TYPE_IDS = {'string': LDB_STRING_TYPE, 'set': LDB_SET_TYPE, 'hash': LDB_HASH_TYPE, 'zset': LDB_ZSET_TYPE}
+BATCH_SIZE = 10000  # ldb keys per write batch
+
+
+def get_value(prefix, n, size):
+    # same values as Redis's `DEBUG POPULATE`
+    value = '{}:{}'.format(prefix, n)
+    return value[:size].ljust(size, '\0') if size else value
+
+
+def key_exists(db, key):
+    return db.get(KEY_CODEC.encode_metadata(key)) is not None
+
+
+def get_ldb_pairs(key, n, key_type, size, elements):
+    """The (ldb key, ldb value) pairs of a new key, the metadata of collections comes after their elements"""
+    if key_type == 'string':
+        value = get_value('value', n, size)
+        yield KEY_CODEC.encode_metadata(key), KEY_CODEC.encode_metadata_value(LDB_STRING_TYPE, len(value), value)
+        return
+    for i in range(elements):
+        member = 'member:{}'.format(i)
+        if key_type == 'set':
+            yield KEY_CODEC.encode_set_member(key, member), bytes('')
+        elif key_type == 'hash':
+            yield KEY_CODEC.encode_hash_field(key, member), get_value('value', i, size)
+        else:
+            yield KEY_CODEC.encode_zset_value(key, member), bytes(i)
+            yield KEY_CODEC.encode_zset_score(key, member, i), bytes('')
+    yield KEY_CODEC.encode_metadata(key), KEY_CODEC.encode_metadata_value(TYPE_IDS[key_type], elements)
+
+
+def populate(db, count, prefix='key', size=0, key_type='string', elements=1, created_fn=None):
+    """
+    Create `count` keys in `db` (a `plyvel.DB` or a `dredis.ldb.CountingDB`) and return how many were created.
+    Collections have `elements` elements each. `created_fn` is called with every key that is created.
+    """
+    if key_type not in POPULATE_TYPES:
+        raise SyntaxError('unknown type, use one of: {}'.format(', '.join(POPULATE_TYPES)))
+    if count < 0 or size < 0 or elements < 1:
+        raise ValueError('the count and the size must not be negative and collections need at least 1 element')
+    created = 0
+    batch = db.write_batch()
+    batch_size = 0
+    for n in range(count):
+        key = '{}:{}'.format(prefix, n)
+        if key_exists(db, key):
+            continue
+        for ldb_key, ldb_value in get_ldb_pairs(key, n, key_type, size, elements):
+            batch.put(ldb_key, ldb_value)
+            batch_size += 1
+            if batch_size >= BATCH_SIZE:
+                batch.write()
+                batch = db.write_batch()
+                batch_size = 0
+        created += 1
+        if created_fn is not None:
+            created_fn(key)
+    batch.write()
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dir', help='data directory of the server (the --dir option of dredis)')
+    parser.add_argument('count', type=int, help='number of keys')
+    parser.add_argument('--db', default=0, type=int, help='database number (defaults to %(default)s)')
+    parser.add_argument('--prefix', default='key', help='prefix of the key names (defaults to %(default)s)')
+    parser.add_argument('--size', default=0, type=int,
+                        help='bytes of the strings and of the hash values (defaults to the size of `value:<n>`)')
+    parser.add_argument('--type', default='string', choices=POPULATE_TYPES, help='type of the keys (defaults to %(default)s)')
+    parser.add_argument('--elements', default=1, type=int,
+                        help='elements of each set, hash, or zset (defaults to %(default)s)')
+    args = parser.parse_args()
+
+    path = os.path.join(args.dir, str(args.db))
+    before = time.time()
+    # same options as `dredis.ldb.LevelDB.open_db()`
+    db = plyvel.DB(path, create_if_missing=True)
+    try:
+        # existing keys of old versions of dredis must be found by `key_exists()`
+        migrate_db(db)
+        created = populate(db, args.count, args.prefix, args.size, args.type, args.elements)
+    finally:
+        db.close()
+    print('{} keys created in {:.1f}s'.format(created, time.time() - before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import collections
+import cProfile
+import marshal
+import os.path
+import signal
+
+
+class SamplingProfiler(object):
+    """
+    Statistical profiler for the running server.
+
+    A `SIGPROF` timer interrupts the process every `interval` seconds of CPU time and the stack of the interrupted frame
+    is counted, so an idle server isn't sampled and the overhead doesn't depend on the number of function calls
+    (different from `cProfile`, which slows down every call).
+    The output is in the collapsed stack format (one `frame;frame;frame count` line per stack),
+    which is the input of flamegraph tools (e.g. `flamegraph.pl` or speedscope).
+    """
+
+    INTERVAL = 0.005  # in seconds
+
+    def __init__(self, interval=INTERVAL):
+        self.interval = interval
+        self._stacks = collections.Counter()
+        self._previous_handler = None
+
+    def enable(self):
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        # restart system calls interrupted by the timer instead of failing with EINTR
+        signal.siginterrupt(signal.SIGPROF, False)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def disable(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append('{} ({}:{})'.format(code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        self._stacks[';'.join(reversed(stack))] += 1
+
+    @property
+    def samples(self):
+        return sum(self._stacks.values())
+
+    def write_stats(self, f):
+        for stack, count in self._stacks.most_common():
+            f.write('{} {}\n'.format(stack, count))
+
+
+class CProfileProfiler(cProfile.Profile):
+
+    def write_stats(self, f):
+        # same as `dump_stats()`, but to a file that is already open
+        self.create_stats()
+        marshal.dump(self.stats, f)
+
+
+class Profiler(object):
+    """
+    Profile the running server on demand (`DEBUG PROFILE` or `SIGUSR2`) instead of from startup.
+
+    The `cprofile` mode writes `pstats` files and the `sampling` mode writes collapsed stacks.
+    The files are only written to `directory` (the data directory of the server), clients can't choose any path.
+    """
+
+    MODES = {
+        'cprofile': CProfileProfiler,
+        'sampling': SamplingProfiler,
+    }
+
+    def __init__(self, directory='.'):
+        self._profiler = None
+        self.mode = None
+        self.directory = directory
+
+    def setup(self, directory):
+        self.directory = directory
+
+    @property
+    def running(self):
+        return self._profiler is not None
+
+    def start(self, mode='sampling'):
+        if self.running:
+            raise ValueError('profiler already running, use DEBUG PROFILE STOP first')
+        if mode not in self.MODES:
+            raise SyntaxError('unknown profiler mode, use one of: {}'.format(', '.join(sorted(self.MODES))))
+        self._profiler = self.MODES[mode]()
+        self.mode = mode
+        self._profiler.enable()
+
+    def stop(self, filename):
+        """Write the profile to `filename` in the profiler directory and return its path"""
+        if not self.running:
+            raise ValueError('profiler not running, use DEBUG PROFILE START first')
+        path = self.get_output_path(filename)
+        # the profile is only discarded after it's written,
+        # a path that can't be written (e.g. a directory or a full disk) leaves the profiler running
+        f = open(path, 'wb')
+        self._profiler.disable()
+        try:
+            with f:
+                self._profiler.write_stats(f)
+        except IOError:
+            self._profiler.enable()
+            raise
+        self._profiler = None
+        return path
+
+    def get_output_path(self, filename):
+        directory = os.path.realpath(self.directory)
+        path = os.path.realpath(os.path.join(directory, filename))
+        if os.path.dirname(path) != directory:
+            raise ValueError('the profile can only be written to a file in the data directory')
+        return path
+
+
+PROFILER = Profiler()
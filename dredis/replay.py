@@ -0,0 +1,189 @@
+"""
+Replay the commands of a capture (`dredis --capture` or `DEBUG CAPTURE START`) against any Redis server.
+
+Every captured connection is replayed with its own connection and the commands are sent in the same order
+as they were captured, so the interleaving of the connections is kept. With --speed 1 the commands are sent
+at the same pace as they were captured, --speed 10 sends them 10 times faster, and --speed 0 sends them
+as fast as the server replies (a connection has at most --max-in-flight commands waiting for replies).
+
+The latency percentiles (overall and per command) are printed as JSON.
+"""
+import argparse
+import collections
+import json
+import select
+import time
+
+from dredis.benchmark import BUFFER_SIZE, PERCENTILES, connect, parse_reply
+from dredis.capture import read_capture
+from dredis.stats import LatencyHistogram
+
+
+class ReplayConnection(object):
+
+    def __init__(self, client_id, sock):
+        self.client_id = client_id
+        self.sock = sock
+        self.in_flight = collections.deque()  # (command name, when it was sent) of the commands without replies
+        self.closing = False  # the captured connection was closed, close it after the last reply
+        self._buffer = ''
+
+    def send(self, command):
+        # the command name is the first bulk string of the array: '*<count>\r\n$<length>\r\n<name>\r\n...'
+        name = command.split('\r\n', 3)[2].upper()
+        self.in_flight.append((name, time.time()))
+        self.sock.sendall(command)
+
+    def read_replies(self):
+        """Generate (command name, latency in microseconds, if the reply is an error) of the replies received"""
+        data = self.sock.recv(BUFFER_SIZE)
+        if not data:
+            raise IOError('the server closed the connection')
+        self._buffer += data
+        now = time.time()
+        position = 0
+        while position < len(self._buffer):
+            try:
+                end, is_error = parse_reply(self._buffer, position)
+            except ValueError as exc:
+                raise IOError('invalid reply from the server: {}'.format(exc))
+            if end == -1:
+                break
+            # pushes (e.g. invalidations of client-side caching) aren't replies of the commands,
+            # and neither are replies that no command is waiting for (e.g. messages of a RESP2 subscription)
+            if self._buffer[position] != '>' and self.in_flight:
+                name, sent_at = self.in_flight.popleft()
+                yield name, int((now - sent_at) * 1e6), is_error
+            position = end
+        self._buffer = self._buffer[position:]
+
+
+class Replay(object):
+
+    def __init__(self, address, speed=1.0, max_in_flight=100):
+        self.address = address
+        self.speed = speed
+        self.max_in_flight = max_in_flight
+        self.histogram = LatencyHistogram()
+        self.histograms = {}  # command name -> LatencyHistogram
+        self.errors = 0
+        self._in_flight = 0  # commands of all connections waiting for replies
+        self._connections = {}  # client id -> ReplayConnection
+        self._fds = {}  # file descriptor -> ReplayConnection
+        self._poller = select.poll()
+
+    def run(self, records):
+        """Replay the records of `read_capture()` and return how many seconds it took"""
+        records = iter(records)
+        record = next(records, None)
+        first_timestamp = record[0] if record else 0
+        started = time.time()
+        while record is not None or self._in_flight:
+            timeout = None
+            while record is not None:
+                timestamp, client_id, command = record
+                if self.speed:
+                    delay = started + (timestamp - first_timestamp) / self.speed - time.time()
+                    if delay > 0:
+                        timeout = delay
+                        break
+                if not self._send(client_id, command):
+                    # wait for replies of the connection before sending more commands
+                    break
+                record = next(records, None)
+            if timeout is None and not self._in_flight:
+                continue
+            # `poll()` takes milliseconds, `None` blocks until there are replies
+            for fd, _ in self._poller.poll(None if timeout is None else timeout * 1000):
+                self._read_replies(self._fds[fd])
+        return time.time() - started
+
+    def _send(self, client_id, command):
+        connection = self._connections.get(client_id)
+        if not command:
+            if connection is not None:
+                connection.closing = True
+                self._close_if_done(connection)
+            return True
+        if connection is None:
+            connection = self._connections[client_id] = ReplayConnection(client_id, connect(self.address))
+            self._fds[connection.sock.fileno()] = connection
+            self._poller.register(connection.sock, select.POLLIN)
+        if len(connection.in_flight) >= self.max_in_flight:
+            return False
+        connection.send(command)
+        self._in_flight += 1
+        return True
+
+    def _read_replies(self, connection):
+        for name, latency, is_error in connection.read_replies():
+            self.histogram.record(latency)
+            self.histograms.setdefault(name, LatencyHistogram()).record(latency)
+            self.errors += is_error
+            self._in_flight -= 1
+        self._close_if_done(connection)
+
+    def _close_if_done(self, connection):
+        if connection.closing and not connection.in_flight:
+            self._poller.unregister(connection.sock)
+            del self._fds[connection.sock.fileno()]
+            del self._connections[connection.client_id]
+            connection.sock.close()
+
+    def close(self):
+        # connections that were still open at the end of the capture
+        for connection in list(self._connections.values()):
+            connection.closing = True
+            connection.in_flight.clear()
+            self._close_if_done(connection)
+
+    def get_results(self, seconds):
+        def get_latencies(histogram):
+            return dict((name, histogram.percentile(percentile)) for name, percentile in PERCENTILES)
+
+        return {
+            'requests': self.histogram.count,
+            'errors': self.errors,
+            'seconds': round(seconds, 3),
+            'requests_per_second': round(self.histogram.count / seconds, 1) if seconds else 0,
+            'latency_usec': get_latencies(self.histogram),
+            'commands': dict((name, dict(get_latencies(histogram), requests=histogram.count))
+                             for name, histogram in self.histograms.items()),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('capture', help='capture file')
+    parser.add_argument('--host', default='127.0.0.1', help='server host (defaults to %(default)s)')
+    parser.add_argument('--port', default=6377, type=int, help='server port (defaults to %(default)s)')
+    parser.add_argument('--unixsocket', default=None, help='server unix socket (instead of the host and port)')
+    parser.add_argument('--speed', default=1.0, type=float,
+                        help='multiplier of the captured pace, 0 replays as fast as possible (defaults to %(default)s)')
+    parser.add_argument('--max-in-flight', default=100, type=int,
+                        help='commands of a connection sent without waiting for their replies (defaults to %(default)s)')
+    parser.add_argument('--output', default=None, help='write the JSON results to a file instead of stdout')
+    args = parser.parse_args()
+    if args.max_in_flight < 1:
+        # no command could ever be sent
+        parser.error('--max-in-flight must be at least 1')
+
+    replay = Replay(args.unixsocket or (args.host, args.port), args.speed, args.max_in_flight)
+    with open(args.capture, 'rb') as f:
+        try:
+            seconds = replay.run(read_capture(f))
+        except ValueError as exc:
+            parser.error(str(exc))
+        finally:
+            replay.close()
+
+    content = json.dumps(replay.get_results(seconds), indent=2, sort_keys=True, separators=(',', ': '))
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(content + '\n')
+    else:
+        print(content)
+
+
+if __name__ == '__main__':
+    main()
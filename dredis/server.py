@@ -1,129 +1,554 @@
 import argparse
 import asyncore
+import collections
 import errno
+import itertools
 import logging
 import os.path
+import signal
 import socket
 import tempfile
+import time
 import traceback
+import types
 
 import sys
 
 from dredis import __version__
-from dredis.commands import run_command, SimpleString, CommandNotFound
+from dredis.capture import CAPTURE
+from dredis.commands import get_command, call_command, CommandNotFound
+from dredis.encoder import Encoder
+from dredis.hotkeys import HOTKEYS
 from dredis.keyspace import Keyspace
-from dredis.ldb import LEVELDB
+from dredis.ldb import LEVELDB, STORAGE_IO
 from dredis.lua import RedisScriptError
-from dredis.parser import Parser
+from dredis.memory import MEMORY_DOCTOR
+from dredis.metrics import MetricsServer
+from dredis.parser import Parser, ProtocolError
 from dredis.path import Path
+from dredis.profiler import PROFILER
+from dredis.slowlog import SLOWLOG
+from dredis.stats import STATS, StorageIO
+from dredis.tracking import TRACKING_TABLE
+from dredis.utils import ErrorReply
 
 logger = logging.getLogger('dredis')
 
-KEYSPACES = {}
+CLIENT_IDS = itertools.count(1)
 ROOT_DIR = None  # defined by `main()`
+PARSER_OPTIONS = {}  # defined by `main()`
+ENCODERS = {2: Encoder(protocol=2), 3: Encoder(protocol=3)}
+SERVER_CRON_INTERVAL = 0.1  # in seconds, the same as Redis's default `hz` (10)
+# `logger.debug()` checks the level on every call, the commands check this flag instead
+DEBUG_LOGS = False  # defined by `setup_logging()`
 
 
 def execute_cmd(keyspace, send_fn, cmd, *args):
+    STORAGE_IO.reset()
+    start = time.time()
+    fn = None
+    failed = True
     try:
-        result = run_command(keyspace, cmd, args)
-    except (SyntaxError, CommandNotFound, ValueError, RedisScriptError) as exc:
-        transmit(send_fn, exc)
+        fn = get_command(cmd)
+        result = call_command(keyspace, fn, args)
+        failed = False
+    except (SyntaxError, CommandNotFound, ValueError, RedisScriptError, ErrorReply) as exc:
+        result = exc
     except Exception:
         # no tests cover this part because it's meant for internal errors,
         # such as unexpected bugs in dredis.
-        transmit(send_fn, Exception(traceback.format_exc()))
-    else:
-        transmit(send_fn, result)
-
-
-def transform(obj):
+        result = Exception(traceback.format_exc())
+    end = time.time()
+    # streamed replies read from LevelDB while they're sent, their reads go to `stream_io[0]`
+    # (only created for streamed replies).
+    # it's this command's stats after they're recorded, for the segments sent later (when the socket buffer is full)
+    stream_io = []
+    # `HELLO` may change the protocol, its reply already uses the new protocol (same as Redis)
+    transmit(send_fn, result, keyspace.protocol, stream_io)
+    if stream_io:
+        STORAGE_IO.add(stream_io[0])
+    SLOWLOG.record(cmd, args, start, end, STORAGE_IO)
+    if fn is not None:
+        stats = STATS.record_command(fn.command_name, start, end, failed, STORAGE_IO)
+        if stream_io:
+            stream_io[0] = stats.io
+    if DEBUG_LOGS:
+        logger.debug('[storage io] cmd=%s %r', cmd, STORAGE_IO)
+
+
+def transform(obj, protocol=2):
     result = []
-
-    def _transform(elem):
-        if elem is None:
-            result.append('$-1\r\n')
-        elif isinstance(elem, int):
-            result.append(':{}\r\n'.format(elem))
-        elif isinstance(elem, SimpleString):
-            result.append('+{}\r\n'.format(elem))
-        elif isinstance(elem, basestring):
-            result.append('${}\r\n{}\r\n'.format(len(elem), elem))
-        elif isinstance(elem, (set, list, tuple)):
-            result.append('*{}\r\n'.format(len(elem)))
-            for element in elem:
-                _transform(element)
-        elif isinstance(elem, Exception):
-            result.append('-ERR {}\r\n'.format(str(elem)))
+    for segment in ENCODERS[protocol].encode(obj):
+        if isinstance(segment, types.GeneratorType):
+            result.extend(segment)
         else:
-            assert False, 'couldnt catch a response for {} (type {})'.format(repr(elem), type(elem))
-
-    _transform(obj)
+            result.append(segment)
     return ''.join(result)
 
 
-def transmit(send_fn, result):
-    send_fn(transform(result))
+def transmit(send_fn, result, protocol=2, stream_io=None):
+    for segment in ENCODERS[protocol].encode(result):
+        if stream_io is not None and type(segment) is types.GeneratorType:
+            if not stream_io:
+                stream_io.append(StorageIO())
+            segment = count_stream_io(segment, stream_io)
+        send_fn(segment)
+
+
+def count_stream_io(segments, stream_io):
+    """
+    Count the LevelDB operations of a streamed reply in `stream_io[0]` instead of `STORAGE_IO`.
+    The segments may be read after their command returned, e.g. while the next command of the client runs.
+    """
+    while True:
+        running_io = STORAGE_IO.copy()
+        STORAGE_IO.reset()
+        try:
+            segment = next(segments, None)
+        finally:
+            stream_io[0].add(STORAGE_IO)
+            STORAGE_IO.reset()
+            STORAGE_IO.add(running_io)
+        if segment is None:
+            return
+        yield segment
+
+
+class ClientOutputBufferLimit(object):
+    """
+    Limit the memory used by replies that weren't sent to a client yet.
+
+    It follows the same rules of Redis's `client-output-buffer-limit`:
+    clients are disconnected if they reach the hard limit
+    or if they stay over the soft limit for more than `soft_seconds`.
+    A limit of 0 means no limit.
+    """
+
+    # reading from clients with pending output stops after this size if there are no limits set
+    DEFAULT_READ_PAUSE_SIZE = 1024 * 1024
+
+    def __init__(self, hard_limit=0, soft_limit=0, soft_seconds=0):
+        self.hard_limit = hard_limit
+        self.soft_limit = soft_limit
+        self.soft_seconds = soft_seconds
+        # not a property because it's checked for every client on every event loop iteration
+        self.read_pause_size = soft_limit or hard_limit or self.DEFAULT_READ_PAUSE_SIZE
+
+    def is_over_soft_limit(self, size):
+        return bool(self.soft_limit) and size >= self.soft_limit
+
+    def is_exceeded(self, size, soft_limit_reached_at, now=None):
+        if self.hard_limit and size >= self.hard_limit:
+            return True
+        if soft_limit_reached_at is not None and (now or time.time()) - soft_limit_reached_at >= self.soft_seconds:
+            return True
+        return False
+
+
+OUTPUT_BUFFER_LIMIT = ClientOutputBufferLimit()  # redefined by `main()`
+
+
+class Scheduler(object):
+    """
+    Round-robin scheduling of pipelined commands.
+
+    A client runs at most `max_commands_per_turn` commands or runs commands for at most `max_time_per_turn` seconds
+    every time it's readable. If it has more commands to run, it waits for the next event loop iteration,
+    when the other clients have had their turn, instead of blocking them until the whole pipeline is done.
+    """
+
+    MAX_COMMANDS_PER_TURN = 1000
+    MAX_TIME_PER_TURN = 0.01  # in seconds
+
+    def __init__(self, max_commands_per_turn=MAX_COMMANDS_PER_TURN, max_time_per_turn=MAX_TIME_PER_TURN):
+        self.max_commands_per_turn = max_commands_per_turn
+        self.max_time_per_turn = max_time_per_turn
+        self._waiting = collections.deque()
+
+    def has_waiting_clients(self):
+        # clients paused by backpressure wait for an event (e.g. the socket becoming writable) like idle clients
+        return any(not handler.is_paused() for handler in self._waiting)
+
+    def throttle(self, handler):
+        STATS.throttled_turns += 1
+        self._waiting.append(handler)
+
+    def run_waiting_clients(self):
+        # clients throttled again go to the end of the queue and wait for the next call
+        for _ in range(len(self._waiting)):
+            handler = self._waiting.popleft()
+            if handler.connected and handler.is_paused():
+                # keep the turn until the client reads its replies (or the write stall is over)
+                self._waiting.append(handler)
+            elif handler.connected:
+                try:
+                    STATS.commands_run_in_extra_turns += handler.run_buffered_commands()
+                except Exception:
+                    # same as asyncore does for errors of the event handlers: log the error and close the client
+                    handler.handle_error()
+
+
+SCHEDULER = Scheduler()  # redefined by `main()`
+
+
+class WriteThrottle(object):
+    """
+    Slow down the heaviest writers while LevelDB compactions are behind.
+
+    LevelDB delays writes when level 0 has too many files and stops them until the compaction is done
+    when there are even more (8 and 12 files by default), which freezes every client of the event loop.
+    When a database has `max_level0_files` files or more in level 0, the clients that wrote most of the bytes
+    since the last check (`HEAVY_WRITERS_SHARE` of them) aren't read until level 0 is below the limit again,
+    so the compactions can catch up while the other clients (e.g. readers) keep running their commands.
+    A `max_level0_files` of 0 disables it.
+    """
+
+    # lower than LevelDB's `kL0_SlowdownWritesTrigger` (8) to throttle clients before LevelDB slows down every write
+    MAX_LEVEL0_FILES = 6
+    HEAVY_WRITERS_SHARE = 0.8
+
+    def __init__(self, max_level0_files=MAX_LEVEL0_FILES):
+        self.max_level0_files = max_level0_files
+        self.stalled = False
+
+    def get_level0_files(self):
+        return max([int(LEVELDB.get_db(db_id).get_property(b'leveldb.num-files-at-level0'))
+                    for db_id in LEVELDB.get_db_ids()] or [0])
+
+    def check(self, handlers):
+        if not self.max_level0_files:
+            return
+        STATS.leveldb_level0_files = self.get_level0_files()
+        stalled = STATS.leveldb_level0_files >= self.max_level0_files
+        if stalled and not self.stalled:
+            STATS.write_stalls += 1
+            logger.warning('LevelDB has {} files in level 0, throttling the heaviest writers'.format(
+                STATS.leveldb_level0_files))
+        self.stalled = stalled
+
+        # throttled clients don't write, they stay throttled until the stall is over instead of being read again
+        # because they're not among the heaviest writers of the last check anymore
+        heaviest_writers = self.get_heaviest_writers(handlers) if stalled else ()
+        for handler in handlers:
+            if handler in heaviest_writers and not handler.write_throttled:
+                STATS.throttled_writers += 1
+            handler.write_throttled = stalled and (handler.write_throttled or handler in heaviest_writers)
+            handler.written_bytes = 0
+
+    def get_heaviest_writers(self, handlers):
+        writers = sorted((handler for handler in handlers if handler.written_bytes),
+                         key=lambda handler: handler.written_bytes, reverse=True)
+        total = sum(handler.written_bytes for handler in writers)
+        result = set()
+        throttled_bytes = 0
+        for handler in writers:
+            if throttled_bytes >= total * self.HEAVY_WRITERS_SHARE:
+                break
+            result.add(handler)
+            throttled_bytes += handler.written_bytes
+        return result
+
+
+WRITE_THROTTLE = WriteThrottle()  # redefined by `main()`
 
 
 class CommandHandler(asyncore.dispatcher):
 
+    # replies of pipelined commands are sent together,
+    # but they're flushed earlier if they get larger than this limit (in bytes)
+    MAX_PENDING_REPLIES_SIZE = 64 * 1024
+
     def __init__(self, *args, **kwargs):
         asyncore.dispatcher.__init__(self, *args, **kwargs)
-        self._parser = Parser(self.recv)  # contains client message buffer
+        # unique id, same as Redis's `CLIENT ID` (unix socket clients don't have unique addresses)
+        self.client_id = next(CLIENT_IDS)
+        self._keyspace = None  # created by the first command
+        self._parser = Parser(self.recv, **PARSER_OPTIONS)  # contains client message buffer
+        self._out_buffer = collections.deque()  # replies not sent yet (partial sends or a full socket buffer)
+        self._out_buffer_size = 0  # bytes in `self._out_buffer` (streamed replies count each segment when it's read)
+        self._pending_streams = 0  # streamed replies in `self._out_buffer` that weren't fully read yet
+        self._soft_limit_reached_at = None
+        self._throttled = False  # there are buffered commands waiting for the next turn
+        self._pending_replies = []  # replies of the current read batch
+        self._pending_replies_size = 0
+        self.written_bytes = 0  # bytes written to LevelDB since the last check of `WRITE_THROTTLE`
+        self.write_throttled = False  # not read until the next check of `WRITE_THROTTLE`
+        STATS.connected_clients += 1
+        STATS.total_connections_received += 1
 
     def handle_read(self):
         try:
-            for cmd in self._parser.get_instructions():
-                logger.debug('{} data = {}'.format(self.addr, repr(cmd)))
-                execute_cmd(self.keyspace, self.debug_send, *cmd)
+            instructions = self._parser.get_instructions()
         except socket.error as exc:
             # try again later if no data is available
             if exc.errno == errno.EAGAIN:
                 return
             else:
                 raise
+        except ProtocolError as exc:
+            self._handle_protocol_error(exc)
+        else:
+            self._run_commands(instructions)
+
+    def run_buffered_commands(self):
+        return self._run_commands(self._parser.get_buffered_instructions())
+
+    def _run_commands(self, instructions):
+        count = 0
+        written_bytes = 0
+        deadline = time.time() + SCHEDULER.max_time_per_turn
+        try:
+            for cmd in instructions:
+                if DEBUG_LOGS:
+                    logger.debug('%s data = %r', self.addr, cmd)
+                if CAPTURE.running:
+                    CAPTURE.record_command(self.client_id, cmd)
+                execute_cmd(self.keyspace, self._queue_reply, *cmd)
+                written_bytes += STORAGE_IO.bytes_written
+                count += 1
+                if not self.connected:
+                    # disconnected because of the output buffer limits
+                    break
+                if self._pending_streams or count >= SCHEDULER.max_commands_per_turn or time.time() >= deadline:
+                    # the next commands wait until the streamed reply is sent (see `is_paused()`),
+                    # without buffered commands the client is read again instead of waiting for another turn
+                    self._throttled = self._parser.has_buffered_data()
+                    if self._throttled:
+                        SCHEDULER.throttle(self)
+                    break
+            else:
+                self._throttled = False
+        except ProtocolError as exc:
+            self._throttled = False
+            self._handle_protocol_error(exc)
+        finally:
+            self.written_bytes += written_bytes
+            self._send_pending_replies()
+        return count
+
+    def _handle_protocol_error(self, exc):
+        # same as Redis: reply with the error and close the connection
+        logger.debug('%s %s', self.addr, exc)
+        transmit(self._queue_reply, exc)
+        self._send_pending_replies()
+        self.handle_close()
+
+    def _queue_reply(self, data):
+        # the exact type checks are shortcuts for the most common replies (a `str` segment)
+        if type(data) is not str or len(data) >= Encoder.LARGE_VALUE_SIZE:
+            # large values and streamed replies are sent on their own
+            # to avoid copying or loading them in memory when joining the pending replies
+            self._send_pending_replies()
+            self.debug_send(data)
+            return
+        self._pending_replies.append(data)
+        self._pending_replies_size += len(data)
+        if self._pending_replies_size >= self.MAX_PENDING_REPLIES_SIZE:
+            self._send_pending_replies()
+
+    def _send_pending_replies(self):
+        if self._pending_replies:
+            self.debug_send(''.join(self._pending_replies))
+            self._pending_replies = []
+            self._pending_replies_size = 0
 
     def debug_send(self, *args):
-        logger.debug("out={}".format(repr(args)))
-        return self.send(*args)
+        if DEBUG_LOGS:
+            logger.debug('out=%r', args)
+        return self.write(*args)
+
+    def write(self, data):
+        if not self.connected:
+            return
+        self._out_buffer.append(data)
+        if type(data) is types.GeneratorType:
+            self._pending_streams += 1
+        else:
+            self._out_buffer_size += len(data)
+        self._flush_out_buffer()
+
+    def _flush_out_buffer(self):
+        while self._out_buffer:
+            data = self._out_buffer[0]
+            if type(data) is types.GeneratorType:
+                # streamed reply, only the next segment is read and kept in memory
+                segment = next(data, None)
+                if segment is None:
+                    self._out_buffer.popleft()
+                    self._pending_streams -= 1
+                else:
+                    self._out_buffer.appendleft(segment)
+                    self._out_buffer_size += len(segment)
+                continue
+            sent = self.send(data)
+            if not self.connected or not self._out_buffer:
+                # `send()` calls `handle_close()` when the client is gone, which clears the output buffer
+                return
+            self._out_buffer_size -= sent
+            if sent < len(data):
+                # the socket buffer is full (or the client is gone),
+                # the remaining data is sent when the socket becomes writable again
+                self._out_buffer[0] = memoryview(data)[sent:]
+                break
+            self._out_buffer.popleft()
+        self.check_output_buffer_limit()
+
+    def check_output_buffer_limit(self, now=None):
+        if not self.connected:
+            return
+        if OUTPUT_BUFFER_LIMIT.is_over_soft_limit(self._out_buffer_size):
+            if self._soft_limit_reached_at is None:
+                self._soft_limit_reached_at = now or time.time()
+        else:
+            self._soft_limit_reached_at = None
+
+        if OUTPUT_BUFFER_LIMIT.is_exceeded(self._out_buffer_size, self._soft_limit_reached_at, now):
+            logger.warning('Client {} closed for overcoming of output buffer limits ({} bytes).'.format(
+                self.addr, self._out_buffer_size))
+            self.handle_close()
+
+    def is_paused(self):
+        # backpressure: don't run commands of clients that aren't reading their replies (or a streamed reply)
+        # or that write too much while LevelDB is stalled
+        return bool(self._pending_streams or self.write_throttled or
+                    self._out_buffer_size >= OUTPUT_BUFFER_LIMIT.read_pause_size)
+
+    def readable(self):
+        # clients with commands waiting for their next turn are run by the scheduler instead
+        # same checks as `is_paused()`, inlined because it's called for every client on every event loop iteration
+        return not (self._throttled or self._pending_streams or self.write_throttled or
+                    self._out_buffer_size >= OUTPUT_BUFFER_LIMIT.read_pause_size)
+
+    def writable(self):
+        # the default implementation always returns True, which makes `poll()` wake up
+        # for every connected client on every loop iteration even when there's nothing to send
+        return bool(self._out_buffer)
+
+    def handle_write(self):
+        self._flush_out_buffer()
+
+    def push(self, message):
+        # push messages are ordered after the replies of the commands that ran before them
+        transmit(self._queue_reply, message, self.keyspace.protocol)
+        self._send_pending_replies()
+
+    def get_memory_usage(self):
+        """Approximate bytes used by the connection objects, the query buffer, and the output buffer (see `MEMORY STATS`)"""
+        connection = sys.getsizeof(self) + sys.getsizeof(self.__dict__)
+        if self._keyspace is not None:
+            connection += sys.getsizeof(self._keyspace)
+        return connection, self._parser.buffer_size, self._out_buffer_size + self._pending_replies_size
 
     def handle_close(self):
-        logger.debug("closing {}".format(self.addr))
+        logger.debug('closing %s', self.addr)
+        if self._keyspace is not None:
+            self._keyspace.disable_tracking()
+        if self.connected:
+            STATS.connected_clients -= 1
+            if CAPTURE.running:
+                CAPTURE.record_close(self.client_id)
         self.close()
-        if self.addr in KEYSPACES:
-            del KEYSPACES[self.addr]
+        self._out_buffer.clear()
+        self._out_buffer_size = 0
+        self._pending_streams = 0
 
     @property
     def keyspace(self):
-        if self.addr not in KEYSPACES:
-            KEYSPACES[self.addr] = Keyspace()
-        return KEYSPACES[self.addr]
+        if self._keyspace is None:
+            self._keyspace = Keyspace(client_id=self.client_id, push_fn=self.push)
+        return self._keyspace
 
 
 class RedisServer(asyncore.dispatcher):
 
-    def __init__(self, host, port):
+    # same limit as Redis's `MAX_ACCEPTS_PER_CALL`
+    MAX_ACCEPTS_PER_CALL = 1000
+
+    def __init__(self, host, port, reuse_port=False):
         asyncore.dispatcher.__init__(self)
         self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
         self.set_reuse_addr()
+        if reuse_port:
+            # allow multiple dredis processes to share the same port, the kernel balances connections among them
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.bind((host, port))
         self.listen(1024)
 
     def handle_accept(self):
-        pair = self.accept()
-        if pair is not None:
+        # accept all pending connections at once instead of one connection per loop iteration
+        for _ in range(self.MAX_ACCEPTS_PER_CALL):
+            pair = self.accept()
+            if pair is None:
+                break
             sock, addr = pair
-            # disable tcp delay (Nagle's algorithm):
-            # https://en.wikipedia.org/wiki/Nagle%27s_algorithm#Interactions_with_real-time_systems
-            # Redis does the same thing, it seems to be a common practice to send data as soon as possible.
-            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-
-            logger.debug('Incoming connection from %s' % repr(addr))
+            self.setup_client_socket(sock)
+            logger.debug('Incoming connection from %r', addr)
             CommandHandler(sock)
 
+    def setup_client_socket(self, sock):
+        # disable tcp delay (Nagle's algorithm):
+        # https://en.wikipedia.org/wiki/Nagle%27s_algorithm#Interactions_with_real-time_systems
+        # Redis does the same thing, it seems to be a common practice to send data as soon as possible.
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class UnixSocketRedisServer(RedisServer):
+
+    def __init__(self, path, permissions=None):
+        asyncore.dispatcher.__init__(self)
+        self.create_socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # a socket file may be left behind if the server didn't shut down properly
+        if os.path.exists(path):
+            os.unlink(path)
+        self.bind(path)
+        if permissions is not None:
+            os.chmod(path, permissions)
+        self.listen(1024)
+
+    def setup_client_socket(self, sock):
+        # there's no Nagle's algorithm for unix sockets
+        pass
+
+
+def server_cron():
+    # clients that don't read their replies don't trigger write events,
+    # so their output buffer limits are checked periodically
+    now = time.time()
+    STATS.sample_ops(now)
+    HOTKEYS.decay(now)
+    handlers = [channel for channel in asyncore.socket_map.values() if isinstance(channel, CommandHandler)]
+    for handler in handlers:
+        handler.check_output_buffer_limit(now)
+    WRITE_THROTTLE.check(handlers)
+
+
+def toggle_profiler(signum, frame):
+    # `SIGUSR2` has the same effect as `DEBUG PROFILE START sampling` and `DEBUG PROFILE STOP <filename>`
+    if PROFILER.running:
+        extension = 'prof' if PROFILER.mode == 'cprofile' else 'folded'
+        path = PROFILER.stop('dredis-{}-{}.{}'.format(os.getpid(), int(time.time()), extension))
+        logger.info('Profiler stopped: {}'.format(path))
+    else:
+        PROFILER.start('sampling')
+        logger.info('Profiler started, send SIGUSR2 again to stop it')
+
+
+def run_event_loop():
+    next_cron = time.time() + SERVER_CRON_INTERVAL
+    while asyncore.socket_map:
+        # don't wait for new events if there are clients with commands waiting for their turn
+        timeout = 0 if SCHEDULER.has_waiting_clients() else SERVER_CRON_INTERVAL
+        asyncore.loop(timeout=timeout, use_poll=True, count=1)
+        SCHEDULER.run_waiting_clients()
+        if time.time() >= next_cron:
+            server_cron()
+            next_cron = time.time() + SERVER_CRON_INTERVAL
+
 
 def setup_logging(level):
+    global DEBUG_LOGS
     logger.setLevel(level)
+    DEBUG_LOGS = logger.isEnabledFor(logging.DEBUG)
     formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
     handler = logging.StreamHandler(sys.stdout)
     handler.setFormatter(formatter)
@@ -138,8 +563,82 @@ def main():
                         help='directory to save data (defaults to a temporary directory)')
     parser.add_argument('--debug', action='store_true', help='enable debug logs')
     parser.add_argument('--flushall', action='store_true', default=False, help='run FLUSHALL on startup')
+    parser.add_argument('--proto-max-bulk-len', default=Parser.MAX_BULK_LENGTH, type=int,
+                        help='maximum size of a single bulk string in a request (defaults to %(default)s bytes)')
+    parser.add_argument('--client-query-buffer-limit', default=Parser.MAX_QUERY_BUFFER_SIZE, type=int,
+                        help='maximum size of unparsed data from a client (defaults to %(default)s bytes)')
+    parser.add_argument('--client-output-buffer-limit', default=[0, 0, 0], type=int, nargs=3,
+                        metavar=('HARD', 'SOFT', 'SOFT_SECONDS'),
+                        help='disconnect clients with pending replies over the HARD limit (in bytes) '
+                             'or over the SOFT limit for SOFT_SECONDS (defaults to no limits)')
+    parser.add_argument('--max-commands-per-turn', default=Scheduler.MAX_COMMANDS_PER_TURN, type=int,
+                        help='maximum number of pipelined commands a client runs before '
+                             'other clients have their turn (defaults to %(default)s)')
+    parser.add_argument('--max-time-per-turn', default=int(Scheduler.MAX_TIME_PER_TURN * 1e6), type=int,
+                        help='maximum time a client runs pipelined commands before '
+                             'other clients have their turn (defaults to %(default)s microseconds)')
+    parser.add_argument('--max-level0-files', default=WriteThrottle.MAX_LEVEL0_FILES, type=int,
+                        help='stop reading from the heaviest writers while a LevelDB database has this number of files '
+                             'in level 0 or more, 0 disables it (defaults to %(default)s)')
+    parser.add_argument('--unixsocket', default=None,
+                        help='path of a unix socket to listen on (in addition to the TCP port)')
+    parser.add_argument('--unixsocketperm', default=None, type=lambda perm: int(perm, 8),
+                        help='permissions of the unix socket file, in octal (e.g. 700)')
+    parser.add_argument('--reuseport', action='store_true', default=False,
+                        help='set SO_REUSEPORT on the server socket so multiple processes can share the same port')
+    parser.add_argument('--slowlog-log-slower-than', default=SLOWLOG.log_slower_than, type=int,
+                        help='log commands slower than this to the SLOWLOG, a negative value disables it '
+                             '(defaults to %(default)s microseconds)')
+    parser.add_argument('--slowlog-max-len', default=128, type=int,
+                        help='maximum number of SLOWLOG entries (defaults to %(default)s)')
+    parser.add_argument('--hotkeys-sample-rate', default=0, type=int,
+                        help='count the keys of 1 out of this number of commands to find hot keys '
+                             '(OBJECT FREQ and INFO hotkeys), 0 disables it (defaults to %(default)s)')
+    parser.add_argument('--tracking-table-max-keys', default=TRACKING_TABLE.MAX_KEYS, type=int,
+                        help='maximum number of keys remembered for CLIENT TRACKING, the keys evicted to make room '
+                             'are invalidated, 0 means no limit (defaults to %(default)s)')
+    parser.add_argument('--tracemalloc-frames', default=0, type=int,
+                        help='trace memory allocations with `tracemalloc` for MEMORY DOCTOR, '
+                             'storing this number of frames per allocation (disabled by default)')
+    parser.add_argument('--capture', default=None,
+                        help='write the commands of the clients to this file for dredis-replay (disabled by default)')
+    parser.add_argument('--capture-sample-rate', default=1, type=int,
+                        help='capture 1 out of this number of connections (defaults to %(default)s)')
+    parser.add_argument('--capture-max-size', default=0, type=int,
+                        help='stop the capture when the file reaches this size, 0 means no limit '
+                             '(defaults to %(default)s bytes)')
+    parser.add_argument('--metrics-port', default=None, type=int,
+                        help='port of an HTTP server with Prometheus metrics at /metrics (disabled by default)')
     args = parser.parse_args()
 
+    PARSER_OPTIONS['max_bulk_length'] = args.proto_max_bulk_len
+    PARSER_OPTIONS['max_query_buffer_size'] = args.client_query_buffer_limit
+
+    global OUTPUT_BUFFER_LIMIT
+    OUTPUT_BUFFER_LIMIT = ClientOutputBufferLimit(*args.client_output_buffer_limit)
+
+    global SCHEDULER
+    SCHEDULER = Scheduler(args.max_commands_per_turn, args.max_time_per_turn / 1e6)
+
+    global WRITE_THROTTLE
+    WRITE_THROTTLE = WriteThrottle(args.max_level0_files)
+
+    SLOWLOG.setup(args.slowlog_log_slower_than, args.slowlog_max_len)
+    HOTKEYS.setup(args.hotkeys_sample_rate)
+    TRACKING_TABLE.setup(args.tracking_table_max_keys)
+
+    if args.tracemalloc_frames:
+        try:
+            MEMORY_DOCTOR.start_tracing(args.tracemalloc_frames)
+        except ValueError as exc:
+            parser.error(str(exc))
+
+    if args.capture:
+        try:
+            CAPTURE.start(args.capture, args.capture_sample_rate, args.capture_max_size)
+        except (ValueError, IOError) as exc:
+            parser.error(str(exc))
+
     global ROOT_DIR
     if args.dir:
         ROOT_DIR = Path(args.dir)
@@ -154,19 +653,32 @@ def main():
         setup_logging(logging.INFO)
 
     LEVELDB.setup_dbs(ROOT_DIR)
+    PROFILER.setup(ROOT_DIR)
+    CAPTURE.setup(ROOT_DIR)
     keyspace = Keyspace()
     if args.flushall:
         keyspace.flushall()
 
-    RedisServer(args.host, args.port)
+    signal.signal(signal.SIGUSR2, toggle_profiler)
+    RedisServer(args.host, args.port, reuse_port=args.reuseport)
+    if args.unixsocket:
+        UnixSocketRedisServer(args.unixsocket, args.unixsocketperm)
+    if args.metrics_port:
+        MetricsServer(args.host, args.metrics_port)
 
     logger.info("Port: {}".format(args.port))
+    if args.unixsocket:
+        logger.info("Unix socket: {}".format(args.unixsocket))
+    if args.metrics_port:
+        logger.info("Metrics port: {}".format(args.metrics_port))
+    if args.capture:
+        logger.info("Capturing commands to: {}".format(args.capture))
     logger.info("Root directory: {}".format(ROOT_DIR))
     logger.info('PID: {}'.format(os.getpid()))
     logger.info('Ready to accept connections')
 
     try:
-        asyncore.loop(use_poll=True)
+        run_event_loop()
     except KeyboardInterrupt:
         logger.info("Shutting down...")
 
@@ -0,0 +1,59 @@
+import collections
+import itertools
+
+
+class SlowLog(object):
+    """
+    Commands that took longer than `log_slower_than` microseconds to run,
+    same as Redis's `SLOWLOG` (`slowlog-log-slower-than` and `slowlog-max-len`).
+
+    A negative `log_slower_than` disables the log and 0 logs every command.
+    The log is a ring buffer, the oldest entries are discarded after `max_len` entries.
+    """
+
+    # same limits as Redis's `SLOWLOG_ENTRY_MAX_ARGC` and `SLOWLOG_ENTRY_MAX_STRING`
+    MAX_ARGS = 32
+    MAX_ARG_LENGTH = 128
+
+    def __init__(self, log_slower_than=10000, max_len=128):
+        self._entries = collections.deque(maxlen=max_len)
+        self._ids = itertools.count()
+        self.log_slower_than = log_slower_than
+
+    def setup(self, log_slower_than, max_len):
+        self.log_slower_than = log_slower_than
+        self._entries = collections.deque(self._entries, maxlen=max_len)
+
+    def record(self, cmd, args, start, end, io=None):
+        if self.log_slower_than < 0:
+            return
+        duration = int((end - start) * 1000000)  # in microseconds
+        if duration >= self.log_slower_than:
+            entry = [next(self._ids), int(start), duration, self._truncate_args(cmd, args)]
+            if io is not None:
+                # dredis only: the LevelDB operations of the command as a flat list of field/value pairs.
+                # Redis's 5th field is the client address, which isn't available where commands run.
+                entry.append([item for pair in io.items() for item in pair])
+            self._entries.appendleft(entry)
+
+    def _truncate_args(self, cmd, args):
+        argv = [cmd]
+        argv.extend(args[:self.MAX_ARGS - 1])
+        if len(args) + 1 > self.MAX_ARGS:
+            argv[-1] = '... ({} more arguments)'.format(len(args) + 2 - self.MAX_ARGS)
+        for i, arg in enumerate(argv):
+            if len(arg) > self.MAX_ARG_LENGTH:
+                argv[i] = '{}... ({} more bytes)'.format(arg[:self.MAX_ARG_LENGTH], len(arg) - self.MAX_ARG_LENGTH)
+        return argv
+
+    def get(self, count=10):
+        return list(itertools.islice(self._entries, count))
+
+    def reset(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+SLOWLOG = SlowLog()
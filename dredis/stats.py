@@ -0,0 +1,159 @@
+import collections
+import math
+import time
+
+
+class LatencyHistogram(object):
+    """
+    Log-linear histogram of latencies in microseconds, similar to HdrHistogram.
+
+    Values under `2 ** (SUB_BUCKET_BITS + 1)` are counted exactly, larger values are counted
+    in `2 ** SUB_BUCKET_BITS` buckets per power of two (a relative error of ~3%).
+    Only buckets with values are kept, so the histogram stays small for any range of latencies.
+    """
+
+    SUB_BUCKET_BITS = 5
+
+    def __init__(self):
+        self._counts = {}  # bucket -> number of values
+        self.count = 0
+
+    def record(self, value):
+        bucket = self._get_bucket(value)
+        self._counts[bucket] = self._counts.get(bucket, 0) + 1
+        self.count += 1
+
+    def merge(self, other):
+        for bucket, count in other._counts.items():
+            self._counts[bucket] = self._counts.get(bucket, 0) + count
+        self.count += other.count
+
+    def percentile(self, percentile):
+        """Highest value of the bucket that contains the percentile (same as HdrHistogram)"""
+        if not self.count:
+            return 0
+        rank = max(1, int(math.ceil(self.count * percentile / 100.0)))
+        seen = 0
+        for bucket in sorted(self._counts):
+            seen += self._counts[bucket]
+            if seen >= rank:
+                return self._get_bucket_max_value(bucket)
+
+    @classmethod
+    def _get_bucket(cls, value):
+        shift = max(0, value.bit_length() - cls.SUB_BUCKET_BITS - 1)
+        return (shift << cls.SUB_BUCKET_BITS) + (value >> shift)
+
+    @classmethod
+    def _get_bucket_max_value(cls, bucket):
+        shift = max(0, (bucket >> cls.SUB_BUCKET_BITS) - 1)
+        sub_bucket = bucket - (shift << cls.SUB_BUCKET_BITS)
+        return ((sub_bucket + 1) << shift) - 1
+
+
+class StorageIO(object):
+    """
+    LevelDB operations run by a command.
+
+    A single command may do a lot more work than it looks (e.g. `DEL` reads up to 4 keys per key and
+    `KEYS` iterates over the whole database), so the counters show the read and write amplification of each command.
+    """
+
+    FIELDS = ('gets', 'puts', 'deletes', 'batch_writes', 'seeks', 'steps', 'bytes_read', 'bytes_written')
+    __slots__ = FIELDS
+
+    def __init__(self):
+        self.reset()
+
+    # `reset()` and `add()` run for every command, so they don't loop over `FIELDS`
+    def reset(self):
+        self.gets = self.puts = self.deletes = self.batch_writes = 0
+        self.seeks = self.steps = self.bytes_read = self.bytes_written = 0
+
+    def add(self, other):
+        self.gets += other.gets
+        self.puts += other.puts
+        self.deletes += other.deletes
+        self.batch_writes += other.batch_writes
+        self.seeks += other.seeks
+        self.steps += other.steps
+        self.bytes_read += other.bytes_read
+        self.bytes_written += other.bytes_written
+
+    def copy(self):
+        result = StorageIO()
+        result.add(self)
+        return result
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self.FIELDS]
+
+    def __repr__(self):
+        return '<StorageIO {}>'.format(' '.join('{}={}'.format(field, value) for field, value in self.items()))
+
+
+class CommandStats(object):
+
+    def __init__(self):
+        self.calls = 0
+        self.failed_calls = 0
+        self.usec = 0  # cumulative time of all calls
+        self.histogram = LatencyHistogram()
+        self.io = StorageIO()  # cumulative LevelDB operations of all calls
+
+    def record(self, duration, failed, io=None):
+        self.calls += 1
+        self.usec += duration
+        if failed:
+            self.failed_calls += 1
+        self.histogram.record(duration)
+        if io is not None:
+            self.io.add(io)
+
+
+class ServerStats(object):
+    """Server counters reported by `INFO` and by the metrics endpoint"""
+
+    # same as Redis's `STATS_METRIC_SAMPLES`, the ops/sec are the average of the last samples
+    OPS_SAMPLES = 16
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.connected_clients = 0
+        self.total_connections_received = 0
+        self.total_commands_processed = 0
+        self.throttled_turns = 0
+        self.commands_run_in_extra_turns = 0
+        self.leveldb_level0_files = 0  # the most files in level 0 among all databases
+        self.write_stalls = 0
+        self.throttled_writers = 0
+        self.commands = {}  # command name -> `CommandStats`
+        self._ops_samples = collections.deque(maxlen=self.OPS_SAMPLES)
+        self._last_sample = (self.start_time, 0)
+
+    def record_command(self, name, start, end, failed, io=None):
+        self.total_commands_processed += 1
+        stats = self.commands.get(name)
+        if stats is None:
+            stats = self.commands[name] = CommandStats()
+        stats.record(int(round((end - start) * 1000000)), failed, io)
+        return stats
+
+    def sample_ops(self, now):
+        last_time, last_commands = self._last_sample
+        if now > last_time:
+            self._ops_samples.append((self.total_commands_processed - last_commands) / (now - last_time))
+            self._last_sample = (now, self.total_commands_processed)
+
+    @property
+    def instantaneous_ops_per_sec(self):
+        if not self._ops_samples:
+            return 0
+        return int(sum(self._ops_samples) / len(self._ops_samples))
+
+    @property
+    def uptime(self):
+        return int(time.time() - self.start_time)
+
+
+STATS = ServerStats()
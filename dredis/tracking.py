@@ -0,0 +1,89 @@
+import collections
+import itertools
+import sys
+
+import six
+
+from dredis.utils import Push
+
+
+class TrackingTable(object):
+    """
+    Keys read by clients with `CLIENT TRACKING ON`, similar to Redis's tracking table (default mode).
+
+    Clients are notified only once: the key is forgotten after its invalidation message is sent
+    and it's remembered again when the client reads it.
+    When there are more than `max_keys` keys, the keys that are forgotten to make room are invalidated
+    (same as Redis's `tracking-table-max-keys`). A `max_keys` of 0 means no limit.
+    """
+
+    MAX_KEYS = 1000000
+    MEMORY_USAGE_SAMPLES = 100  # keys measured by `get_memory_usage()`
+
+    def __init__(self, max_keys=MAX_KEYS):
+        self.max_keys = max_keys
+        self.evicted_keys = 0
+        self._push_fns = {}  # client id -> function that sends a push message to the client
+        # key -> ids of clients that read it.
+        # the ids of clients that stopped tracking are removed lazily (when the key is invalidated)
+        self._clients_by_key = collections.defaultdict(set)
+
+    def enable(self, client_id, push_fn):
+        self._push_fns[client_id] = push_fn
+
+    def disable(self, client_id):
+        self._push_fns.pop(client_id, None)
+
+    def setup(self, max_keys):
+        self.max_keys = max_keys
+
+    def remember(self, client_id, key):
+        if self.max_keys and key not in self._clients_by_key:
+            while len(self._clients_by_key) >= self.max_keys:
+                # like Redis, an arbitrary key is evicted, `popitem()` doesn't iterate over the table
+                self._notify(*self._clients_by_key.popitem())
+                self.evicted_keys += 1
+        self._clients_by_key[key].add(client_id)
+
+    def invalidate(self, key):
+        client_ids = self._clients_by_key.pop(key, None)
+        if client_ids:
+            self._notify(key, client_ids)
+
+    def _notify(self, key, client_ids):
+        message = Push(['invalidate', [key]])
+        for client_id in client_ids:
+            push_fn = self._push_fns.get(client_id)
+            if push_fn is not None:
+                push_fn(message)
+
+    def invalidate_all(self):
+        # same as Redis after FLUSHDB and FLUSHALL: a null invalidation means all keys are invalid
+        self._clients_by_key.clear()
+        message = Push(['invalidate', None])
+        for push_fn in self._push_fns.values():
+            push_fn(message)
+
+    def get_memory_usage(self, samples=MEMORY_USAGE_SAMPLES):
+        """
+        Approximate bytes used by the table: the average size of the first `samples` keys times the number of keys.
+        The table may have up to `max_keys` keys, which are too many to measure on the event loop.
+        """
+        size = sys.getsizeof(self._clients_by_key) + sys.getsizeof(self._push_fns)
+        entries = list(itertools.islice(six.iteritems(self._clients_by_key), samples))
+        if entries:
+            sampled_size = sum(sys.getsizeof(key) + sys.getsizeof(client_ids) + sum(map(sys.getsizeof, client_ids))
+                               for key, client_ids in entries)
+            size += sampled_size * len(self._clients_by_key) // len(entries)
+        return size
+
+    @property
+    def tracking_clients(self):
+        return len(self._push_fns)
+
+    @property
+    def tracked_keys(self):
+        return len(self._clients_by_key)
+
+
+TRACKING_TABLE = TrackingTable()
@@ -4,3 +4,36 @@ def to_float(s):
         return 0
     else:
         return float(s)
+
+
+class LazyCollection(object):
+    """
+    Collection of known length whose elements are only read when it's iterated
+
+    It's used for replies of large collections, which are sent to the client
+    while their elements are read from the database.
+    If `length` isn't given, it's computed by iterating over all elements once (without keeping them in memory).
+    """
+
+    def __init__(self, iterator_fn, length=None):
+        self._iterator_fn = iterator_fn
+        self._length = length
+
+    def __len__(self):
+        if self._length is None:
+            self._length = sum(1 for _ in self._iterator_fn())
+        return self._length
+
+    def __iter__(self):
+        return self._iterator_fn()
+
+    def __repr__(self):
+        return '<LazyCollection length={}>'.format(self._length)
+
+
+class ErrorReply(Exception):
+    """Error reply with its own error code instead of `ERR` (the code is the first word of the message)"""
+
+
+class Push(list):
+    """Out-of-band message (e.g. key invalidations), sent as an array in RESP2 and as a push in RESP3"""
@@ -61,10 +61,14 @@ if __name__ == '__main__':
             'License :: OSI Approved :: MIT License',
             'Topic :: Database',
         ],
-        scripts=['contrib/dredis-snapshot'],
+        scripts=['contrib/dredis-snapshot', 'contrib/dredis-hotkeys'],
         entry_points={
             'console_scripts': [
                 'dredis = dredis.server:main',
+                'dredis-bigkeys = dredis.bigkeys:main',
+                'dredis-benchmark = dredis.benchmark:main',
+                'dredis-replay = dredis.replay:main',
+                'dredis-populate = dredis.populate:main',
             ]
         },
         zip_safe=False,
@@ -0,0 +1,258 @@
+"""
+Microbenchmarks of the pure-Python code that runs for every command, without a server.
+
+Similar to pyperf, every benchmark is calibrated first: the number of loops doubles until a run takes
+at least --min-time seconds, then the benchmark runs --runs times (after a warmup run) and the mean and
+standard deviation of the time per loop are reported.
+
+The results are saved to `<output-dir>/<git revision>.json` (with a `-dirty` suffix for uncommitted changes),
+so `--compare <revision>` shows how each benchmark changed since that revision.
+
+$ make microbenchmarks
+$ git checkout my-optimization
+$ make microbenchmarks MICROBENCHMARKS_OPTIONS='--compare master-revision'
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import time
+
+from dredis.commands import Map, SimpleString
+from dredis.ldb import KEY_CODEC, LDB_HASH_TYPE
+from dredis.parser import Parser
+from dredis.server import transform
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """
+    Register a benchmark, the decorated function does the setup and returns the function to be measured
+    """
+    def decorator(setup_fn):
+        BENCHMARKS.append((name, setup_fn))
+        return setup_fn
+    return decorator
+
+
+@benchmark('codec.encode_metadata')
+def bench_encode_metadata():
+    return lambda: KEY_CODEC.encode_metadata('user:1000')
+
+
+@benchmark('codec.decode_metadata_value')
+def bench_decode_metadata_value():
+    metadata = KEY_CODEC.encode_metadata_value(LDB_HASH_TYPE, 1000)
+    return lambda: KEY_CODEC.decode_metadata_value(metadata)
+
+
+@benchmark('codec.encode_hash_field')
+def bench_encode_hash_field():
+    return lambda: KEY_CODEC.encode_hash_field('user:1000', 'email')
+
+
+@benchmark('codec.encode_zset_score')
+def bench_encode_zset_score():
+    return lambda: KEY_CODEC.encode_zset_score('leaderboard', 'player:1000', 1234.5)
+
+
+@benchmark('codec.decode_key')
+def bench_decode_key():
+    ldb_key = KEY_CODEC.encode_hash_field('user:1000', 'email')
+    return lambda: KEY_CODEC.decode_key(ldb_key)
+
+
+@benchmark('codec.decode_zset_score')
+def bench_decode_zset_score():
+    ldb_key = KEY_CODEC.encode_zset_score('leaderboard', 'player:1000', 1234.5)
+    return lambda: KEY_CODEC.decode_zset_score(ldb_key)
+
+
+@benchmark('codec.decode_zset_value')
+def bench_decode_zset_value():
+    ldb_key = KEY_CODEC.encode_zset_score('leaderboard', 'player:1000', 1234.5)
+    return lambda: KEY_CODEC.decode_zset_value(ldb_key)
+
+
+def _get_parser_fn(data):
+    parser = Parser(lambda _: data)
+    return lambda: list(parser.get_instructions())
+
+
+@benchmark('parser.get_instructions (1 x GET)')
+def bench_parser_get():
+    return _get_parser_fn('*2\r\n$3\r\nGET\r\n$9\r\nuser:1000\r\n')
+
+
+@benchmark('parser.get_instructions (pipeline of 10 x GET)')
+def bench_parser_small_pipeline():
+    return _get_parser_fn('*2\r\n$3\r\nGET\r\n$9\r\nuser:1000\r\n' * 10)
+
+
+@benchmark('parser.get_instructions (pipeline of 100 x GET)')
+def bench_parser_get_pipeline():
+    return _get_parser_fn('*2\r\n$3\r\nGET\r\n$9\r\nuser:1000\r\n' * 100)
+
+
+@benchmark('parser.get_instructions (pipeline of 100 x SET)')
+def bench_parser_pipeline():
+    return _get_parser_fn('*3\r\n$3\r\nSET\r\n$9\r\nuser:1000\r\n$10\r\nxxxxxxxxxx\r\n' * 100)
+
+
+@benchmark('parser.get_instructions (1 x SET of 1MB)')
+def bench_parser_large_value():
+    value = 'x' * 1024 * 1024
+    return _get_parser_fn('*3\r\n$3\r\nSET\r\n$9\r\nuser:1000\r\n${}\r\n{}\r\n'.format(len(value), value))
+
+
+@benchmark('parser.get_instructions (1 x SET of 1MB in chunks of 64KB)')
+def bench_parser_large_value_in_chunks():
+    value = 'x' * 1024 * 1024
+    data = '*3\r\n$3\r\nSET\r\n$9\r\nuser:1000\r\n${}\r\n{}\r\n'.format(len(value), value)
+    chunks = [data[i:i + 64 * 1024] for i in range(0, len(data), 64 * 1024)]
+    reads = itertools.cycle(chunks)
+    parser = Parser(lambda _: next(reads))
+    return lambda: [list(parser.get_instructions()) for _ in chunks]
+
+
+@benchmark('server.transform (bulk string)')
+def bench_transform_bulk_string():
+    return lambda: transform('x' * 10)
+
+
+@benchmark('server.transform (array of 100 bulk strings)')
+def bench_transform_array():
+    reply = ['member{}'.format(i) for i in range(100)]
+    return lambda: transform(reply)
+
+
+@benchmark('server.transform (map with 10 fields, RESP3)')
+def bench_transform_map():
+    reply = Map(['field{}'.format(i) if i % 2 == 0 else str(i) for i in range(20)])
+    return lambda: transform(reply, protocol=3)
+
+
+@benchmark('server.transform (simple string)')
+def bench_transform_simple_string():
+    reply = SimpleString('OK')
+    return lambda: transform(reply)
+
+
+def _get_lua_conversion_fn(script):
+    from dredis.lua import LuaRunner
+    runner = LuaRunner(keyspace=None)
+    result = runner._runtime.eval('function() {} end'.format(script))()
+    return lambda: runner._convert_lua_types_to_redis_types(result)
+
+
+@benchmark('lua._convert_lua_types_to_redis_types (number)')
+def bench_lua_number():
+    return _get_lua_conversion_fn('return 1')
+
+
+@benchmark('lua._convert_lua_types_to_redis_types (table of 100 strings)')
+def bench_lua_table():
+    return _get_lua_conversion_fn('local t = {} for i = 1, 100 do t[i] = "member" .. i end return t')
+
+
+@benchmark('lua._convert_lua_types_to_redis_types (nested tables)')
+def bench_lua_nested_tables():
+    return _get_lua_conversion_fn('return {1, {"a", {ok="OK"}}, {2, {3, false}}}')
+
+
+def time_loops(fn, loops):
+    loops_range = range(loops)
+    start = time.time()
+    for _ in loops_range:
+        fn()
+    return time.time() - start
+
+
+def calibrate(fn, min_time):
+    loops = 1
+    while time_loops(fn, loops) < min_time:
+        loops *= 2
+    return loops
+
+
+def run_benchmark(fn, runs, min_time):
+    """Mean and standard deviation of the seconds per loop"""
+    loops = calibrate(fn, min_time)
+    time_loops(fn, loops)  # warmup
+    values = [time_loops(fn, loops) / loops for _ in range(runs)]
+    mean = sum(values) / len(values)
+    stdev = math.sqrt(sum((value - mean) ** 2 for value in values) / max(1, len(values) - 1))
+    return {'mean': mean, 'stdev': stdev, 'loops': loops, 'runs': runs}
+
+
+def format_seconds(seconds):
+    for unit, scale in (('sec', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '{:.2f} {}'.format(seconds / scale, unit)
+    return '{:.1f} ns'.format(seconds / 1e-9)
+
+
+def get_revision():
+    revision = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD']).strip()
+    if subprocess.call(['git', 'diff', '--quiet', 'HEAD']) != 0:
+        revision += '-dirty'
+    return revision
+
+
+def compare(result, previous):
+    if previous is None:
+        return 'no previous result'
+    ratio = previous['mean'] / result['mean']
+    # differences within the noise of both results aren't significant
+    if abs(previous['mean'] - result['mean']) <= previous['stdev'] + result['stdev']:
+        return 'not significant ({:.2f}x)'.format(ratio)
+    return '{:.2f}x {}'.format(ratio if ratio >= 1 else 1 / ratio, 'faster' if ratio >= 1 else 'slower')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', default=10, type=int, help='runs per benchmark (defaults to %(default)s)')
+    parser.add_argument('--min-time', default=0.1, type=float,
+                        help='minimum seconds of a run, used to calibrate the loops (defaults to %(default)s)')
+    parser.add_argument('--filter', default=None, help='only run the benchmarks that match this regular expression')
+    parser.add_argument('--output-dir', default='.microbenchmarks',
+                        help='directory of the results per revision (defaults to %(default)s)')
+    parser.add_argument('--compare', default=None, help='git revision of saved results to compare with')
+    args = parser.parse_args()
+
+    previous_results = {}
+    if args.compare:
+        with open(os.path.join(args.output_dir, '{}.json'.format(args.compare))) as f:
+            previous_results = json.load(f)['benchmarks']
+
+    results = {}
+    for name, setup_fn in BENCHMARKS:
+        if args.filter and not re.search(args.filter, name):
+            continue
+        result = results[name] = run_benchmark(setup_fn(), args.runs, args.min_time)
+        line = '{}: {} +- {}'.format(name, format_seconds(result['mean']), format_seconds(result['stdev']))
+        if args.compare:
+            line += ' ({})'.format(compare(result, previous_results.get(name)))
+        print(line)
+
+    revision = get_revision()
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    path = os.path.join(args.output_dir, '{}.json'.format(revision))
+    if args.filter and os.path.exists(path):
+        # keep the results of the other benchmarks of this revision
+        with open(path) as f:
+            results = dict(json.load(f)['benchmarks'], **results)
+    with open(path, 'w') as f:
+        json.dump({'revision': revision, 'python': sys.version, 'benchmarks': results}, f,
+                  indent=2, sort_keys=True, separators=(',', ': '))
+    print('Results saved to {}'.format(path))
+
+
+if __name__ == '__main__':
+    main()
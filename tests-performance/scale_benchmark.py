@@ -0,0 +1,184 @@
+"""
+Latency of commands as the number of keys and the size of collections grow.
+
+The server is loaded incrementally (the data of a size is kept for the next one) and, after every size,
+each command runs with random arguments and its p50/p99 latencies are recorded.
+The output is a chart per command and an estimate of how the latency grows (the exponent `k` of `O(n^k)`
+from a least squares fit in log-log scale, so ~0 is constant and ~1 is linear).
+The latencies include the round trip to the server, which flattens the growth of the fastest commands.
+
+It runs FLUSHALL, so use a server without important data:
+
+$ make performance-server &
+$ make scale-benchmark SCALE_BENCHMARK_OPTIONS='--keyspace-sizes 10000,100000,1000000 --output scale.json'
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import time
+
+from dredis.stats import LatencyHistogram
+from tests.helpers import fresh_redis
+
+PROFILE_PORT = 6376
+BATCH_SIZE = 1000
+CHART_WIDTH = 40
+
+# (name, function that returns the arguments of the command from a random generator and the current size)
+KEYSPACE_COMMANDS = [
+    ('GET', lambda rng, size: ['GET', 'key:{}'.format(rng.randrange(size))]),
+    ('SET (existing key)', lambda rng, size: ['SET', 'key:{}'.format(rng.randrange(size)), 'x' * 10]),
+    ('EXISTS', lambda rng, size: ['EXISTS', 'key:{}'.format(rng.randrange(size))]),
+    ('TYPE', lambda rng, size: ['TYPE', 'key:{}'.format(rng.randrange(size))]),
+    ('DEL (missing key)', lambda rng, size: ['DEL', 'missing:{}'.format(rng.randrange(size))]),
+    ('DBSIZE', lambda rng, size: ['DBSIZE']),
+    ('KEYS (1 match)', lambda rng, size: ['KEYS', 'key:{}'.format(rng.randrange(size))]),
+]
+COLLECTION_COMMANDS = [
+    ('ZADD (existing member)', lambda rng, size: ['ZADD', 'zset', _random_score(rng, size), _random_member(rng, size)]),
+    ('ZSCORE', lambda rng, size: ['ZSCORE', 'zset', _random_member(rng, size)]),
+    ('ZRANK', lambda rng, size: ['ZRANK', 'zset', _random_member(rng, size)]),
+    ('ZRANGE (first 10)', lambda rng, size: ['ZRANGE', 'zset', 0, 9]),
+    ('ZRANGE (last 10)', lambda rng, size: ['ZRANGE', 'zset', -10, -1]),
+    ('ZCOUNT (10 scores)', lambda rng, size: ['ZCOUNT', 'zset'] + _random_score_range(rng, size)),
+    ('ZRANGEBYSCORE (10 scores)', lambda rng, size: ['ZRANGEBYSCORE', 'zset'] + _random_score_range(rng, size)),
+    ('ZCARD', lambda rng, size: ['ZCARD', 'zset']),
+    ('HSET (existing field)', lambda rng, size: ['HSET', 'hash', _random_member(rng, size), 'x' * 10]),
+    ('HGET', lambda rng, size: ['HGET', 'hash', _random_member(rng, size)]),
+    ('HLEN', lambda rng, size: ['HLEN', 'hash']),
+    ('SADD (existing member)', lambda rng, size: ['SADD', 'set', _random_member(rng, size)]),
+    ('SISMEMBER', lambda rng, size: ['SISMEMBER', 'set', _random_member(rng, size)]),
+    ('SCARD', lambda rng, size: ['SCARD', 'set']),
+]
+
+
+def _random_member(rng, size):
+    return 'member:{}'.format(rng.randrange(size))
+
+
+def _random_score(rng, size):
+    # the score of `member:i` is `i`
+    return rng.randrange(size)
+
+
+def _random_score_range(rng, size):
+    start = rng.randrange(max(1, size - 10))
+    return [start, start + 9]
+
+
+def load_keys(r, start, stop):
+    # `key:0` to `key:<stop - 1>`, DEBUG POPULATE skips the keys that already exist
+    r.execute_command('DEBUG', 'POPULATE', stop)
+
+
+def load_collections(r, start, stop):
+    pipeline = r.pipeline(transaction=False)
+    for i in range(start, stop):
+        member = 'member:{}'.format(i)
+        pipeline.execute_command('ZADD', 'zset', i, member)
+        pipeline.execute_command('HSET', 'hash', member, 'x' * 10)
+        pipeline.execute_command('SADD', 'set', member)
+        if (i + 1) % BATCH_SIZE == 0:
+            pipeline.execute()
+    pipeline.execute()
+
+
+def measure(r, commands, size, samples, max_time, rng, results):
+    for name, get_args in commands:
+        histogram = LatencyHistogram()
+        deadline = time.time() + max_time
+        # slow commands (e.g. KEYS with millions of keys) stop after `max_time` seconds with fewer samples
+        while histogram.count < samples and (not histogram.count or time.time() < deadline):
+            args = get_args(rng, size)
+            before = time.time()
+            r.execute_command(*args)
+            histogram.record(int((time.time() - before) * 1e6))
+        results.setdefault(name, {})[size] = {
+            'p50': histogram.percentile(50),
+            'p99': histogram.percentile(99),
+            'samples': histogram.count,
+        }
+
+
+def get_growth_exponent(latencies):
+    """Slope of the least squares fit of log(p50) by log(size)"""
+    points = [(math.log(size), math.log(max(1, latency['p50']))) for size, latency in latencies.items()]
+    if len(points) < 2:
+        return 0.0
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def format_usec(usec):
+    if usec >= 1e6:
+        return '{:.2f}s'.format(usec / 1e6)
+    if usec >= 1e3:
+        return '{:.2f}ms'.format(usec / 1e3)
+    return '{}us'.format(usec)
+
+
+def print_chart(title, results):
+    """`results` is a list of (command name, {size: latencies})"""
+    print('\n# {}'.format(title))
+    for name, latencies in results:
+        print('\n{} (growth ~ O(n^{:.2f}))'.format(name, get_growth_exponent(latencies)))
+        highest = max(latency['p50'] for latency in latencies.values()) or 1
+        for size in sorted(latencies):
+            latency = latencies[size]
+            bar = '#' * max(1, int(round(CHART_WIDTH * latency['p50'] / float(highest))))
+            print('{:>10} | {:<{width}} p50={} p99={}'.format(
+                size, bar, format_usec(latency['p50']), format_usec(latency['p99']), width=CHART_WIDTH))
+
+
+def parse_sizes(value):
+    return sorted(int(float(size)) for size in value.split(','))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='localhost', help='server host (defaults to %(default)s)')
+    parser.add_argument('--port', default=PROFILE_PORT, type=int, help='server port (defaults to %(default)s)')
+    parser.add_argument('--keyspace-sizes', default='1e4,1e5', type=parse_sizes,
+                        help='numbers of keys, up to 1e7 (defaults to %(default)s)')
+    parser.add_argument('--collection-sizes', default='1e2,1e3,1e4', type=parse_sizes,
+                        help='numbers of elements of the zset, hash, and set, up to 1e6 (defaults to %(default)s)')
+    parser.add_argument('--samples', default=100, type=int, help='calls per command and size (defaults to %(default)s)')
+    parser.add_argument('--max-time', default=10, type=float,
+                        help='seconds per command and size before stopping with fewer samples (defaults to %(default)s)')
+    parser.add_argument('--seed', default=0, type=int, help='seed of the random arguments (defaults to %(default)s)')
+    parser.add_argument('--output', default=None, help='write the results as JSON to a file')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    r = fresh_redis(host=args.host, port=args.port)
+    results = {'keyspace': {}, 'collections': {}}
+    for dimension, sizes, load_fn, commands in [
+        ('keyspace', args.keyspace_sizes, load_keys, KEYSPACE_COMMANDS),
+        ('collections', args.collection_sizes, load_collections, COLLECTION_COMMANDS),
+    ]:
+        r.flushall()
+        loaded = 0
+        for size in sizes:
+            before = time.time()
+            load_fn(r, loaded, size)
+            sys.stderr.write('{}: loaded {} in {:.1f}s\n'.format(dimension, size, time.time() - before))
+            loaded = size
+            measure(r, commands, size, args.samples, args.max_time, rng, results[dimension])
+
+    print_chart('Latency by number of keys', _sorted_by_command(results['keyspace'], KEYSPACE_COMMANDS))
+    print_chart('Latency by number of elements', _sorted_by_command(results['collections'], COLLECTION_COMMANDS))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True, separators=(',', ': '))
+
+
+def _sorted_by_command(results, commands):
+    return [(name, results[name]) for name, _ in commands]
+
+
+if __name__ == '__main__':
+    main()
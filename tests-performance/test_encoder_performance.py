@@ -0,0 +1,67 @@
+"""
+The following results should serve as reference
+------
+
+Results from 2026-10-16 on a Linux VM (CPython 2.7.18):
+transform() 1000 x GET (10 bytes) = 0.00254s
+encoder 1000 x GET (10 bytes) = 0.00194s
+transform() 1 x SMEMBERS (100000 members) = 0.09515s
+encoder 1 x SMEMBERS (100000 members) = 0.05062s
+transform() 1 x GET (50MB) = 0.03585s
+encoder 1 x GET (50MB) = 0.00005s
+"""
+
+import time
+
+from dredis.commands import SimpleString
+from dredis.encoder import Encoder
+
+
+def previous_transform(obj):
+    # the implementation of `dredis.server.transform()` before `dredis.encoder` was introduced
+    result = []
+
+    def _transform(elem):
+        if elem is None:
+            result.append('$-1\r\n')
+        elif isinstance(elem, int):
+            result.append(':{}\r\n'.format(elem))
+        elif isinstance(elem, SimpleString):
+            result.append('+{}\r\n'.format(elem))
+        elif isinstance(elem, basestring):
+            result.append('${}\r\n{}\r\n'.format(len(elem), elem))
+        elif isinstance(elem, (set, list, tuple)):
+            result.append('*{}\r\n'.format(len(elem)))
+            for element in elem:
+                _transform(element)
+        elif isinstance(elem, Exception):
+            result.append('-ERR {}\r\n'.format(str(elem)))
+
+    _transform(obj)
+    return ''.join(result)
+
+
+def _compare(description, reply, repeat=1):
+    encoder = Encoder()
+    before_transform = time.time()
+    for _ in range(repeat):
+        previous_transform(reply)
+    after_transform = time.time()
+    for _ in range(repeat):
+        encoder.encode(reply)
+    after_encoder = time.time()
+    print '\ntransform() {} x {} = {:.5f}s'.format(repeat, description, after_transform - before_transform)
+    print 'encoder {} x {} = {:.5f}s'.format(repeat, description, after_encoder - after_transform)
+    assert ''.join(encoder.encode(reply)) == previous_transform(reply)
+
+
+def test_small_bulk_strings():
+    _compare('GET (10 bytes)', 'x' * 10, repeat=1000)
+
+
+def test_large_arrays():
+    _compare('SMEMBERS (100000 members)', ['member{}'.format(i) for i in range(100000)])
+
+
+def test_large_bulk_strings():
+    _compare('GET (50MB)', 'x' * 50 * 1024 * 1024)
@@ -0,0 +1,60 @@
+"""
+The following results should serve as reference
+------
+
+Results from 2026-10-16 on a Linux VM (LARGE_NUMBER == 1000):
+
+$ make performance-server & make test-performance | grep transport
+transport TCP PING time = 0.11408s
+transport unix socket PING time = 0.07878s
+transport TCP SET time = 0.10918s
+transport unix socket SET time = 0.09777s
+transport TCP GET time = 0.09998s
+transport unix socket GET time = 0.08892s
+"""
+
+import time
+
+import pytest
+
+from tests.helpers import fresh_redis
+
+
+PROFILE_PORT = 6376
+PROFILE_UNIX_SOCKET = '/tmp/dredis-performance.sock'
+LARGE_NUMBER = 1000
+TRANSPORTS = [
+    ('TCP', {'port': PROFILE_PORT}),
+    ('unix socket', {'unix_socket_path': PROFILE_UNIX_SOCKET}),
+]
+
+
+@pytest.mark.parametrize('transport, options', TRANSPORTS)
+def test_ping(transport, options):
+    r = fresh_redis(**options)
+    before_ping = time.time()
+    for _ in range(LARGE_NUMBER):
+        assert r.ping() is True
+    after_ping = time.time()
+    print '\ntransport {} PING time = {:.5f}s'.format(transport, after_ping - before_ping)
+
+
+@pytest.mark.parametrize('transport, options', TRANSPORTS)
+def test_set(transport, options):
+    r = fresh_redis(**options)
+    before_set = time.time()
+    for i in range(LARGE_NUMBER):
+        assert r.set('key{}'.format(i), 'value') is True
+    after_set = time.time()
+    print '\ntransport {} SET time = {:.5f}s'.format(transport, after_set - before_set)
+
+
+@pytest.mark.parametrize('transport, options', TRANSPORTS)
+def test_get(transport, options):
+    r = fresh_redis(**options)
+    r.set('key', 'value')
+    before_get = time.time()
+    for _ in range(LARGE_NUMBER):
+        assert r.get('key') == 'value'
+    after_get = time.time()
+    print '\ntransport {} GET time = {:.5f}s'.format(transport, after_get - before_get)
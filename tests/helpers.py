@@ -3,10 +3,11 @@ import redis
 
 HOST = 'localhost'
 PORT = 6377
+UNIX_SOCKET = '/tmp/dredis-test.sock'
 DB = 0
 
 
-def fresh_redis(db=DB, host=HOST, port=PORT):
-    r = redis.StrictRedis(host=host, port=port, db=db)
+def fresh_redis(db=DB, host=HOST, port=PORT, unix_socket_path=None):
+    r = redis.StrictRedis(host=host, port=port, db=db, unix_socket_path=unix_socket_path)
     r.flushall()
     return r
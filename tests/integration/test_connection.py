@@ -1,4 +1,7 @@
-from tests.helpers import fresh_redis
+import pytest
+import redis
+
+from tests.helpers import fresh_redis, UNIX_SOCKET
 
 
 def test_select():
@@ -10,3 +13,50 @@ def test_select():
 
     assert r0.keys('*') == ['test1']
     assert r1.keys('*') == ['test2']
+
+
+def test_unix_socket():
+    tcp = fresh_redis()
+    unix = fresh_redis(unix_socket_path=UNIX_SOCKET)
+
+    unix.set('test', 'value')
+
+    assert unix.get('test') == 'value'
+    assert tcp.get('test') == 'value'
+
+
+def test_select_on_multiple_unix_socket_connections():
+    r0 = fresh_redis(db=0, unix_socket_path=UNIX_SOCKET)
+    r1 = fresh_redis(db=1, unix_socket_path=UNIX_SOCKET)
+
+    r0.set('test1', 'value1')
+    r1.set('test2', 'value2')
+
+    assert r0.keys('*') == ['test1']
+    assert r1.keys('*') == ['test2']
+
+
+def test_hello_with_resp2():
+    r = fresh_redis()
+    client_id = r.execute_command('CLIENT', 'ID')
+
+    reply = dict(zip(*[iter(r.execute_command('HELLO', '2'))] * 2))
+
+    assert reply['proto'] == 2
+    assert reply['id'] == client_id
+
+
+def test_hello_with_unsupported_protocol():
+    r = fresh_redis()
+
+    with pytest.raises(redis.ResponseError) as exc:
+        r.execute_command('HELLO', '4')
+
+    assert 'NOPROTO' in str(exc.value)
+
+
+def test_client_tracking_requires_resp3():
+    r = fresh_redis()
+
+    with pytest.raises(redis.ResponseError):
+        r.execute_command('CLIENT', 'TRACKING', 'ON')
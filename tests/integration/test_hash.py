@@ -49,6 +49,17 @@ def test_hlen():
     assert r.hlen('notfound') == 0
 
 
+def test_hset_and_hdel_keep_the_length_of_streamed_replies():
+    r = fresh_redis()
+
+    r.hset('myhash', 'key1', 'value1')
+    r.hset('myhash', 'key1', 'value2')
+    r.hset('myhash', 'key2', 'value2')
+    assert r.hdel('myhash', 'key2', 'key2') == 1
+    assert r.hlen('myhash') == 1
+    assert r.hgetall('myhash') == {'key1': 'value2'}
+
+
 def test_hsetnx():
     r = fresh_redis()
 
@@ -108,3 +119,13 @@ def test_hset_should_accept_multiple_key_value_pairs():
     with pytest.raises(redis.ResponseError) as exc:
         r.execute_command('HSET', 'myhash', 'k1', 'v1', 'k2')
     assert str(exc.value) == 'wrong number of arguments for HMSET'
+
+
+def test_hgetall_with_large_hash():
+    r = fresh_redis()
+    mapping = {'field{}'.format(i): 'value{}'.format(i) for i in range(5000)}
+    r.execute_command('HSET', 'myhash', *[item for pair in mapping.items() for item in pair])
+
+    assert r.hgetall('myhash') == mapping
+    assert sorted(r.hkeys('myhash')) == sorted(mapping.keys())
+    assert sorted(r.hvals('myhash')) == sorted(mapping.values())
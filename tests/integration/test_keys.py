@@ -1,3 +1,6 @@
+import pytest
+import redis
+
 from tests.helpers import fresh_redis
 
 
@@ -20,6 +23,29 @@ def test_types():
     assert r.type('notfound') == 'none'
 
 
+def test_commands_against_keys_of_another_type():
+    r = fresh_redis()
+    r.hset('myhash', 'field', 'value')
+    r.set('mystr', 'test')
+
+    for command in [('INCR', 'myhash'), ('GET', 'myhash'), ('SADD', 'myhash', 'a'), ('ZADD', 'myhash', 0, 'a'),
+                    ('HSET', 'mystr', 'field', 'value'), ('HSETNX', 'mystr', 'field', 'value')]:
+        with pytest.raises(redis.ResponseError) as exc:
+            r.execute_command(*command)
+        assert str(exc.value) == 'WRONGTYPE Operation against a key holding the wrong kind of value'
+    assert r.hgetall('myhash') == {'field': 'value'}
+    assert r.get('mystr') == 'test'
+
+
+def test_set_replaces_keys_of_another_type():
+    r = fresh_redis()
+    r.hset('myhash', 'field', 'value')
+
+    assert r.set('myhash', 'test') is True
+    assert r.type('myhash') == 'string'
+    assert r.hget('myhash', 'field') is None
+
+
 def test_keys():
     r = fresh_redis()
 
@@ -70,3 +96,25 @@ def test_delete():
 
     assert r.delete('mystr', 'myset', 'myzset', 'myhash', 'notfound') == 4
     assert r.keys('*') == []
+
+
+def test_keys_with_many_keys():
+    r = fresh_redis()
+    keys = ['key{}'.format(i) for i in range(3000)]
+    pipeline = r.pipeline(transaction=False)
+    for key in keys:
+        pipeline.set(key, 'value')
+    pipeline.execute()
+
+    assert sorted(r.keys('*')) == sorted(keys)
+    assert r.dbsize() == len(keys)
+
+
+def test_memory_usage():
+    r = fresh_redis()
+    r.set('mystr', 'x' * 100)
+    r.hset('myhash', 'field', 'value')
+
+    assert r.execute_command('MEMORY', 'USAGE', 'mystr') >= 100
+    assert r.execute_command('MEMORY', 'USAGE', 'myhash') > 0
+    assert r.execute_command('MEMORY', 'USAGE', 'notfound') is None
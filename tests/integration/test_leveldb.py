@@ -1,7 +1,7 @@
 import tempfile
 
 from dredis.keyspace import Keyspace
-from dredis.ldb import LEVELDB
+from dredis.ldb import KEY_CODEC, LDB_FORMAT_VERSION, LDB_HASH_TYPE, LDB_STRING_TYPE, LEVELDB
 
 
 def test_delete():
@@ -17,4 +17,25 @@ def test_delete():
 
     keyspace.delete('mystr', 'myset', 'myzset', 'myhash', 'notfound')
 
-    assert list(LEVELDB.get_db('0').iterator()) == []
+    # only the format version is left
+    assert list(LEVELDB.get_db('0').iterator()) == [(KEY_CODEC.encode_format_version(), bytes(LDB_FORMAT_VERSION))]
+
+
+def test_databases_of_the_format_version_1_are_converted_when_opened():
+    tempdir = tempfile.mkdtemp(prefix="redis-test-")
+    LEVELDB.setup_dbs(tempdir)
+    db = LEVELDB.get_db('0')
+    db.delete(KEY_CODEC.encode_format_version())
+    db.put(KEY_CODEC.get_key('mystr', LDB_STRING_TYPE), 'test')
+    db.put(KEY_CODEC.get_key('myhash', LDB_HASH_TYPE), '1')
+    db.put(KEY_CODEC.encode_hash_field('myhash', 'testkey'), 'testvalue')
+    LEVELDB.close_dbs()
+
+    LEVELDB.setup_dbs(tempdir)
+    keyspace = Keyspace()
+
+    assert keyspace.get('mystr') == 'test'
+    assert keyspace.type('myhash') == 'hash'
+    assert keyspace.hlen('myhash') == 1
+    assert keyspace.hget('myhash', 'testkey') == 'testvalue'
+    assert sorted(keyspace.keys(pattern=None)) == ['myhash', 'mystr']
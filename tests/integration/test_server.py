@@ -1,3 +1,6 @@
+import pytest
+import redis
+
 from tests.helpers import fresh_redis
 
 
@@ -44,3 +47,133 @@ def test_dbsize():
     r0.set('test', 'value')
     assert r0.dbsize() == 1
     assert r1.dbsize() == 0
+
+
+def test_command():
+    r = fresh_redis()
+
+    commands = {c[0]: c[:6] for c in r.execute_command('COMMAND')}
+
+    assert commands['get'] == ['get', 2, ['readonly', 'fast'], 1, 1, 1]
+    assert commands['del'] == ['del', -2, ['write'], 1, -1, 1]
+
+
+def test_command_count():
+    r = fresh_redis()
+
+    assert r.execute_command('COMMAND', 'COUNT') == len(r.execute_command('COMMAND'))
+
+
+def test_command_info():
+    r = fresh_redis()
+
+    get_info, not_found = r.execute_command('COMMAND', 'INFO', 'get', 'notfound')
+
+    assert get_info[:6] == ['get', 2, ['readonly', 'fast'], 1, 1, 1]
+    assert not_found is None
+
+
+def test_slowlog():
+    r = fresh_redis()
+
+    assert r.execute_command('SLOWLOG', 'RESET') == 'OK'
+    assert r.execute_command('SLOWLOG', 'GET') == []
+    assert r.execute_command('SLOWLOG', 'LEN') in (0, 1)  # SLOWLOG GET may be slow
+
+
+def test_info():
+    r = fresh_redis()
+
+    info = r.info()
+
+    assert info['connected_clients'] >= 1
+    assert info['uptime_in_seconds'] >= 0
+    assert 'cmdstat_get' not in info
+
+
+def test_info_commandstats():
+    r = fresh_redis()
+    r.get('key')
+
+    info = r.info('commandstats')
+
+    assert info['cmdstat_get']['calls'] >= 1
+    assert info['cmdstat_get']['gets'] >= 1
+    assert 'connected_clients' not in info
+
+
+def test_info_keyspace():
+    r0 = fresh_redis(db=0)
+    r1 = fresh_redis(db=1)
+    r1.set('key1', 'value')
+    r1.set('key2', 'value')
+
+    info = r0.info('keyspace')
+
+    assert info == {'db1': {'keys': 2, 'expires': 0, 'avg_ttl': 0}}
+
+
+def test_memory_stats():
+    r = fresh_redis()
+
+    stats = r.execute_command('MEMORY', 'STATS')
+
+    assert 'clients.output-buffers' in stats
+    assert 'caches.tracking-table' in stats
+
+
+def test_object_freq_without_key_frequencies():
+    r = fresh_redis()
+    r.set('key', 'value')
+
+    with pytest.raises(redis.ResponseError):
+        r.execute_command('OBJECT', 'FREQ', 'key')
+
+
+def test_debug_populate():
+    r = fresh_redis()
+    r.set('key:1', 'existing')
+
+    assert r.execute_command('DEBUG', 'POPULATE', 3) == 'OK'
+
+    assert r.dbsize() == 3
+    assert r.get('key:0') == 'value:0'
+    assert r.get('key:1') == 'existing'
+
+
+def test_debug_profile():
+    r = fresh_redis()
+
+    assert r.execute_command('DEBUG', 'PROFILE', 'START', 'CPROFILE') == 'OK'
+    with pytest.raises(redis.ResponseError) as exc:
+        r.execute_command('DEBUG', 'PROFILE', 'STOP', '/tmp/dredis-profile')
+    assert str(exc.value) == 'the profile can only be written to a file in the data directory'
+    with pytest.raises(redis.ResponseError) as exc:
+        r.execute_command('DEBUG', 'PROFILE', 'STOP', '0')  # the directory of the db 0
+    assert 'Is a directory' in str(exc.value)
+    # the profile is kept until it's written
+    assert r.execute_command('DEBUG', 'PROFILE', 'STOP', 'dredis-profile') == 'OK'
+
+
+def test_debug_capture_only_writes_to_the_data_directory():
+    r = fresh_redis()
+
+    for path in ('/tmp/dredis-capture', '../dredis-capture', 'subdir/../../dredis-capture'):
+        with pytest.raises(redis.ResponseError) as exc:
+            r.execute_command('DEBUG', 'CAPTURE', 'START', path)
+        assert str(exc.value) == 'the capture can only be written to a file in the data directory'
+    assert r.execute_command('DEBUG', 'CAPTURE', 'START', 'dredis-capture') == 'OK'
+    assert r.execute_command('DEBUG', 'CAPTURE', 'STOP') == 'OK'
+
+
+def test_debug_populate_collections():
+    r = fresh_redis()
+
+    r.execute_command('DEBUG', 'POPULATE', 2, 'myzset', 0, 'zset', 5)
+    r.execute_command('DEBUG', 'POPULATE', 2, 'myhash', 3, 'hash', 5)
+
+    assert r.type('myzset:1') == 'zset'
+    assert r.zcard('myzset:1') == 5
+    assert r.zscore('myzset:1', 'member:3') == 3
+    assert r.hlen('myhash:0') == 5
+    assert r.hget('myhash:0', 'member:4') == 'val'
@@ -33,3 +33,11 @@ def test_scard():
 
     assert r.scard('myset') == 2
     assert r.scard('notfound') == 0
+
+
+def test_smembers_with_large_set():
+    r = fresh_redis()
+    members = {'myvalue{}'.format(i) for i in range(5000)}
+    r.sadd('myset', *members)
+
+    assert r.smembers('myset') == members
@@ -106,6 +106,10 @@ def test_zrem():
     assert r.zrange('myzset', 0, -1) == ['myvalue0', 'myvalue3', 'myvalue2']
     assert r.zcard('myzset') == 3
 
+    assert r.zrem('myzset', 'myvalue0', 'myvalue0') == 1
+    assert r.zrange('myzset', 0, -1) == ['myvalue3', 'myvalue2']
+    assert r.zcard('myzset') == 2
+
 
 def test_zscore():
     r = fresh_redis()
@@ -352,3 +356,15 @@ def test_deleting_a_zset_should_not_impact_other_zsets():
 
     assert r.keys('*') == ['myzset2']
     assert r.zrange('myzset2', 0, 10) == ['test2']
+
+
+def test_zrange_with_large_zset():
+    r = fresh_redis()
+    pipeline = r.pipeline(transaction=False)
+    for i in range(3000):
+        pipeline.zadd('myzset', i, 'value{}'.format(i))
+    pipeline.execute()
+
+    assert r.zrange('myzset', 0, -1) == ['value{}'.format(i) for i in range(3000)]
+    assert r.zrange('myzset', 1000, 2999, withscores=True) == [('value{}'.format(i), float(i)) for i in range(1000, 3000)]
+    assert r.zrange('myzset', 2990, 5000) == ['value{}'.format(i) for i in range(2990, 3000)]
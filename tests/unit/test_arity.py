@@ -57,6 +57,7 @@ EXPECTED_ARITY = {
     'getset': 3,
     'hdel': -3,
     'hexists': 3,
+    'hello': -1,
     'hget': 3,
     'hgetall': 2,
     'hincrby': 4,
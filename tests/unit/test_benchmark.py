@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from dredis.benchmark import compare_to_baseline, encode_command, generate_requests, parse_mix, parse_reply
+
+
+def test_parse_mix():
+    assert parse_mix('get=80,SET=20') == [('get', 80), ('set', 20)]
+    assert parse_mix('ping') == [('ping', 1)]
+    with pytest.raises(ValueError):
+        parse_mix('get=1,flushall=1')
+    with pytest.raises(ValueError):
+        parse_mix('get=0')
+
+
+def test_generate_requests():
+    requests = generate_requests([('get', 1), ('zadd', 0)], 3, keyspace=1, members=1, data_size=3, rng=random.Random(0))
+
+    assert requests == [encode_command(['GET', 'key:0'])] * 3
+    assert requests[0] == '*2\r\n$3\r\nGET\r\n$5\r\nkey:0\r\n'
+
+
+def test_parse_reply():
+    assert parse_reply('+OK\r\n:1\r\n', 0) == (5, False)
+    assert parse_reply('+OK\r\n:1\r\n', 5) == (9, False)
+    assert parse_reply('-ERR wrong\r\n', 0) == (12, True)
+    assert parse_reply('$-1\r\n', 0) == (5, False)
+    assert parse_reply('$3\r\nbar\r\n', 0) == (9, False)
+    assert parse_reply('*2\r\n$1\r\na\r\n-ERR b\r\n', 0) == (19, True)
+
+
+def test_parse_resp3_reply():
+    assert parse_reply('_\r\n,1.5\r\n', 0) == (3, False)
+    assert parse_reply('#t\r\n', 0) == (4, False)
+    assert parse_reply('!5\r\nERR a\r\n', 0) == (11, True)
+    assert parse_reply('%2\r\n$1\r\na\r\n:1\r\n$1\r\nb\r\n_\r\n', 0) == (25, False)
+    assert parse_reply('~1\r\n$1\r\na\r\n', 0) == (11, False)
+    assert parse_reply('>2\r\n$10\r\ninvalidate\r\n*1\r\n$1\r\na\r\n', 0) == (32, False)
+    assert parse_reply('%1\r\n$1\r\na\r\n', 0) == (-1, False)
+
+
+def test_parse_incomplete_reply():
+    assert parse_reply('+OK', 0) == (-1, False)
+    assert parse_reply('$3\r\nba', 0) == (-1, False)
+    assert parse_reply('*2\r\n$1\r\na\r\n', 0) == (-1, False)
+
+
+def test_compare_to_baseline():
+    baseline = {'dredis': {'requests_per_second': 1000, 'latency_usec': {'p50': 100, 'p99': 100, 'p999': 100, 'max': 100}}}
+    results = {
+        'dredis': {'requests_per_second': 850, 'latency_usec': {'p50': 105, 'p99': 200, 'p999': 100, 'max': 100}},
+        'redis': {'requests_per_second': 1, 'latency_usec': {'p50': 1, 'p99': 1, 'p999': 1, 'max': 1}},
+    }
+
+    assert compare_to_baseline(results, baseline, tolerance=0.1) == [
+        'dredis: 850 requests per second (baseline: 1000)',
+        'dredis: p99 latency of 200us (baseline: 100us)',
+    ]
@@ -0,0 +1,28 @@
+import plyvel
+
+from dredis.bigkeys import analyze_db
+from dredis.ldb import KEY_CODEC, LDB_HASH_TYPE, LDB_STRING_TYPE, LDB_ZSET_TYPE
+
+
+def test_analyze_db(tmpdir):
+    path = str(tmpdir.join('0'))
+    db = plyvel.DB(path, create_if_missing=True)
+    db.put(KEY_CODEC.encode_metadata('small'), KEY_CODEC.encode_metadata_value(LDB_STRING_TYPE, 1, 'x'))
+    db.put(KEY_CODEC.encode_metadata('big'), KEY_CODEC.encode_metadata_value(LDB_STRING_TYPE, 100, 'x' * 100))
+    db.put(KEY_CODEC.encode_metadata('myhash'), KEY_CODEC.encode_metadata_value(LDB_HASH_TYPE, 2))
+    db.put(KEY_CODEC.encode_hash_field('myhash', 'f1'), 'v1')
+    db.put(KEY_CODEC.encode_hash_field('myhash', 'f2'), 'v2')
+    db.put(KEY_CODEC.encode_metadata('myzset'), KEY_CODEC.encode_metadata_value(LDB_ZSET_TYPE, 1))
+    db.put(KEY_CODEC.encode_zset_value('myzset', 'm'), '1')
+    db.put(KEY_CODEC.encode_zset_score('myzset', 'm', 1), '')
+    db.close()
+
+    counts, top_by_elements, top_by_bytes = analyze_db(path, top=1)
+
+    assert counts == {'string': 2, 'set': 0, 'hash': 1, 'zset': 1}
+    assert top_by_elements.get('string') == [(100, 'big')]
+    assert top_by_elements.get('hash') == [(2, 'myhash')]
+    hash_bytes = len(KEY_CODEC.encode_hash_field('myhash', 'f1')) * 2 + 4
+    assert top_by_bytes.get('hash') == [(hash_bytes, 'myhash')]
+    zset_bytes = len(KEY_CODEC.encode_zset_value('myzset', 'm')) + 1 + len(KEY_CODEC.encode_zset_score('myzset', 'm', 1))
+    assert top_by_bytes.get('zset') == [(zset_bytes, 'myzset')]
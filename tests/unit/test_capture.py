@@ -0,0 +1,119 @@
+import socket
+
+import pytest
+from mock import patch
+
+from dredis.capture import TrafficCapture, read_capture
+from dredis.replay import Replay
+
+
+def test_capture_records_commands_and_closed_connections(tmpdir):
+    path = str(tmpdir.join('capture'))
+    capture = TrafficCapture()
+
+    capture.start(path)
+    capture.record_command(1, ['SET', 'a', '1'])
+    capture.record_command(2, ['GET', 'a'])
+    capture.record_close(1)
+    capture.record_command(2, ['DEBUG', 'CAPTURE', 'STOP'])
+    capture.stop()
+
+    records = list(read_capture(open(path, 'rb')))
+    assert [(client_id, command) for _, client_id, command in records] == [
+        (1, '*3\r\n$3\r\nSET\r\n$1\r\na\r\n$1\r\n1\r\n'),
+        (2, '*2\r\n$3\r\nGET\r\n$1\r\na\r\n'),
+        (1, ''),
+    ]
+    assert records[0][0] <= records[1][0] <= records[2][0]
+
+
+def test_capture_samples_connections(tmpdir):
+    path = str(tmpdir.join('capture'))
+    capture = TrafficCapture()
+
+    capture.start(path, sample_rate=2)
+    for client_id in range(1, 5):
+        capture.record_command(client_id, ['PING'])
+    capture.stop()
+
+    assert [client_id for _, client_id, _ in read_capture(open(path, 'rb'))] == [2, 4]
+
+
+def test_capture_stops_at_max_size(tmpdir):
+    path = str(tmpdir.join('capture'))
+    capture = TrafficCapture()
+
+    capture.start(path, max_size=1)
+    capture.record_command(1, ['PING'])
+
+    assert capture.running is False
+    assert len(list(read_capture(open(path, 'rb')))) == 1
+
+
+def test_capture_output_path_must_be_in_the_data_directory(tmpdir):
+    capture = TrafficCapture(str(tmpdir.mkdir('data')))
+    tmpdir.join('data', 'link').mksymlinkto(tmpdir)
+
+    for filename in (str(tmpdir.join('data', 'capture')), '../capture', 'link/capture', 'link/../../capture'):
+        with pytest.raises(ValueError):
+            capture.get_output_path(filename)
+    assert capture.get_output_path('capture') == str(tmpdir.join('data', 'capture'))
+
+
+def test_replay_keeps_the_order_of_the_commands(tmpdir):
+    client, server = socket.socketpair()
+    server.sendall('+OK\r\n$1\r\n1\r\n-ERR unknown command\r\n')
+    records = [
+        (10.0, 1, '*3\r\n$3\r\nSET\r\n$1\r\na\r\n$1\r\n1\r\n'),
+        (10.1, 1, '*2\r\n$3\r\nget\r\n$1\r\na\r\n'),
+        (10.2, 1, '*1\r\n$3\r\nFOO\r\n'),
+        (10.3, 1, ''),
+    ]
+
+    replay = Replay(address=None, speed=0)
+    with patch('dredis.replay.connect', return_value=client):
+        replay.run(records)
+    results = replay.get_results(seconds=1)
+
+    assert server.recv(1024) == ''.join(command for _, _, command in records)
+    assert results['requests'] == 3
+    assert results['errors'] == 1
+    assert sorted(results['commands']) == ['FOO', 'GET', 'SET']
+
+
+def test_replay_skips_pushes_and_parses_resp3_replies(tmpdir):
+    client, server = socket.socketpair()
+    server.sendall('%1\r\n$5\r\nproto\r\n:3\r\n'
+                   '>2\r\n$10\r\ninvalidate\r\n*1\r\n$1\r\na\r\n'
+                   '_\r\n')
+    records = [
+        (10.0, 1, '*2\r\n$5\r\nHELLO\r\n$1\r\n3\r\n'),
+        (10.1, 1, '*2\r\n$3\r\nGET\r\n$1\r\na\r\n'),
+        (10.2, 1, ''),
+    ]
+
+    replay = Replay(address=None, speed=0)
+    with patch('dredis.replay.connect', return_value=client):
+        replay.run(records)
+    results = replay.get_results(seconds=1)
+
+    assert results['requests'] == 2
+    assert results['errors'] == 0
+    assert sorted(results['commands']) == ['GET', 'HELLO']
+
+
+def test_replay_skips_replies_without_commands(tmpdir):
+    client, server = socket.socketpair()
+    server.sendall('$1\r\n1\r\n*3\r\n$7\r\nmessage\r\n$7\r\nchannel\r\n$1\r\nx\r\n')
+    records = [
+        (10.0, 1, '*2\r\n$3\r\nGET\r\n$1\r\na\r\n'),
+        (10.1, 1, ''),
+    ]
+
+    replay = Replay(address=None, speed=0)
+    with patch('dredis.replay.connect', return_value=client):
+        replay.run(records)
+    results = replay.get_results(seconds=1)
+
+    assert results['requests'] == 1
+    assert results['errors'] == 0
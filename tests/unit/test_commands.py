@@ -0,0 +1,39 @@
+import pytest
+
+from dredis.commands import run_command, CommandNotFound, SimpleString, REDIS_COMMANDS
+
+
+def test_run_command_with_any_case():
+    assert run_command(None, 'PING', ()) == 'PONG'
+    assert run_command(None, 'ping', ()) == 'PONG'
+    assert run_command(None, 'PiNg', ()) == 'PONG'
+
+
+def test_run_command_checks_arity():
+    with pytest.raises(SyntaxError) as exc:
+        run_command(None, 'get', ())
+
+    assert str(exc.value) == "wrong number of arguments for 'get' command"
+
+
+def test_run_command_not_found():
+    with pytest.raises(CommandNotFound):
+        run_command(None, 'notfound', ())
+
+
+@pytest.mark.parametrize('name, fn', REDIS_COMMANDS.items())
+def test_command_metadata(name, fn):
+    assert fn.command_name == name
+    assert all(isinstance(flag, str) for flag in fn.flags)
+    assert ('readonly' in fn.flags) + ('write' in fn.flags) <= 1
+    if fn.first_key:
+        assert fn.step > 0
+    else:
+        assert fn.last_key == fn.step == 0
+
+
+def test_command_reply():
+    reply = run_command(None, 'COMMAND', ('INFO', 'get'))
+
+    assert reply == [['get', 2, ['readonly', 'fast'], 1, 1, 1]]
+    assert all(isinstance(flag, SimpleString) for flag in reply[0][2])
@@ -0,0 +1,73 @@
+from dredis.commands import SimpleString, Double, Map
+from dredis.encoder import Encoder
+from dredis.utils import LazyCollection, Push
+
+
+def test_encode_small_replies_in_a_single_segment():
+    encoder = Encoder()
+    reply = ['1', 2, None, SimpleString('OK'), -3, 100000, ['nested']]
+
+    assert encoder.encode(reply) == ['*7\r\n$1\r\n1\r\n:2\r\n$-1\r\n+OK\r\n:-3\r\n:100000\r\n*1\r\n$6\r\nnested\r\n']
+
+
+def test_encode_large_values_as_separate_segments():
+    encoder = Encoder()
+    large_value = 'x' * Encoder.LARGE_VALUE_SIZE
+
+    segments = encoder.encode(['small', large_value, 'small'])
+
+    assert segments == ['*3\r\n$5\r\nsmall\r\n${}\r\n'.format(len(large_value)), large_value, '\r\n$5\r\nsmall\r\n']
+    assert segments[1] is large_value
+
+
+def test_encoder_can_be_reused():
+    encoder = Encoder()
+
+    assert encoder.encode(1) == [':1\r\n']
+    assert encoder.encode('a') == ['$1\r\na\r\n']
+
+
+def test_encode_large_lazy_collections_as_generators():
+    encoder = Encoder()
+    collection = LazyCollection(lambda: iter(['a', 'b', 'c']))
+    encoder.STREAM_BATCH_SIZE = 2
+
+    segments = encoder.encode(['first', collection])
+
+    assert segments[0] == '*2\r\n$5\r\nfirst\r\n*3\r\n'
+    assert list(segments[1]) == ['$1\r\na\r\n$1\r\nb\r\n', '$1\r\nc\r\n']
+
+
+def test_encode_small_lazy_collections_inline():
+    encoder = Encoder()
+    collection = LazyCollection(lambda: iter(['a', 'b']), length=2)
+
+    assert encoder.encode(collection) == ['*2\r\n$1\r\na\r\n$1\r\nb\r\n']
+
+
+def test_encode_resp3_types():
+    encoder = Encoder(protocol=3)
+
+    assert encoder.encode(None) == ['_\r\n']
+    assert encoder.encode(Double('1.5')) == [',1.5\r\n']
+    assert encoder.encode(Map(['a', '1', 'b', 2])) == ['%2\r\n$1\r\na\r\n$1\r\n1\r\n$1\r\nb\r\n:2\r\n']
+    assert encoder.encode(Push(['invalidate', ['k']])) == ['>2\r\n$10\r\ninvalidate\r\n*1\r\n$1\r\nk\r\n']
+
+
+def test_encode_resp3_types_as_resp2():
+    encoder = Encoder(protocol=2)
+
+    assert encoder.encode(Double('1.5')) == ['$3\r\n1.5\r\n']
+    assert encoder.encode(Map(['a', '1'])) == ['*2\r\n$1\r\na\r\n$1\r\n1\r\n']
+    assert encoder.encode(Push(['invalidate', None])) == ['*2\r\n$10\r\ninvalidate\r\n$-1\r\n']
+
+
+def test_encode_large_lazy_maps_as_generators():
+    encoder = Encoder(protocol=3)
+    collection = LazyCollection(lambda: iter(['a', '1', 'b', '2']))
+    encoder.STREAM_BATCH_SIZE = 2
+
+    segments = encoder.encode(Map(collection))
+
+    assert segments[0] == '%2\r\n'
+    assert list(segments[1]) == ['$1\r\na\r\n$1\r\n1\r\n', '$1\r\nb\r\n$1\r\n2\r\n']
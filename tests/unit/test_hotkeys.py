@@ -0,0 +1,52 @@
+from dredis.hotkeys import CountMinSketch, HotKeys
+
+
+def test_count_min_sketch_never_underestimates():
+    sketch = CountMinSketch(width=64, depth=4)
+    for i in range(1000):
+        sketch.add('key{}'.format(i % 100))
+
+    assert all(sketch.estimate('key{}'.format(i)) >= 10 for i in range(100))
+    assert sketch.estimate('hot') == 0
+    assert sketch.add('hot', 5) >= 5
+
+
+def test_hotkeys_keeps_the_most_frequent_keys():
+    hotkeys = HotKeys(sample_rate=1, top_size=2)
+    for key, count in [('a', 5), ('b', 1), ('c', 3), ('d', 10)]:
+        for _ in range(count):
+            hotkeys.record_command((key,), first_key=1, last_key=1, step=1)
+
+    assert hotkeys.get_top() == [('d', 10), ('a', 5)]
+    assert hotkeys.get_frequency('c') == 3
+
+
+def test_hotkeys_uses_key_positions():
+    hotkeys = HotKeys(sample_rate=1)
+
+    hotkeys.record_command(('k1', 'v1', 'k2', 'v2'), first_key=1, last_key=-1, step=2)
+    hotkeys.record_command(('k1', 'k3'), first_key=1, last_key=-1, step=1)
+
+    assert dict(hotkeys.get_top()) == {'k1': 2, 'k2': 1, 'k3': 1}
+
+
+def test_hotkeys_sampling_scales_the_counters():
+    hotkeys = HotKeys(sample_rate=10)
+    for _ in range(100):
+        hotkeys.record_command(('key',), first_key=1, last_key=1, step=1)
+
+    assert hotkeys.sampled_commands == 10
+    assert hotkeys.get_frequency('key') == 100
+
+
+def test_hotkeys_decay():
+    hotkeys = HotKeys(sample_rate=1, decay_time=60)
+    for _ in range(8):
+        hotkeys.record_command(('key',), first_key=1, last_key=1, step=1)
+
+    hotkeys.decay(now=100)
+    hotkeys.decay(now=159)
+    assert hotkeys.get_frequency('key') == 8
+    hotkeys.decay(now=160)
+    assert hotkeys.get_frequency('key') == 4
+    assert hotkeys.get_top() == [('key', 4)]
@@ -0,0 +1,73 @@
+import mock
+
+from dredis.ldb import (
+    CountingDB, KEY_CODEC, LDB_HASH_TYPE, LDB_SET_TYPE, LDB_STRING_TYPE, LDB_ZSET_TYPE, STORAGE_IO, migrate_db,
+)
+
+
+def test_counting_db_counts_reads():
+    db = mock.Mock()
+    db.get.side_effect = {'key': 'value'}.get
+    db.iterator.return_value = iter([('k1', 'v1'), ('k2', 'v2')])
+    STORAGE_IO.reset()
+
+    counting_db = CountingDB(db)
+
+    assert counting_db.get('key') == 'value'
+    assert counting_db.get('missing', '0') == '0'
+    assert list(counting_db.iterator(start='k')) == [('k1', 'v1'), ('k2', 'v2')]
+    assert (STORAGE_IO.gets, STORAGE_IO.seeks, STORAGE_IO.steps, STORAGE_IO.bytes_read) == (2, 1, 2, 13)
+
+
+def test_counting_db_counts_writes():
+    db = mock.Mock()
+    STORAGE_IO.reset()
+
+    counting_db = CountingDB(db)
+    counting_db.put('key', 'value')
+    counting_db.delete('key')
+    with counting_db.write_batch() as batch:
+        batch.put('a', 'b')
+        batch.delete('c')
+
+    assert (STORAGE_IO.puts, STORAGE_IO.deletes, STORAGE_IO.batch_writes, STORAGE_IO.bytes_written) == (2, 2, 1, 14)
+    db.write_batch.return_value.write.assert_called_once_with()
+
+
+def test_metadata_value_has_the_string_after_the_header():
+    metadata = KEY_CODEC.encode_metadata_value(LDB_STRING_TYPE, 5, 'hello')
+
+    assert len(metadata) == 10 + 5
+    assert KEY_CODEC.decode_metadata_value(metadata) == (LDB_STRING_TYPE, 0, 5, 'hello')
+    assert KEY_CODEC.decode_metadata_value(KEY_CODEC.encode_metadata_value(LDB_SET_TYPE, 2 ** 40)) == \
+        (LDB_SET_TYPE, 0, 2 ** 40, '')
+
+
+def test_migrate_db_converts_the_metadata_of_the_format_version_1():
+    data = {
+        KEY_CODEC.get_key('mystr', LDB_STRING_TYPE): 'hello',
+        KEY_CODEC.get_key('myset', LDB_SET_TYPE): '2',
+        KEY_CODEC.encode_set_member('myset', 'a'): '',
+        KEY_CODEC.encode_set_member('myset', 'b'): '',
+        # wrong lengths of older versions are counted again
+        KEY_CODEC.get_key('myhash', LDB_HASH_TYPE): '3',
+        KEY_CODEC.encode_hash_field('myhash', 'f'): 'v',
+        KEY_CODEC.get_key('myzset', LDB_ZSET_TYPE): '1',
+    }
+    db = mock.Mock()
+    db.get.side_effect = data.get
+    db.iterator.side_effect = lambda prefix: [(k, v) for k, v in sorted(data.items()) if k.startswith(prefix)]
+    db.write_batch.return_value.put.side_effect = data.__setitem__
+    db.write_batch.return_value.delete.side_effect = data.__delitem__
+
+    assert migrate_db(db) == 3
+    assert data == {
+        KEY_CODEC.encode_metadata('mystr'): KEY_CODEC.encode_metadata_value(LDB_STRING_TYPE, 5, 'hello'),
+        KEY_CODEC.encode_metadata('myset'): KEY_CODEC.encode_metadata_value(LDB_SET_TYPE, 2),
+        KEY_CODEC.encode_set_member('myset', 'a'): '',
+        KEY_CODEC.encode_set_member('myset', 'b'): '',
+        KEY_CODEC.encode_metadata('myhash'): KEY_CODEC.encode_metadata_value(LDB_HASH_TYPE, 1),
+        KEY_CODEC.encode_hash_field('myhash', 'f'): 'v',
+        KEY_CODEC.encode_format_version(): '2',
+    }
+    assert migrate_db(db) == 0
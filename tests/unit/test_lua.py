@@ -1,3 +1,6 @@
+import subprocess
+import sys
+
 import pytest
 
 from lupa._lupa import LuaRuntime
@@ -103,3 +106,21 @@ def test_redislua_with_command_error_pcall():
     table = redis_lua.pcall('cmd_not_found')
 
     assert table['err'] == '@user_script: Unknown Redis command called from Lua script'
+
+
+def test_lua_runners_share_the_same_runtime():
+    assert LuaRunner(Keyspace())._runtime is LuaRunner(Keyspace())._runtime
+
+
+def test_lua_globals_of_a_script_dont_leak_into_other_scripts():
+    runner1 = LuaRunner(Keyspace())
+    runner2 = LuaRunner(Keyspace())
+
+    assert runner1.run("counter = (counter or 0) + 1; return {counter, KEYS[1]}", ['key1'], []) == [1, 'key1']
+    assert runner2.run("return {type(counter), string.upper(ARGV[1])}", [], ['arg']) == ['nil', 'ARG']
+    assert runner1.run("return counter", [], []) is None
+
+
+def test_lupa_is_only_imported_when_scripts_run():
+    code = 'import sys, dredis.server; assert "lupa" not in sys.modules'
+    assert subprocess.call([sys.executable, '-c', code]) == 0
@@ -0,0 +1,44 @@
+import socket
+
+from dredis.memory import MemoryDoctor, get_memory_stats, get_size
+from dredis.server import CommandHandler
+
+
+class LeakyObject(object):
+    pass
+
+
+def test_memory_stats_include_client_buffers():
+    sock1, sock2 = socket.socketpair()
+    handler = CommandHandler(sock1)
+    sock2.sendall('*2\r\n$3\r\nGET\r\n')  # incomplete command stays in the query buffer
+    handler.handle_read()
+
+    stats = dict(zip(*[iter(get_memory_stats())] * 2))
+
+    assert stats['clients.count'] >= 1
+    assert stats['clients.query-buffers'] >= len('*2\r\n$3\r\nGET\r\n')
+    assert stats['process.rss'] > 0
+    assert stats['caches.shared-replies'] > 0
+    handler.close()
+    sock2.close()
+
+
+def test_get_size_follows_containers_and_objects():
+    obj = LeakyObject()
+    obj.values = ['x' * 1000]
+
+    assert get_size(obj) > 1000
+    assert get_size([obj, obj]) < 2 * get_size(obj)
+
+
+def test_memory_doctor_reports_growth():
+    doctor = MemoryDoctor()
+
+    assert doctor.diagnose().startswith('Snapshot taken')
+    leaked = [LeakyObject() for _ in range(10000)]
+    report = doctor.diagnose()
+
+    assert report.startswith('Top 10 differences since the last MEMORY DOCTOR')
+    assert 'LeakyObject' in report
+    assert leaked
@@ -0,0 +1,42 @@
+import mock
+import pytest
+
+from dredis.ldb import KEY_CODEC, LDB_HASH_TYPE, LDB_SET_TYPE, LDB_STRING_TYPE
+from dredis.populate import get_ldb_pairs, get_value, populate
+
+
+def test_get_value():
+    assert get_value('value', 12, 0) == 'value:12'
+    assert get_value('value', 12, 3) == 'val'
+    assert get_value('value', 12, 10) == 'value:12\0\0'
+
+
+def test_get_ldb_pairs_writes_the_length_after_the_elements():
+    pairs = list(get_ldb_pairs('myset', 0, 'set', 0, 2))
+
+    assert pairs == [
+        (KEY_CODEC.encode_set_member('myset', 'member:0'), ''),
+        (KEY_CODEC.encode_set_member('myset', 'member:1'), ''),
+        (KEY_CODEC.encode_metadata('myset'), KEY_CODEC.encode_metadata_value(LDB_SET_TYPE, 2)),
+    ]
+
+
+def test_populate_skips_existing_keys_and_writes_in_batches():
+    data = {KEY_CODEC.encode_metadata('key:1'): KEY_CODEC.encode_metadata_value(LDB_HASH_TYPE, 1)}
+    db = mock.Mock()
+    db.get.side_effect = data.get
+    db.write_batch.return_value.put.side_effect = data.__setitem__
+    created = []
+
+    with mock.patch('dredis.populate.BATCH_SIZE', 2):
+        assert populate(db, 3, key_type='string', created_fn=created.append) == 2
+
+    assert created == ['key:0', 'key:2']
+    assert data[KEY_CODEC.encode_metadata('key:2')] == KEY_CODEC.encode_metadata_value(LDB_STRING_TYPE, 7, 'value:2')
+    assert data[KEY_CODEC.encode_metadata('key:1')] == KEY_CODEC.encode_metadata_value(LDB_HASH_TYPE, 1)
+    assert db.write_batch.return_value.write.call_count == 2
+
+
+def test_populate_unknown_type():
+    with pytest.raises(SyntaxError):
+        populate(mock.Mock(), 1, key_type='list')
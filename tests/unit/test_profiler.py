@@ -0,0 +1,75 @@
+import pstats
+
+import mock
+import pytest
+
+from dredis.profiler import CProfileProfiler, Profiler
+
+
+def burn_cpu(profiler):
+    while not profiler._profiler.samples:
+        sum(range(1000))
+
+
+def test_sampling_profiler_writes_collapsed_stacks(tmpdir):
+    profiler = Profiler(str(tmpdir))
+    path = str(tmpdir.join('profile.folded'))
+
+    profiler.start('sampling')
+    burn_cpu(profiler)
+    profiler.stop(path)
+
+    lines = open(path).read().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(' ', 1)
+    assert int(count) >= 1
+    assert 'burn_cpu' in stack
+    assert profiler.running is False
+
+
+def test_cprofile_profiler_writes_pstats(tmpdir):
+    profiler = Profiler(str(tmpdir))
+    path = str(tmpdir.join('profile.prof'))
+
+    profiler.start('cprofile')
+    sum(range(1000))
+    profiler.stop(path)
+
+    assert pstats.Stats(path).total_calls > 0
+
+
+def test_profiler_errors(tmpdir):
+    profiler = Profiler(str(tmpdir.mkdir('data')))
+
+    with pytest.raises(ValueError):
+        profiler.stop('profile')
+    with pytest.raises(SyntaxError):
+        profiler.start('unknown')
+
+    profiler.start('cprofile')
+    with pytest.raises(ValueError):
+        profiler.start('sampling')
+    with pytest.raises(ValueError):
+        profiler.stop('../profile')
+    with pytest.raises(ValueError):
+        profiler.stop(str(tmpdir.join('profile')))
+    assert profiler.running is True
+    assert profiler.stop('profile') == str(tmpdir.join('data', 'profile'))
+
+
+def test_profiler_keeps_the_profile_if_it_cant_be_written(tmpdir):
+    profiler = Profiler(str(tmpdir))
+    tmpdir.mkdir('subdir')
+
+    profiler.start('cprofile')
+    sum(range(1000))
+    with pytest.raises(IOError):
+        profiler.stop('subdir')
+    with mock.patch.object(CProfileProfiler, 'write_stats', side_effect=IOError('No space left on device')):
+        with pytest.raises(IOError):
+            profiler.stop('profile.prof')
+    assert profiler.running is True
+
+    profiler.stop('profile.prof')
+    assert pstats.Stats(str(tmpdir.join('profile.prof'))).total_calls > 0
+    assert profiler.running is False
@@ -1,6 +1,6 @@
 import pytest
 
-from dredis.parser import Parser
+from dredis.parser import Parser, ProtocolError
 
 
 def test_parse_simple_string():
@@ -83,3 +83,77 @@ def test_parser_should_work_with_chunks_sent_separately():
 
     responses.append("G\r\n")
     assert next(p.get_instructions()) == ['PING']
+
+
+def test_parser_should_reject_bulk_strings_not_followed_by_crlf():
+    def read(bufsize):
+        return "*1\r\n$4\r\nPINGXX"
+
+    p = Parser(read)
+    with pytest.raises(ProtocolError) as exc:
+        list(p.get_instructions())
+    assert str(exc.value) == 'Protocol error: expected CRLF after bulk string'
+
+
+def test_parser_should_reject_bulk_strings_over_the_limit():
+    def read(bufsize):
+        return "*2\r\n$3\r\nGET\r\n$11\r\n"
+
+    p = Parser(read, max_bulk_length=10)
+    with pytest.raises(ProtocolError) as exc:
+        list(p.get_instructions())
+    assert str(exc.value) == 'Protocol error: invalid bulk length'
+
+
+def test_parser_should_reject_query_buffers_over_the_limit():
+    def read(bufsize):
+        return "*1\r\n$4\r\nPING"
+
+    p = Parser(read, max_query_buffer_size=10)
+    with pytest.raises(ProtocolError) as exc:
+        list(p.get_instructions())
+    assert str(exc.value) == 'Protocol error: query buffer limit exceeded'
+
+
+@pytest.mark.parametrize("line, error", [
+    ("*x\r\n", 'Protocol error: invalid multibulk length'),
+    ("*1\r\n$x\r\n", 'Protocol error: invalid bulk length'),
+    ("*1\r\n:1\r\n", "Protocol error: expected '$', got ':'"),
+])
+def test_parser_should_reject_malformed_arrays(line, error):
+    def read(bufsize):
+        return line
+
+    p = Parser(read)
+    with pytest.raises(ProtocolError) as exc:
+        list(p.get_instructions())
+    assert str(exc.value) == error
+
+
+def test_parser_should_compact_the_buffer_after_parsing():
+    responses = ["*1\r\n$4\r\nPING\r\n*1\r\n$4\r\nPI", "NG\r\n"]
+
+    def read(bufsize):
+        return responses.pop(0)
+
+    p = Parser(read)
+    assert list(p.get_instructions()) == [['PING']]
+    assert p.buffer_size == len("*1\r\n$4\r\nPI")
+    assert list(p.get_instructions()) == [['PING']]
+    assert p.buffer_size == 0
+
+
+def test_parser_should_join_the_chunks_of_large_bulk_strings_once_they_are_complete():
+    value = 'x' * 1000
+    data = '*2\r\n$3\r\nGET\r\n${}\r\n{}\r\n'.format(len(value), value)
+    chunks = [data[i:i + 100] for i in range(0, len(data), 100)]
+
+    def read(bufsize):
+        return chunks.pop(0)
+
+    p = Parser(read)
+    while len(chunks) > 1:
+        assert list(p.get_instructions()) == []
+        assert p.buffer_size == len(data) - sum(len(chunk) for chunk in chunks)
+    assert list(p.get_instructions()) == [['GET', value]]
+    assert p.buffer_size == 0
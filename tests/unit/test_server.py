@@ -1,4 +1,10 @@
-from dredis.server import transmit, transform
+import socket
+import time
+
+from dredis.ldb import STORAGE_IO
+from dredis.server import transmit, transform, count_stream_io, CommandHandler, ClientOutputBufferLimit, Scheduler, WriteThrottle
+from dredis.stats import ServerStats, StorageIO
+from dredis.utils import ErrorReply
 import mock
 
 
@@ -8,6 +14,21 @@ def test_transmit_integer():
     mock_function.assert_called_with(':1\r\n')
 
 
+def test_count_stream_io_charges_the_reads_of_streamed_replies_to_their_command():
+    def read_elements():
+        for element in ['a', 'b']:
+            STORAGE_IO.steps += 1
+            yield element
+
+    command_io = StorageIO()
+    segments = count_stream_io(read_elements(), [command_io])
+    STORAGE_IO.reset()
+    STORAGE_IO.gets = 1  # another command is running when the segments are read
+    assert list(segments) == ['a', 'b']
+    assert command_io.steps == 2
+    assert (STORAGE_IO.gets, STORAGE_IO.steps) == (1, 0)
+
+
 def test_transform_integer():
     assert transform(1) == ':1\r\n'
 
@@ -34,3 +55,320 @@ def test_transform_nested_array():
 
 def test_transform_error():
     assert transform(Exception('test')) == '-ERR test\r\n'
+
+
+def test_transform_error_with_code():
+    assert transform(ErrorReply('NOPROTO test')) == '-NOPROTO test\r\n'
+
+
+def test_command_handler_keeps_unsent_data_until_socket_is_writable():
+    sock1, sock2 = socket.socketpair()
+    handler = CommandHandler(sock1)
+    sent_sizes = [3, 0, 100]
+    with mock.patch.object(handler, 'send', side_effect=lambda data: min(sent_sizes.pop(0), len(data))) as send:
+        handler.write('+PONG\r\n')
+        assert handler.writable() is True
+
+        handler.handle_write()
+        assert handler.writable() is True
+
+        handler.handle_write()
+        assert handler.writable() is False
+
+    assert send.call_args_list == [mock.call('+PONG\r\n'), mock.call('NG\r\n'), mock.call('NG\r\n')]
+    handler.close()
+    sock2.close()
+
+
+def test_command_handler_sends_pipelined_replies_at_once():
+    sock1, sock2 = socket.socketpair()
+    handler = CommandHandler(sock1)
+    sock2.sendall('*1\r\n$4\r\nPING\r\n*2\r\n$4\r\nPING\r\n$2\r\nhi\r\n*1\r\n$7\r\nunknown\r\n')
+    with mock.patch.object(handler, 'send', side_effect=len) as send:
+        handler.handle_read()
+
+    send.assert_called_once_with("+PONG\r\n$2\r\nhi\r\n-ERR unknown command 'unknown'\r\n")
+    handler.close()
+    sock2.close()
+
+
+def test_command_handler_flushes_large_pipelines_in_batches():
+    sock1, sock2 = socket.socketpair()
+    handler = CommandHandler(sock1)
+    handler.MAX_PENDING_REPLIES_SIZE = len('+PONG\r\n') * 2
+    sock2.sendall('*1\r\n$4\r\nPING\r\n' * 5)
+    with mock.patch.object(handler, 'send', side_effect=len) as send:
+        handler.handle_read()
+
+    assert send.call_args_list == [
+        mock.call('+PONG\r\n' * 2),
+        mock.call('+PONG\r\n' * 2),
+        mock.call('+PONG\r\n'),
+    ]
+    handler.close()
+    sock2.close()
+
+
+def test_command_handler_replies_protocol_errors_and_closes_the_connection():
+    sock1, sock2 = socket.socketpair()
+    handler = CommandHandler(sock1)
+    sock2.sendall('*1\r\n$4\r\nPING\r\n*1\r\n$x\r\n')
+    with mock.patch.object(handler, 'send', side_effect=len) as send:
+        handler.handle_read()
+
+    send.assert_called_once_with('+PONG\r\n-ERR Protocol error: invalid bulk length\r\n')
+    assert handler.connected is False
+    sock2.close()
+
+
+def test_command_handler_ignores_unsent_data_when_send_closes_the_connection():
+    sock1, sock2 = socket.socketpair()
+    handler = CommandHandler(sock1)
+    # `asyncore.dispatcher.send()` calls `handle_close()` and returns 0 when the client is gone
+    with mock.patch.object(handler, 'send', side_effect=lambda data: handler.handle_close() or 0):
+        handler.write('+PONG\r\n')
+
+    assert handler.connected is False
+    assert handler.writable() is False
+    sock2.close()
+
+
+def test_command_handler_reads_streamed_replies_only_when_socket_is_writable():
+    sock1, sock2 = socket.socketpair()
+    handler = CommandHandler(sock1)
+    stream = iter(['ab', 'cd', 'ef'])
+    sent_sizes = [1, 1, 1]
+    with mock.patch.object(handler, 'send', side_effect=lambda data: min(sent_sizes.pop(0), len(data))) as send:
+        handler.write((segment for segment in stream))
+        assert send.call_args_list == [mock.call('ab')]
+
+        handler.handle_write()
+        assert send.call_args_list == [mock.call('ab'), mock.call('b'), mock.call('cd')]
+        assert list(stream) == ['ef']  # the last segment wasn't read by the handler yet
+
+    handler.close()
+    sock2.close()
+
+
+def test_command_handler_waits_for_streamed_replies_before_running_the_next_commands():
+    sock1, sock2 = socket.socketpair()
+    handler = CommandHandler(sock1)
+    scheduler = Scheduler()
+
+    def execute_cmd(keyspace, send_fn, cmd):
+        send_fn((segment for segment in ['ab', 'cd']) if cmd == 'STREAM' else '+PONG\r\n')
+
+    sock2.sendall('STREAM\r\nPING\r\n')
+    with mock.patch('dredis.server.SCHEDULER', scheduler), mock.patch('dredis.server.STATS', ServerStats()), \
+            mock.patch('dredis.server.execute_cmd', side_effect=execute_cmd):
+        with mock.patch.object(handler, 'send', return_value=0) as send:
+            handler.handle_read()
+            assert send.call_args_list == [mock.call('ab')]
+            assert handler.get_memory_usage()[2] == len('ab')  # the segments count when they're read
+            assert handler.readable() is False
+            assert scheduler.has_waiting_clients() is False
+
+        with mock.patch.object(handler, 'send', side_effect=len) as send:
+            handler.handle_write()
+            assert scheduler.has_waiting_clients() is True
+            scheduler.run_waiting_clients()
+            assert send.call_args_list == [mock.call('ab'), mock.call('cd'), mock.call('+PONG\r\n')]
+
+    assert handler.readable() is True
+    assert handler.get_memory_usage()[2] == 0
+    handler.close()
+    sock2.close()
+
+
+def test_command_handler_stops_reading_when_output_buffer_is_over_the_limit():
+    sock1, sock2 = socket.socketpair()
+    handler = CommandHandler(sock1)
+    with mock.patch('dredis.server.OUTPUT_BUFFER_LIMIT', ClientOutputBufferLimit(soft_limit=10, soft_seconds=60)), \
+            mock.patch.object(handler, 'send', return_value=0):
+        handler.write('+PONG\r\n')
+        assert handler.readable() is True
+
+        handler.write('+PONG\r\n')
+        assert handler.readable() is False
+        assert handler.connected is True
+
+    handler.close()
+    sock2.close()
+
+
+def test_command_handler_disconnects_clients_over_the_hard_limit():
+    sock1, sock2 = socket.socketpair()
+    handler = CommandHandler(sock1)
+    with mock.patch('dredis.server.OUTPUT_BUFFER_LIMIT', ClientOutputBufferLimit(hard_limit=10)), \
+            mock.patch.object(handler, 'send', return_value=0):
+        handler.write('+PONG\r\n')
+        assert handler.connected is True
+
+        handler.write('+PONG\r\n')
+        assert handler.connected is False
+
+    sock2.close()
+
+
+def test_command_handler_disconnects_clients_over_the_soft_limit_for_too_long():
+    sock1, sock2 = socket.socketpair()
+    handler = CommandHandler(sock1)
+    with mock.patch('dredis.server.OUTPUT_BUFFER_LIMIT', ClientOutputBufferLimit(soft_limit=5, soft_seconds=60)), \
+            mock.patch.object(handler, 'send', return_value=0):
+        handler.write('+PONG\r\n')
+        handler.check_output_buffer_limit(now=time.time() + 59)
+        assert handler.connected is True
+
+        handler.check_output_buffer_limit(now=time.time() + 61)
+        assert handler.connected is False
+
+    sock2.close()
+
+
+def test_command_handler_runs_pipelines_in_turns():
+    sock1, sock2 = socket.socketpair()
+    handler = CommandHandler(sock1)
+    scheduler = Scheduler(max_commands_per_turn=2)
+    stats = ServerStats()
+    sock2.sendall('*1\r\n$4\r\nPING\r\n' * 5)
+    with mock.patch('dredis.server.SCHEDULER', scheduler), mock.patch('dredis.server.STATS', stats), \
+            mock.patch.object(handler, 'send', side_effect=len) as send:
+        handler.handle_read()
+        assert send.call_args_list == [mock.call('+PONG\r\n' * 2)]
+        assert handler.readable() is False
+        assert scheduler.has_waiting_clients() is True
+
+        scheduler.run_waiting_clients()
+        scheduler.run_waiting_clients()
+        assert send.call_args_list == [mock.call('+PONG\r\n' * 2), mock.call('+PONG\r\n' * 2), mock.call('+PONG\r\n')]
+        assert handler.readable() is True
+        assert scheduler.has_waiting_clients() is False
+
+    assert stats.throttled_turns == 2
+    assert stats.commands_run_in_extra_turns == 3
+    handler.close()
+    sock2.close()
+
+
+def test_command_handler_is_readable_after_a_full_turn_without_buffered_commands():
+    sock1, sock2 = socket.socketpair()
+    handler = CommandHandler(sock1)
+    scheduler = Scheduler(max_commands_per_turn=2)
+    sock2.sendall('*1\r\n$4\r\nPING\r\n' * 4)
+    with mock.patch('dredis.server.SCHEDULER', scheduler), mock.patch('dredis.server.STATS', ServerStats()), \
+            mock.patch.object(handler, 'send', side_effect=len):
+        handler.handle_read()
+        scheduler.run_waiting_clients()
+
+        # the last turn ran exactly `max_commands_per_turn` commands
+        assert handler.readable() is True
+        assert scheduler.has_waiting_clients() is False
+
+    handler.close()
+    sock2.close()
+
+
+def test_scheduler_waits_for_clients_paused_by_the_output_buffer():
+    sock1, sock2 = socket.socketpair()
+    handler = CommandHandler(sock1)
+    scheduler = Scheduler(max_commands_per_turn=1)
+    output_buffer_limit = ClientOutputBufferLimit(soft_limit=10, soft_seconds=60)
+    sock2.sendall('*1\r\n$4\r\nPING\r\n' * 3)
+    with mock.patch('dredis.server.SCHEDULER', scheduler), mock.patch('dredis.server.STATS', ServerStats()), \
+            mock.patch('dredis.server.OUTPUT_BUFFER_LIMIT', output_buffer_limit):
+        with mock.patch.object(handler, 'send', return_value=0):
+            handler.handle_read()
+            handler.write('+PONG\r\n')  # the output buffer is over the pause size
+            scheduler.run_waiting_clients()
+            assert handler.get_memory_usage()[2] == len('+PONG\r\n') * 2
+            assert scheduler.has_waiting_clients() is False  # the event loop doesn't need to wake up for it
+
+        with mock.patch.object(handler, 'send', side_effect=len):
+            handler.handle_write()
+            assert scheduler.has_waiting_clients() is True
+            scheduler.run_waiting_clients()
+            scheduler.run_waiting_clients()
+
+    assert handler.readable() is True
+    assert scheduler.has_waiting_clients() is False
+    handler.close()
+    sock2.close()
+
+
+def test_scheduler_rotates_waiting_clients():
+    scheduler = Scheduler()
+    handlers = [mock.Mock(connected=True, name='h1'), mock.Mock(connected=True, name='h2')]
+    for handler in handlers:
+        handler.is_paused.return_value = False
+    handlers[0].run_buffered_commands.side_effect = lambda: scheduler.throttle(handlers[0]) or 1
+    handlers[1].run_buffered_commands.return_value = 1
+
+    scheduler.throttle(handlers[0])
+    scheduler.throttle(handlers[1])
+    scheduler.run_waiting_clients()
+
+    handlers[0].run_buffered_commands.assert_called_once_with()
+    handlers[1].run_buffered_commands.assert_called_once_with()
+    assert scheduler.has_waiting_clients() is True
+
+
+def test_scheduler_closes_clients_with_errors():
+    scheduler = Scheduler()
+    handler = mock.Mock(connected=True)
+    handler.is_paused.return_value = False
+    handler.run_buffered_commands.side_effect = IndexError
+
+    scheduler.throttle(handler)
+    scheduler.run_waiting_clients()
+
+    handler.handle_error.assert_called_once_with()
+    assert scheduler.has_waiting_clients() is False
+
+
+def test_write_throttle_stops_reading_from_the_heaviest_writers():
+    throttle = WriteThrottle(max_level0_files=6)
+    heavy_writer = mock.Mock(written_bytes=900, write_throttled=False)
+    light_writer = mock.Mock(written_bytes=100, write_throttled=False)
+    reader = mock.Mock(written_bytes=0, write_throttled=False)
+    stats = ServerStats()
+
+    with mock.patch('dredis.server.STATS', stats), mock.patch.object(throttle, 'get_level0_files', return_value=6):
+        throttle.check([heavy_writer, light_writer, reader])
+        assert (heavy_writer.write_throttled, light_writer.write_throttled, reader.write_throttled) == (True, False, False)
+        assert heavy_writer.written_bytes == 0
+
+        # the throttled client didn't write anything since the last check, but it stays throttled during the stall
+        light_writer.written_bytes = 100
+        throttle.check([heavy_writer, light_writer, reader])
+        assert (heavy_writer.write_throttled, light_writer.write_throttled, reader.write_throttled) == (True, True, False)
+        throttle.check([heavy_writer, light_writer, reader])
+        assert (heavy_writer.write_throttled, light_writer.write_throttled, reader.write_throttled) == (True, True, False)
+
+    assert (stats.leveldb_level0_files, stats.write_stalls, stats.throttled_writers) == (6, 1, 2)
+
+
+def test_write_throttle_releases_clients_after_the_stall():
+    throttle = WriteThrottle(max_level0_files=6)
+    handler = mock.Mock(written_bytes=100, write_throttled=False)
+
+    with mock.patch('dredis.server.STATS', ServerStats()):
+        with mock.patch.object(throttle, 'get_level0_files', return_value=8):
+            throttle.check([handler])
+        assert handler.write_throttled is True
+        with mock.patch.object(throttle, 'get_level0_files', return_value=2):
+            throttle.check([handler])
+
+    assert handler.write_throttled is False
+    assert throttle.stalled is False
+
+
+def test_command_handler_is_not_readable_while_write_throttled():
+    sock1, sock2 = socket.socketpair()
+    handler = CommandHandler(sock1)
+
+    handler.write_throttled = True
+    assert handler.readable() is False
+    handler.write_throttled = False
+    assert handler.readable() is True
+    handler.close()
+    sock2.close()
@@ -0,0 +1,65 @@
+from dredis.slowlog import SlowLog
+from dredis.stats import StorageIO
+
+
+def test_slowlog_records_slow_commands_only():
+    slowlog = SlowLog(log_slower_than=1000)
+
+    slowlog.record('GET', ('fast',), start=10.0, end=10.0009)
+    slowlog.record('GET', ('slow',), start=20.0, end=20.001)
+
+    assert slowlog.get() == [[0, 20, 1000, ['GET', 'slow']]]
+
+
+def test_slowlog_disabled():
+    slowlog = SlowLog(log_slower_than=-1)
+
+    slowlog.record('GET', ('key',), start=10.0, end=20.0)
+
+    assert len(slowlog) == 0
+
+
+def test_slowlog_discards_oldest_entries():
+    slowlog = SlowLog(log_slower_than=0, max_len=2)
+
+    for key in ('a', 'b', 'c'):
+        slowlog.record('GET', (key,), start=10.0, end=10.0)
+
+    assert [entry[3] for entry in slowlog.get()] == [['GET', 'c'], ['GET', 'b']]
+    assert [entry[0] for entry in slowlog.get(1)] == [2]
+
+
+def test_slowlog_truncates_arguments():
+    slowlog = SlowLog(log_slower_than=0)
+
+    slowlog.record('SADD', ['key'] + ['x' * 200] * 40, start=10.0, end=10.0)
+
+    argv = slowlog.get()[0][3]
+    assert len(argv) == SlowLog.MAX_ARGS
+    assert argv[:2] == ['SADD', 'key']
+    assert argv[2] == 'x' * 128 + '... (72 more bytes)'
+    assert argv[-1] == '... (11 more arguments)'
+
+
+def test_slowlog_reset_and_setup():
+    slowlog = SlowLog(log_slower_than=0)
+    for key in ('a', 'b', 'c'):
+        slowlog.record('GET', (key,), start=10.0, end=10.0)
+
+    slowlog.setup(log_slower_than=0, max_len=1)
+    assert len(slowlog) == 1
+
+    slowlog.reset()
+    assert len(slowlog) == 0
+
+
+def test_slowlog_records_storage_io():
+    slowlog = SlowLog(log_slower_than=0)
+    io = StorageIO()
+    io.gets = 4
+    io.bytes_read = 10
+
+    slowlog.record('DEL', ('key',), start=10.0, end=10.0, io=io)
+
+    assert slowlog.get()[0][4] == ['gets', 4, 'puts', 0, 'deletes', 0, 'batch_writes', 0,
+                                   'seeks', 0, 'steps', 0, 'bytes_read', 10, 'bytes_written', 0]
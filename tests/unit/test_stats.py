@@ -0,0 +1,125 @@
+import asyncore
+import socket
+import threading
+
+import pytest
+
+from dredis.keyspace import Keyspace
+from dredis.ldb import LEVELDB
+from dredis.metrics import MetricsHandler, MetricsServer, render_metrics
+from dredis.stats import LatencyHistogram, ServerStats, StorageIO
+
+
+@pytest.mark.parametrize('value', [0, 1, 63, 64, 65, 100, 1000, 123456, 10 ** 9])
+def test_latency_histogram_relative_error(value):
+    histogram = LatencyHistogram()
+    histogram.record(value)
+
+    assert value <= histogram.percentile(100) <= value * 1.04
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for value in range(1, 1001):
+        histogram.record(value)
+
+    assert histogram.count == 1000
+    assert 490 <= histogram.percentile(50) <= 510
+    assert 980 <= histogram.percentile(99) <= 1010
+    assert LatencyHistogram().percentile(50) == 0
+
+
+def test_latency_histogram_merge():
+    histogram = LatencyHistogram()
+    histogram.record(10)
+    other = LatencyHistogram()
+    other.record(10)
+    other.record(1000)
+
+    histogram.merge(other)
+
+    assert histogram.count == 3
+    assert histogram.percentile(50) == 10
+    assert 1000 <= histogram.percentile(100) <= 1040
+
+
+def test_server_stats_record_command():
+    stats = ServerStats()
+
+    stats.record_command('GET', 10.0, 10.000010, failed=False)
+    stats.record_command('GET', 20.0, 20.000030, failed=True)
+
+    assert stats.total_commands_processed == 2
+    assert stats.commands['GET'].calls == 2
+    assert stats.commands['GET'].failed_calls == 1
+    assert stats.commands['GET'].usec == 40
+
+
+def test_server_stats_accumulate_storage_io():
+    stats = ServerStats()
+    io = StorageIO()
+    io.gets = 4
+    io.steps = 10
+
+    stats.record_command('DEL', 10.0, 10.0, failed=False, io=io)
+    stats.record_command('DEL', 20.0, 20.0, failed=False, io=io)
+
+    assert stats.commands['DEL'].io.gets == 8
+    assert stats.commands['DEL'].io.steps == 20
+    assert stats.commands['DEL'].io.puts == 0
+
+
+def test_server_stats_instantaneous_ops():
+    stats = ServerStats()
+    stats.sample_ops(stats.start_time + 1)
+    stats.total_commands_processed = 100
+    stats.sample_ops(stats.start_time + 2)
+
+    assert stats.instantaneous_ops_per_sec == 50
+
+
+def test_metrics_response():
+    response = MetricsHandler(None)._get_response('GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n')
+
+    assert response.startswith('HTTP/1.0 200 OK\r\n')
+    assert response.endswith(render_metrics())
+    assert '\n# TYPE dredis_command_latency_seconds summary\n' in response
+
+
+def test_metrics_not_found():
+    response = MetricsHandler(None)._get_response('GET / HTTP/1.1\r\n\r\n')
+
+    assert response.startswith('HTTP/1.0 404 Not Found\r\n')
+
+
+def test_metrics_server_exports_the_keys_and_the_leveldb_levels_of_each_database(tmpdir):
+    LEVELDB.setup_dbs(str(tmpdir))
+    server = MetricsServer('127.0.0.1', 0)
+    try:
+        keyspace = Keyspace()
+        keyspace.set('key1', 'value')
+        keyspace.set('key2', 'value')
+        # writes the keys to a file in the last level
+        LEVELDB.get_db('0').compact_range()
+
+        client = socket.create_connection(server.socket.getsockname(), timeout=5)
+        client.sendall('GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        chunks = []
+        # the response ends when the server closes the connection
+        reader = threading.Thread(target=lambda: chunks.extend(iter(lambda: client.recv(4096), '')))
+        reader.start()
+        while reader.is_alive():
+            asyncore.loop(timeout=0.01, count=1)
+        client.close()
+        response = ''.join(chunks)
+    finally:
+        server.close()
+        LEVELDB.close_dbs()
+
+    lines = response.split('\r\n\r\n', 1)[1].splitlines()
+    assert 'dredis_db_keys{db="0"} 2' in lines
+    assert 'dredis_db_keys{db="1"} 0' in lines
+    level_files = [line for line in lines if line.startswith('dredis_leveldb_level_files{db="0",')]
+    assert len(level_files) == 1
+    assert level_files[0].endswith(' 1')
+    assert any(line.startswith('dredis_leveldb_compaction_written_bytes_total{db="0",') for line in lines)
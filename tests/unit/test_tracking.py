@@ -0,0 +1,117 @@
+import socket
+
+import mock
+
+from dredis.commands import run_command
+from dredis.keyspace import Keyspace
+from dredis.server import CommandHandler
+from dredis.tracking import TRACKING_TABLE, TrackingTable
+from dredis.utils import Push
+
+
+def test_tracking_table_notifies_clients_that_read_the_key():
+    table = TrackingTable()
+    push_fn1 = mock.Mock()
+    push_fn2 = mock.Mock()
+    table.enable(1, push_fn1)
+    table.enable(2, push_fn2)
+    table.remember(1, 'key')
+
+    table.invalidate('key')
+
+    push_fn1.assert_called_once_with(Push(['invalidate', ['key']]))
+    assert push_fn2.called is False
+
+
+def test_tracking_table_notifies_only_once():
+    table = TrackingTable()
+    push_fn = mock.Mock()
+    table.enable(1, push_fn)
+    table.remember(1, 'key')
+
+    table.invalidate('key')
+    table.invalidate('key')
+
+    assert push_fn.call_count == 1
+    assert table.tracked_keys == 0
+
+
+def test_tracking_table_ignores_disabled_clients():
+    table = TrackingTable()
+    push_fn = mock.Mock()
+    table.enable(1, push_fn)
+    table.remember(1, 'key')
+    table.disable(1)
+
+    table.invalidate('key')
+
+    assert push_fn.called is False
+
+
+def test_tracking_table_invalidates_all_keys():
+    table = TrackingTable()
+    push_fn = mock.Mock()
+    table.enable(1, push_fn)
+    table.remember(1, 'key')
+
+    table.invalidate_all()
+
+    push_fn.assert_called_once_with(Push(['invalidate', None]))
+    assert table.tracked_keys == 0
+
+
+def test_tracking_table_invalidates_evicted_keys():
+    table = TrackingTable(max_keys=2)
+    push_fn = mock.Mock()
+    table.enable(1, push_fn)
+    table.remember(1, 'key1')
+    table.remember(1, 'key2')
+    table.remember(1, 'key2')
+    assert push_fn.called is False
+
+    table.remember(1, 'key3')
+
+    assert table.tracked_keys == 2
+    assert table.evicted_keys == 1
+    evicted_key = push_fn.call_args[0][0][1][0]
+    assert evicted_key in ('key1', 'key2')
+    push_fn.assert_called_once_with(Push(['invalidate', [evicted_key]]))
+
+
+def test_tracking_table_estimates_its_memory_usage_from_a_sample():
+    table = TrackingTable()
+    empty_size = table.get_memory_usage()
+    for i in range(1000):
+        table.remember(1, 'key:{:04}'.format(i))
+
+    sampled_size = table.get_memory_usage(samples=10) - empty_size
+    full_size = table.get_memory_usage(samples=1000) - empty_size
+
+    assert abs(sampled_size - full_size) < full_size * 0.05
+
+
+def test_command_handler_pushes_messages_after_pending_replies():
+    sock1, sock2 = socket.socketpair()
+    handler = CommandHandler(sock1)
+    handler.keyspace.protocol = 3
+    with mock.patch.object(handler, 'send', side_effect=len) as send:
+        handler._queue_reply('+OK\r\n')
+        handler.push(Push(['invalidate', ['k']]))
+
+    send.assert_called_once_with('+OK\r\n>2\r\n$10\r\ninvalidate\r\n*1\r\n$1\r\nk\r\n')
+    handler.close()
+    sock2.close()
+
+
+def test_hello_2_disables_tracking():
+    push_fn = mock.Mock()
+    keyspace = Keyspace(client_id=1, push_fn=push_fn)
+    run_command(keyspace, 'HELLO', ['3'])
+    run_command(keyspace, 'CLIENT', ['TRACKING', 'ON'])
+
+    run_command(keyspace, 'HELLO', ['2'])
+    TRACKING_TABLE.remember(1, 'key')
+    TRACKING_TABLE.invalidate('key')
+
+    assert keyspace.tracking is False
+    assert push_fn.called is False